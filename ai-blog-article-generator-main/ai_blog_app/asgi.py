@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from blog_generator.asgi import StreamingASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_blog_app.settings')
 
-application = get_asgi_application()
+# What get_asgi_application() does, with a handler that awaits the streamed generation events
+django.setup(set_prefix=False)
+application = StreamingASGIHandler()
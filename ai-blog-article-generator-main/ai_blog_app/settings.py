@@ -55,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'blog_generator.middleware.RequestIdMiddleware',
 ]
 
 ROOT_URLCONF = 'ai_blog_app.urls'
@@ -153,4 +154,218 @@ LOGIN_URL = 'login'
 # Add these lines to your settings.py
 ASSEMBLYAI_API_KEY = "add your assembly ai api key"
 OPENROUTER_API_KEY = "add your openrouter ai api key"
+ASSEMBLYAI_BASE_URL = "https://api.assemblyai.com"
+LLM_API_URL = "https://api.perplexity.ai/chat/completions"
+
+
+# Blog generation jobs
+# 'async' runs jobs as coroutines on this process's I/O loop, at most
+# ASYNC_GENERATION_JOBS at once; 'thread' gives each job one of
+# GENERATION_WORKERS threads; 'external' only queues them for
+# `python manage.py run_generation_worker`
+GENERATION_JOB_RUNNER = 'async'
+GENERATION_WORKERS = 16
+ASYNC_GENERATION_JOBS = 500
+# Running jobs older than this are failed as interrupted (their worker died);
+# web processes and the worker command check every GENERATION_RECOVERY_INTERVAL
+GENERATION_JOB_TIMEOUT = 2 * 60 * 60  # seconds
+GENERATION_RECOVERY_INTERVAL = 5 * 60
+# Per-process limits on how many jobs run each pipeline stage at once, so
+# a large batch pipelines through the stages without flooding any provider
+GENERATION_STAGE_CONCURRENCY = {
+    'title': 8,           # yt-dlp metadata extraction
+    'transcription': 6,   # audio download + AssemblyAI
+    'generation': 4,      # LLM calls
+}
+# Largest number of videos one batch (playlist, channel or link list) may queue
+BATCH_MAX_ITEMS = 200
+# Let index.html stream the article as it is written (Server-Sent Events)
+# instead of polling a background job
+GENERATION_STREAMING = True
+
+# Per-video metadata/transcript cache (blog_generator.video_cache)
+VIDEO_CACHE_TTL = 30 * 24 * 60 * 60  # seconds since last use
+VIDEO_CACHE_MAX_ENTRIES = 5000
+
+# Single-flight generation (blog_generator.single_flight): concurrent requests
+# for the same video and generation settings wait for the first one and get
+# a copy of its article (a failed one is retried instead). The lease is held
+# in the database, so this works across worker processes.
+SINGLE_FLIGHT = True
+SINGLE_FLIGHT_LEASE_TTL = 5 * 60     # seconds without a heartbeat before a lease is taken over
+SINGLE_FLIGHT_HEARTBEAT = 60         # seconds between the leader's lease renewals
+SINGLE_FLIGHT_RESULT_TTL = 60        # seconds a finished result stays available to waiters
+SINGLE_FLIGHT_POLL_INTERVAL = 1.0    # seconds between a streamed waiter's lease checks
+
+# Speech-to-text backend (blog_generator.transcribers): 'assemblyai', 'local'
+# (faster-whisper on this machine's CPUs; needs `pip install faster-whisper`
+# and ffmpeg), or a dotted path to a Transcriber subclass
+TRANSCRIBER_BACKEND = 'assemblyai'
+LOCAL_ASR_MODEL = 'base.en'              # any faster-whisper model name or path
+LOCAL_ASR_COMPUTE_TYPE = 'int8'
+LOCAL_ASR_THREADS_PER_WORKER = 2
+LOCAL_ASR_WORKERS = None                 # worker processes; None = CPU cores // threads per worker
+LOCAL_ASR_LANGUAGE = None                # None = detect per segment
+LOCAL_ASR_SEGMENT_SECONDS = 60           # segments are cut at the pause nearest this length...
+LOCAL_ASR_MAX_SEGMENT_SECONDS = 120      # ...and never run longer than this
+ASR_MIN_SILENCE = 0.3                    # seconds of quiet that count as a pause (local and segmented)
+ASR_SILENCE_DB = -35                     # dBFS below which audio is quiet
+
+# Long videos are cut at pauses into segments that AssemblyAI transcribes
+# concurrently (needs numpy and ffmpeg; otherwise the file goes in one piece)
+ASSEMBLYAI_SEGMENTED = True
+ASSEMBLYAI_SEGMENT_MIN_DURATION = 20 * 60  # seconds; shorter videos are uploaded whole
+ASSEMBLYAI_SEGMENT_SECONDS = 300
+ASSEMBLYAI_MAX_SEGMENT_SECONDS = 420
+ASSEMBLYAI_SEGMENT_CONCURRENCY = 8         # segments in flight per video
+ASSEMBLYAI_SEGMENT_RETRIES = 2             # retries of a failed segment, alone
+ASSEMBLYAI_SEGMENT_TIMEOUT = 15 * 60       # seconds for a segment, retries included, before the transcription fails
+ASSEMBLYAI_POLL_INTERVAL = 3               # seconds between a transcript's status checks
+
+# Audio ingest: 'stream' pipes audio from YouTube into the AssemblyAI upload
+# through a bounded in-memory buffer; 'file' downloads to a per-job
+# directory under MEDIA_ROOT first
+AUDIO_INGEST_MODE = 'stream'
+STREAM_CHUNK_SIZE = 256 * 1024  # bytes
+STREAM_BUFFER_CHUNKS = 16
+
+# Use the video's own caption track (uploaded, else YouTube's automatic one)
+# when there is one, skipping the audio download and AssemblyAI entirely
+CAPTIONS_FIRST = True
+CAPTION_LANGUAGES = ['en']  # tried after the video's own language
+CAPTION_MIN_WORDS = 50
+
+# ASR-grade audio: download the smallest audio-only format of at least
+# ASR_MIN_AUDIO_ABR kbps; sources that are still bigger than needed (muxed
+# video, or audio above ASR_MAX_SOURCE_ABR kbps) are transcoded with ffmpeg
+# to mono Opus before the upload (skipped if ffmpeg isn't installed)
+ASR_MIN_AUDIO_ABR = 32
+ASR_MAX_SOURCE_ABR = 72
+ASR_TRANSCODE = True
+ASR_TRANSCODE_BITRATE = '24k'
+ASR_SAMPLE_RATE = 16000
+ASR_TRANSCODE_TIMEOUT = 600  # seconds, file mode only
+# Videos over these limits are refused from their metadata, before any download
+MAX_VIDEO_DURATION = 3 * 60 * 60  # seconds
+MAX_AUDIO_BYTES = 200 * 1024 * 1024
+
+# Blog generation from long transcripts (map-reduce over sentence-aligned chunks)
+LLM_CHUNKED_GENERATION = True
+LLM_CHUNK_CHARS = 6000
+LLM_MAX_CONCURRENCY = 4
+LLM_SUMMARY_MAX_TOKENS = 400
+
+# Outbound HTTP client (blog_generator.http_client)
+HTTP_POOL_MAXSIZE = 10          # keep-alive connections per provider host
+HTTP_MAX_RETRIES = 3            # retries on 429/5xx and connection errors
+HTTP_BACKOFF_BASE = 0.5         # seconds, doubled on every attempt (with jitter)
+HTTP_BACKOFF_MAX = 30           # seconds, also caps Retry-After
+HTTP_BREAKER_THRESHOLD = 5      # consecutive failures that open a host's circuit
+HTTP_BREAKER_COOLDOWN = 30      # seconds before a trial request is let through
+
+# Rate limits (blog_generator.rate_limit): token buckets kept in the database,
+# so they hold across worker processes. Each is (tokens per second, burst).
+RATE_LIMIT_ENABLED = True
+# Per user (per client address for anonymous text translation); over-limit
+# requests get 429 with Retry-After
+USER_RATE_LIMITS = {
+    'generate': (20 / 3600, 5),   # single videos: 20 an hour, 5 at once
+    'batch': (5 / 3600, 2),       # playlist/channel/link-list submissions
+    'translate': (30 / 60, 20),
+}
+# Generations are refused (429, Retry-After GENERATION_QUEUE_RETRY_AFTER)
+# while this many jobs are queued or running, in total or for one user
+GENERATION_QUEUE_MAX_DEPTH = 2000
+USER_MAX_ACTIVE_JOBS = 50
+GENERATION_QUEUE_RETRY_AFTER = 30  # seconds
+# Outbound requests per provider host, shared by all jobs and processes;
+# a request waits for a token, or fails after PROVIDER_RATE_LIMIT_MAX_WAIT
+# seconds.
+PROVIDER_RATE_LIMITS = {
+    ASSEMBLYAI_BASE_URL: (20, 40),
+    'https://api.perplexity.ai': (50 / 60, 10),
+    'https://translate.google.com': (5, 20),
+}
+PROVIDER_RATE_LIMIT_MAX_WAIT = 120
+
+# Async pipeline (blog_generator.async_pipeline). Provider calls and polling
+# run on one I/O event loop per process; what can only block runs on these
+# bounded pools.
+ASYNC_BLOCKING_WORKERS = 16       # threads for yt-dlp, ffmpeg and local ASR
+ASYNC_DB_WORKERS = 8              # threads for ORM calls made from async code
+ASYNC_HTTP_MAX_CONNECTIONS = 200  # open connections of the shared async HTTP client
+
+# Blog translation (blog_generator.translation)
+TRANSLATION_MAX_CONCURRENCY = 4  # segment requests in flight per translation
+
+# Rendered PDF cache (blog_generator.pdf_cache). Kept outside MEDIA_ROOT,
+# which is publicly served.
+PDF_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'pdf')
+PDF_RENDER_WORKERS = 2
+PDF_RENDER_TIMEOUT = 60  # seconds
+
+# ZIP export of a user's blogs (blog_generator.export)
+EXPORT_BATCH_SIZE = 100            # posts loaded per query
+EXPORT_PDF_LOOKAHEAD = 4           # posts whose PDFs render ahead of the one being written
+EXPORT_SPOOL_MAX_MEMORY = 16 * 1024 * 1024  # under ASGI, bytes of archive kept in memory before spilling to disk
+
+# Encoded QR code cache (blog_generator.qr_cache)
+QR_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'qr')
+
+# Rendered page fragments (blog_generator.page_cache): the listing cards and
+# the article body. 'file' is shared by the processes of one host; 'redis'
+# is any Redis-protocol server at PAGE_CACHE_REDIS_URL (needs `pip install
+# redis`), for several hosts; 'none' disables it. 'locmem' is per process, so
+# a post changed in another process (or by run_generation_worker) is not
+# invalidated there: only use it with a single process and the thread runner.
+PAGE_CACHE_BACKEND = 'file'
+PAGE_CACHE_REDIS_URL = 'redis://127.0.0.1:6379/1'
+PAGE_CACHE_TTL = 24 * 60 * 60  # seconds; changed posts are invalidated at once regardless
+PAGE_CACHE_VERSION = 1         # bump when the cached templates change
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'pages': {
+        'BACKEND': {
+            'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+            'file': 'django.core.cache.backends.filebased.FileBasedCache',
+            'redis': 'django.core.cache.backends.redis.RedisCache',
+            'none': 'django.core.cache.backends.dummy.DummyCache',
+        }[PAGE_CACHE_BACKEND],
+        'LOCATION': {
+            'locmem': 'pages',
+            'file': os.path.join(BASE_DIR, 'cache', 'pages'),
+            'redis': PAGE_CACHE_REDIS_URL,
+        }.get(PAGE_CACHE_BACKEND, ''),
+        'TIMEOUT': PAGE_CACHE_TTL,
+        'VERSION': PAGE_CACHE_VERSION,
+        'KEY_PREFIX': 'blog',
+        'OPTIONS': {'MAX_ENTRIES': 10000} if PAGE_CACHE_BACKEND in ('locmem', 'file') else {},
+    },
+}
 
+# Blog listing pages (keyset pagination)
+BLOG_LIST_PAGE_SIZE = 20
+SEARCH_RESULTS_LIMIT = 20
+
+# Soft-deleted posts older than this are removed by
+# `python manage.py purge_deleted_blogs` (run it daily from cron)
+DELETED_BLOG_RETENTION_DAYS = 30
+PURGE_BATCH_SIZE = 200
+PURGE_BATCH_SLEEP = 0.5  # seconds between batches, to leave the table to live traffic
+
+# Prometheus metrics (blog_generator.metrics), served at /metrics to these
+# addresses and to staff users
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# One JSON line per finished generation on the 'blog_generator' logger;
+# set its level to DEBUG to also log every stage span and outbound request
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'blog_generator': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import BlogPost
+from .models import (
+    BlogPost, BlogTranslation, GenerationBatch, GenerationJob, GenerationLease, RateLimitBucket, VideoCacheEntry,
+)
 
 # Register your models here.
-admin.site.register(BlogPost)
\ No newline at end of file
+admin.site.register(BlogPost)
+admin.site.register(GenerationJob)
+admin.site.register(VideoCacheEntry)
+admin.site.register(BlogTranslation)
+admin.site.register(GenerationBatch)
+admin.site.register(GenerationLease)
+admin.site.register(RateLimitBucket)
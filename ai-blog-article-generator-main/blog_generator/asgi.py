@@ -0,0 +1,66 @@
+"""ASGI handler that awaits async streaming bodies (responses.AsyncStreamingHttpResponse).
+
+Django 4.1's ASGIHandler sends a streamed body with a plain ``for`` loop on
+the event loop, so a body that waits on the network (the events of a
+streamed generation) would stall every other request of the process. This
+handler sends AsyncStreamingHttpResponse bodies with ``async for`` instead
+and, like Django 4.2, stops reading them once the client disconnects, so
+the body's cleanup runs (a streamed generation still saves its article).
+"""
+import asyncio
+import contextvars
+
+from django.core.handlers.asgi import ASGIHandler
+
+_receive = contextvars.ContextVar('blog_generator_asgi_receive')
+
+
+def response_headers(response):
+    """The response's headers and cookies as ASGI header pairs (as Django's send_response builds them)"""
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+async def wait_for_disconnect(receive):
+    # The request body has been read, so the next message is the disconnect
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class StreamingASGIHandler(ASGIHandler):
+    async def handle(self, scope, receive, send):
+        # send_response is only given ``send``; watching for the disconnect needs ``receive`` too
+        _receive.set(receive)
+        await super().handle(scope, receive, send)
+
+    async def send_response(self, response, send):
+        if not getattr(response, 'is_async', False):
+            return await super().send_response(response, send)
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers(response),
+        })
+        disconnected = asyncio.create_task(wait_for_disconnect(_receive.get()))
+        body = response.streaming_content
+        try:
+            async for part in body:
+                if disconnected.done():
+                    break  # closing the body below lets it finish up
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            else:
+                await send({'type': 'http.response.body'})
+        finally:
+            disconnected.cancel()
+            await body.aclose()
+            await response.aclose()
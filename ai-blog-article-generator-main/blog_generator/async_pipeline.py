@@ -0,0 +1,145 @@
+"""The process's I/O event loop, and the bounded executors around it.
+
+Provider calls (chat completions, AssemblyAI uploads and transcript polling,
+caption tracks, translations) are coroutines. They all run on one event
+loop per process, on its own thread, so they share one httpx.AsyncClient
+(http_client.get_async_client) and a generation or translation waiting on
+a provider holds no thread. Code reaches that loop through:
+
+* ``on_io_loop(coro)``: await it from another event loop (an ASGI view)
+* ``run_sync(coro)``: block a thread on it (WSGI views, job worker threads)
+* ``submit(coro)``: start it without waiting (the 'async' job runner)
+* ``iter_on_io_loop(agen)`` / ``iter_sync(agen)``: the same for async
+  generators, e.g. a streamed response body
+
+What can only block runs on bounded thread pools: ``run_blocking``
+(ASYNC_BLOCKING_WORKERS threads) for yt-dlp, ffmpeg and local ASR, and
+``run_db`` (ASYNC_DB_WORKERS threads) for the ORM, which Django refuses to
+run on an event loop's thread.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executors = {}
+_executors_lock = threading.Lock()
+_io_loop = None
+_io_loop_pid = None
+_io_loop_lock = threading.Lock()
+
+
+def get_executor(name):
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            workers = {'blocking': settings.ASYNC_BLOCKING_WORKERS, 'db': settings.ASYNC_DB_WORKERS}[name]
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'async-{name}')
+            _executors[name] = executor
+        return executor
+
+
+def io_loop():
+    """The event loop of this process's provider calls, started on first use (again after a fork)"""
+    global _io_loop, _io_loop_pid
+    with _io_loop_lock:
+        if _io_loop is None or _io_loop_pid != os.getpid():
+            _io_loop = asyncio.new_event_loop()
+            _io_loop_pid = os.getpid()
+            threading.Thread(target=_io_loop.run_forever, name='io-loop', daemon=True).start()
+        return _io_loop
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+async def _in_context(values, awaitable):
+    # A task starts in a copy of the context it was created in, which on the I/O loop is
+    # nobody's; the caller's values (request and job IDs, stage timings) are set again here
+    for var, value in values:
+        var.set(value)
+    return await awaitable
+
+
+def submit(awaitable):
+    """Start an awaitable on the I/O loop in a copy of the caller's context; returns a concurrent Future"""
+    values = list(contextvars.copy_context().items())
+    return asyncio.run_coroutine_threadsafe(_in_context(values, awaitable), io_loop())
+
+
+async def on_io_loop(awaitable):
+    """Await an awaitable on the I/O loop from any event loop; cancelling the caller cancels it there too"""
+    if _running_loop() is io_loop():
+        return await awaitable
+    return await asyncio.wrap_future(submit(awaitable))
+
+
+def run_sync(awaitable):
+    """Run an awaitable on the I/O loop, blocking this thread until it finishes"""
+    if _running_loop() is not None:
+        raise RuntimeError("run_sync() would block an event loop; await on_io_loop() instead")
+    return submit(awaitable).result()
+
+
+async def iter_on_io_loop(agen):
+    """Iterate an async generator on the I/O loop from another event loop"""
+    try:
+        while True:
+            try:
+                item = await on_io_loop(agen.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await on_io_loop(agen.aclose())
+
+
+def iter_sync(agen):
+    """Iterate an async generator on the I/O loop from a thread; closing this generator closes it"""
+    try:
+        while True:
+            try:
+                item = run_sync(agen.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        run_sync(agen.aclose())
+
+
+def _with_connection(func, *args, **kwargs):
+    # Pool threads outlive requests, so connections are checked like at a request's start and end
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def _run_on(name, func, *args, **kwargs):
+    # In a copy of the caller's context, so request IDs and timings carry over
+    call = functools.partial(contextvars.copy_context().run, _with_connection, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_executor(name), call)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call that has no async form (yt-dlp, ffmpeg, local ASR) on the blocking pool"""
+    return await _run_on('blocking', func, *args, **kwargs)
+
+
+async def run_db(func, *args, **kwargs):
+    """Run ORM code on the DB pool.
+
+    Unlike sync_to_async, whose thread-sensitive mode funnels every ORM call
+    of the process through one thread, this lets ASYNC_DB_WORKERS run at once.
+    """
+    return await _run_on('db', func, *args, **kwargs)
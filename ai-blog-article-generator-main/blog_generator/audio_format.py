@@ -0,0 +1,165 @@
+"""ASR-grade audio selection and transcoding.
+
+Speech recognition does not need music-grade audio: a ~48 kbps audio-only
+stream transcribes as well as the 160 kbps Opus (or the muxed video) that
+``bestaudio/best`` picks, at a fraction of the bytes. yt-dlp is asked for
+the smallest audio-only format of at least ASR_MIN_AUDIO_ABR kbps, and a
+source that is still bigger than needed (a muxed stream, or audio above
+ASR_MAX_SOURCE_ABR) is transcoded locally with ffmpeg to mono Opus at
+ASR_TRANSCODE_BITRATE before it is uploaded.
+
+Transcoding is skipped, with a warning, when ffmpeg is not installed.
+Streamed audio is piped through an asyncio subprocess (aiter_transcoded),
+so a transcode in flight holds no thread.
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import threading
+
+from django.conf import settings
+
+
+class AudioLimitError(Exception):
+    """The video is over MAX_VIDEO_DURATION or MAX_AUDIO_BYTES; the message is shown to the user"""
+
+
+def asr_format_options():
+    """yt-dlp options that select the smallest usable format instead of the best one"""
+    return {
+        # "?" keeps formats whose bitrate yt-dlp doesn't know
+        'format': f"ba[abr>=?{settings.ASR_MIN_AUDIO_ABR}]/ba/b",
+        # "+" = ascending, so the "best" match is the lowest bitrate / smallest file;
+        # forced so YouTube's own quality ranking doesn't take precedence
+        'format_sort': ['+abr', '+size', '+res'],
+        'format_sort_force': True,
+    }
+
+
+def expected_size(info):
+    return info.get('filesize') or info.get('filesize_approx')
+
+
+def check_audio_limits(info):
+    """Raise AudioLimitError if the metadata says the video is too long or its audio too big"""
+    duration = info.get('duration')
+    if duration and duration > settings.MAX_VIDEO_DURATION:
+        raise AudioLimitError(
+            f"Video is too long ({duration // 60} min); the limit is {settings.MAX_VIDEO_DURATION // 60} min."
+        )
+    size = expected_size(info)
+    if size and size > settings.MAX_AUDIO_BYTES:
+        raise AudioLimitError(
+            f"Video audio is too large ({size // (1024 * 1024)} MB); "
+            f"the limit is {settings.MAX_AUDIO_BYTES // (1024 * 1024)} MB."
+        )
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None
+
+
+def needs_transcode(info):
+    """True when the selected format is bigger than ASR needs and ffmpeg can shrink it"""
+    if not settings.ASR_TRANSCODE or not info:
+        return False
+    muxed = info.get('vcodec') not in (None, 'none')
+    oversized = (info.get('abr') or 0) > settings.ASR_MAX_SOURCE_ABR
+    if not (muxed or oversized):
+        return False
+    if not ffmpeg_available():
+        print("ffmpeg not found, uploading the audio without transcoding")
+        return False
+    return True
+
+
+def ffmpeg_args(source, dest):
+    return [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', source,
+        '-vn', '-ac', '1', '-ar', str(settings.ASR_SAMPLE_RATE),
+        '-c:a', 'libopus', '-b:a', settings.ASR_TRANSCODE_BITRATE, '-application', 'voip',
+        '-f', 'ogg', dest,
+    ]
+
+
+def transcode_file(path):
+    """Transcode a downloaded file to mono Opus next to it; returns the new path"""
+    dest = os.path.splitext(path)[0] + '.asr.ogg'
+    subprocess.run(ffmpeg_args(path, dest), stdin=subprocess.DEVNULL, check=True, capture_output=True, timeout=settings.ASR_TRANSCODE_TIMEOUT)
+    return dest
+
+
+def iter_transcoded(chunks, chunk_size=None):
+    """Pipe an iterable of source bytes through ffmpeg, yielding the transcoded bytes as they come out"""
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    process = subprocess.Popen(ffmpeg_args('pipe:0', 'pipe:1'), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    feed_errors = []
+
+    def feed():
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass  # ffmpeg exited; its return code says why
+        except Exception as e:
+            feed_errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, name='audio-transcode', daemon=True)
+    feeder.start()
+    try:
+        while True:
+            data = process.stdout.read(chunk_size)
+            if not data:
+                break
+            yield data
+        feeder.join()
+        if feed_errors:
+            raise feed_errors[0]
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {process.stderr.read().decode('utf-8', 'replace').strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+async def aiter_transcoded(chunks, chunk_size=None):
+    """iter_transcoded for an async iterable of source bytes, on an asyncio subprocess"""
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    process = await asyncio.create_subprocess_exec(
+        *ffmpeg_args('pipe:0', 'pipe:1'),
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg exited; its return code says why
+        finally:
+            process.stdin.close()
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while data := await process.stdout.read(chunk_size):
+            yield data
+        await feeder  # raises what the source raised
+        stderr = await process.stderr.read()
+        if await process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {stderr.decode('utf-8', 'replace').strip()}")
+    finally:
+        feeder.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
@@ -0,0 +1,107 @@
+"""Streaming audio ingest: YouTube -> bounded buffer -> AssemblyAI upload.
+
+The audio bytes of the format yt-dlp selected are fetched by a task on the
+I/O loop and handed to the upload request through a fixed-size queue, so
+the download and the upload overlap, peak memory is
+STREAM_CHUNK_SIZE * STREAM_BUFFER_CHUNKS, nothing touches MEDIA_ROOT and
+no thread is held while either side waits on the network.
+"""
+import asyncio
+
+from django.conf import settings
+
+from . import http_client
+from .async_pipeline import run_blocking
+from .audio_format import AudioLimitError
+
+_DONE = object()
+
+
+def can_stream(info):
+    """Only plain HTTP(S) formats can be streamed; HLS/DASH fragments need yt-dlp's downloader"""
+    return bool(info and info.get('url') and info.get('protocol') in ('http', 'https'))
+
+
+async def aiter_audio_chunks(info, chunk_size=None, max_buffered_chunks=None):
+    """Yield the selected format's bytes while a background task downloads them"""
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    buffer = asyncio.Queue(maxsize=max_buffered_chunks or settings.STREAM_BUFFER_CHUNKS)
+
+    async def produce():
+        try:
+            # Media URLs point at a different googlevideo host per video and are not paced or
+            # retried like the provider calls, so this is a plain request on the shared client
+            client = http_client.get_async_client()
+            async with client.stream('GET', info['url'], headers=info.get('http_headers') or {},
+                                     timeout=30) as response:
+                response.raise_for_status()
+                received = 0
+                async for chunk in response.aiter_bytes(chunk_size):
+                    received += len(chunk)
+                    if received > settings.MAX_AUDIO_BYTES:
+                        # The metadata had no size (or understated it); stop before buffering more
+                        raise AudioLimitError(
+                            f"Video audio is larger than the {settings.MAX_AUDIO_BYTES // (1024 * 1024)} MB limit."
+                        )
+                    if chunk:
+                        await buffer.put(chunk)
+            await buffer.put(_DONE)
+        except Exception as e:
+            await buffer.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # The consumer went away (or finished): stop the download
+        producer.cancel()
+
+
+async def aiter_file(path, chunk_size=None):
+    """Yield a file's bytes, read on the blocking pool"""
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    with open(path, 'rb') as audio:
+        while chunk := await run_blocking(audio.read, chunk_size):
+            yield chunk
+
+
+async def aupload_audio(chunks):
+    """Upload an async iterable of audio bytes to AssemblyAI with chunked transfer encoding.
+
+    Returns the upload URL to request the transcript of
+    (transcribers.apoll_transcript).
+    """
+    counted = CountingIterator(chunks)
+    # A streamed body cannot be replayed, so this request is never retried
+    response = await http_client.apost(
+        f"{settings.ASSEMBLYAI_BASE_URL}/v2/upload",
+        retries=0,
+        headers={"authorization": settings.ASSEMBLYAI_API_KEY},
+        content=counted,
+        timeout=(10, 300),
+    )
+    response.raise_for_status()
+    print(f"Streamed {counted.bytes_sent} bytes of audio to AssemblyAI")
+    return response.json()['upload_url']
+
+
+class CountingIterator:
+    """Counts the bytes of an async iterable of chunks as they are consumed"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks.__aiter__()
+        self.bytes_sent = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self._chunks.__anext__()
+        self.bytes_sent += len(chunk)
+        return chunk
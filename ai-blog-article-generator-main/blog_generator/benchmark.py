@@ -0,0 +1,285 @@
+"""Offline end-to-end benchmark of blog generation.
+
+Drives the real ``generate_blog`` view (queued jobs, or the SSE stream)
+through the Django test client at a fixed concurrency, with yt-dlp,
+AssemblyAI and the chat API replaced by the local fakes in
+fake_services.py. Reports p50/p95/p99 end-to-end latency, jobs per
+minute and a per-stage breakdown, and can compare a run against a saved
+baseline. Run it with ``python manage.py benchmark_generation``.
+"""
+import json
+import secrets
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+
+import yt_dlp
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import jobs, views
+from .fake_services import FakeAssemblyAI, FakeChat, FakeYouTube, ServiceProfile, fake_youtube_dl
+from .models import GenerationJob, VideoCacheEntry
+
+FINISHED_STATUSES = (GenerationJob.STATUS_SUCCEEDED, GenerationJob.STATUS_FAILED)
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values):
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values),
+    }
+
+
+class StageTimer:
+    """Thread-safe collection of per-stage durations (seconds)"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_async(self, stage, func):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_async_generator(self, stage, func):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                async for item in func(*args, **kwargs):
+                    yield item
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+
+class RequestResult:
+    def __init__(self, ok, latency, job_id=None, error=None, first_token=None):
+        self.ok = ok
+        self.latency = latency
+        self.job_id = job_id
+        self.error = error
+        self.first_token = first_token
+
+
+def run_queued(client, link, poll_interval):
+    """POST generate-blog, then poll the job until it finishes"""
+    start = time.perf_counter()
+    response = client.post(reverse('generate-blog'), json.dumps({'link': link}), content_type='application/json')
+    if response.status_code != 202:
+        return RequestResult(False, time.perf_counter() - start, error=f"HTTP {response.status_code}")
+    job = response.json()
+
+    while True:
+        time.sleep(poll_interval)
+        data = client.get(job['status_url']).json()
+        if data['status'] in FINISHED_STATUSES:
+            break
+    return RequestResult(
+        data['status'] == GenerationJob.STATUS_SUCCEEDED, time.perf_counter() - start,
+        job_id=job['job_id'], error=data.get('error'),
+    )
+
+
+def run_streamed(client, link):
+    """POST generate-blog with stream: true and read the SSE response to the end"""
+    start = time.perf_counter()
+    response = client.post(
+        reverse('generate-blog'), json.dumps({'link': link, 'stream': True}), content_type='application/json',
+    )
+    first_token = None
+    event = None
+    for chunk in response.streaming_content:
+        for line in chunk.decode('utf-8').splitlines():
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+                if event == 'token' and first_token is None:
+                    first_token = time.perf_counter() - start
+            elif line.startswith('data: ') and event == 'error':
+                return RequestResult(False, time.perf_counter() - start, error=json.loads(line[6:])['error'])
+    return RequestResult(event == 'done', time.perf_counter() - start, first_token=first_token,
+                         error=None if event == 'done' else 'stream ended early')
+
+
+def run_benchmark(requests=50, concurrency=8, mode='queued', unique_videos=None, poll_interval=0.05,
+                  youtube=None, asr=None, llm=None, audio_bytes=256 * 1024, transcript_words=1500,
+                  caption_ratio=0.0, token_delay=0.0, asr_poll_interval=0.25, runner='async', keep=False, log=print):
+    """Run the benchmark and return its report as a dict.
+
+    ``youtube``, ``asr`` and ``llm`` are ServiceProfiles for the fakes;
+    ``runner`` is the GENERATION_JOB_RUNNER of the queued jobs.
+    ``unique_videos`` below ``requests`` makes later requests repeat videos
+    (exercising the video cache).
+    """
+    unique_videos = unique_videos or requests
+    run_id = secrets.token_hex(3)
+    video_ids = [f"{run_id}{index:05x}" for index in range(unique_videos)]  # 11 chars, like real IDs
+    links = [f"https://www.youtube.com/watch?v={video_ids[index % unique_videos]}" for index in range(requests)]
+
+    services = {
+        'youtube': FakeYouTube(youtube or ServiceProfile(), audio_bytes=audio_bytes,
+                               transcript_words=transcript_words, caption_ratio=caption_ratio).start(),
+        'asr': FakeAssemblyAI(asr or ServiceProfile(), transcript_words=transcript_words).start(),
+        'llm': FakeChat(llm or ServiceProfile(), token_delay=token_delay).start(),
+    }
+    timer = StageTimer()
+    user = User.objects.create_user(f"benchmark-{run_id}")
+
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(
+                GENERATION_JOB_RUNNER=runner,
+                ASSEMBLYAI_BASE_URL=services['asr'].base_url,
+                ASSEMBLYAI_POLL_INTERVAL=asr_poll_interval,
+                LLM_API_URL=f"{services['llm'].base_url}/chat/completions",
+                ALLOWED_HOSTS=['testserver'],
+                RATE_LIMIT_ENABLED=False,
+            ))
+            stack.enter_context(mock.patch.object(yt_dlp, 'YoutubeDL', fake_youtube_dl(services['youtube'])))
+            stack.enter_context(mock.patch.object(
+                jobs, 'extract_video_info', timer.wrap('title', jobs.extract_video_info),
+            ))
+            for module, name, stage in ((jobs, 'aget_transcription', 'transcription'),
+                                        (jobs, 'agenerate_blog_from_transcription', 'generation'),
+                                        (views, 'abuild_blog_prompt', 'prompt')):
+                stack.enter_context(mock.patch.object(module, name, timer.wrap_async(stage, getattr(module, name))))
+            stack.enter_context(mock.patch.object(
+                views, 'astream_chat_completion',
+                timer.wrap_async_generator('generation', views.astream_chat_completion),
+            ))
+
+            def worker(link):
+                close_old_connections()
+                client = Client()
+                client.force_login(user)
+                try:
+                    if mode == 'stream':
+                        return run_streamed(client, link)
+                    return run_queued(client, link, poll_interval)
+                except Exception as e:
+                    return RequestResult(False, 0.0, error=f"{type(e).__name__}: {e}")
+                finally:
+                    close_old_connections()
+
+            log(f"Running {requests} {mode} requests at concurrency {concurrency} ({unique_videos} distinct videos)")
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='benchmark') as pool:
+                results = list(pool.map(worker, links))
+            wall = time.perf_counter() - started
+
+        queue_waits = [
+            (job.started_at - job.created_at).total_seconds()
+            for job in GenerationJob.objects.filter(pk__in=[r.job_id for r in results if r.job_id])
+            if job.started_at
+        ]
+    finally:
+        for service in services.values():
+            service.stop()
+        if not keep:
+            user.delete()
+            VideoCacheEntry.objects.filter(video_id__in=video_ids).delete()
+
+    succeeded = [r for r in results if r.ok]
+    stages = {stage: summarize(samples) for stage, samples in timer.samples.items()}
+    if queue_waits:
+        stages['queue_wait'] = summarize(queue_waits)
+    return {
+        'config': {
+            'mode': mode, 'runner': runner, 'requests': requests, 'concurrency': concurrency, 'unique_videos': unique_videos,
+            'audio_bytes': audio_bytes, 'transcript_words': transcript_words, 'caption_ratio': caption_ratio,
+            'services': {name: vars(service.profile) for name, service in services.items()},
+        },
+        'wall_seconds': wall,
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'jobs_per_minute': len(succeeded) / wall * 60 if wall else 0.0,
+        'latency': summarize([r.latency for r in succeeded]),
+        'first_token': summarize([r.first_token for r in succeeded if r.first_token is not None]),
+        'stages': stages,
+        'service_calls': {name: {'requests': s.requests, 'failures': s.failures} for name, s in services.items()},
+        'errors': dict(Counter(r.error for r in results if not r.ok).most_common(5)),
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance=0.2):
+    """Regressions of report against baseline (slower percentiles or lower throughput), as messages"""
+    regressions = []
+
+    def check(label, current, previous):
+        if current is not None and previous and current > previous * (1 + tolerance):
+            regressions.append(f"{label}: {current:.3f}s vs {previous:.3f}s baseline (+{current / previous - 1:.0%})")
+
+    for pct in ('p50', 'p95', 'p99'):
+        check(f"end-to-end {pct}", report['latency'].get(pct), baseline['latency'].get(pct))
+    for stage, summary in report['stages'].items():
+        check(f"{stage} p95", summary.get('p95'), baseline['stages'].get(stage, {}).get('p95'))
+
+    previous_rate = baseline.get('jobs_per_minute')
+    if previous_rate and report['jobs_per_minute'] < previous_rate * (1 - tolerance):
+        regressions.append(
+            f"throughput: {report['jobs_per_minute']:.1f} jobs/min vs {previous_rate:.1f} baseline "
+            f"({report['jobs_per_minute'] / previous_rate - 1:.0%})"
+        )
+    return regressions
+
+
+def format_report(report):
+    def seconds(value):
+        return '-' if value is None else f"{value:.3f}s"
+
+    lines = [
+        f"{report['succeeded']} succeeded, {report['failed']} failed in {report['wall_seconds']:.1f}s "
+        f"-> {report['jobs_per_minute']:.1f} jobs/min",
+        f"{'':<16}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}",
+    ]
+    rows = [('end-to-end', report['latency']), ('first token', report['first_token'])]
+    rows += sorted(report['stages'].items())
+    for label, summary in rows:
+        if summary['count']:
+            lines.append(f"{label:<16}{summary['count']:>7}{seconds(summary['p50']):>10}{seconds(summary['p95']):>10}"
+                         f"{seconds(summary['p99']):>10}{seconds(summary['max']):>10}")
+    calls = ", ".join(f"{name} {c['requests']} ({c['failures']} failed)" for name, c in report['service_calls'].items())
+    lines.append(f"Fake service calls: {calls}")
+    for error, count in report['errors'].items():
+        lines.append(f"  {count} x {error}")
+    return "\n".join(lines)
@@ -0,0 +1,143 @@
+"""Transcripts from existing YouTube caption tracks.
+
+yt-dlp's metadata already lists a video's subtitle tracks (``subtitles``
+for uploaded captions, ``automatic_captions`` for YouTube's own speech
+recognition), so when a usable track exists the transcript is one small
+HTTP request away and the audio download and AssemblyAI run are skipped.
+
+Tracks are fetched as SRV3 (YouTube's timed-text XML) or WebVTT. Auto
+captions in both formats repeat each line while it scrolls ("rolling"
+captions), so for them consecutive duplicate lines are dropped when they
+are joined. Uploaded captions are kept line for line: a repeated line there
+(a chorus, a repeated answer) is really said twice.
+"""
+import html
+import re
+import xml.etree.ElementTree as ET
+
+from django.conf import settings
+
+from . import http_client
+from .models import BlogPost
+
+FORMAT_PREFERENCE = ('srv3', 'vtt')
+
+VTT_TIMING_RE = re.compile(r'^(\d{2}:)?\d{2}:\d{2}\.\d{3}\s+-->')
+VTT_TAG_RE = re.compile(r'<[^>]*>')
+SOUND_TAG_RE = re.compile(r'\[[A-Za-z ]+\]')  # [Music], [Applause], ...
+
+
+def dedupe_lines(lines, rolling=False):
+    """Normalize whitespace and drop empty lines; with ``rolling``, also lines repeating the previous one"""
+    kept = []
+    for line in lines:
+        line = " ".join(SOUND_TAG_RE.sub(' ', line).split())
+        if line and not (rolling and kept and line == kept[-1]):
+            kept.append(line)
+    return kept
+
+
+def parse_vtt(text, rolling=False):
+    lines = []
+    block_kind = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            block_kind = None
+            continue
+        if block_kind is None:
+            # First line of a block decides what it is; NOTE/STYLE/REGION blocks and the header are skipped
+            if line.startswith(('WEBVTT', 'NOTE', 'STYLE', 'REGION')):
+                block_kind = 'skip'
+                continue
+            block_kind = 'cue'
+            if not VTT_TIMING_RE.match(line):
+                continue  # cue identifier
+        if block_kind == 'skip' or VTT_TIMING_RE.match(line):
+            continue
+        lines.append(html.unescape(VTT_TAG_RE.sub('', line)))
+    return dedupe_lines(lines, rolling)
+
+
+def parse_srv3(text, rolling=False):
+    root = ET.fromstring(text)
+    lines = []
+    for paragraph in root.iter('p'):
+        lines.extend("".join(paragraph.itertext()).splitlines())
+    return dedupe_lines(lines, rolling)
+
+
+PARSERS = {'srv3': parse_srv3, 'vtt': parse_vtt}
+
+
+def _language_candidates(info):
+    preferred = [info.get('language')] if info.get('language') else []
+    return preferred + [lang for lang in settings.CAPTION_LANGUAGES if lang not in preferred]
+
+
+def _pick_format(tracks):
+    by_ext = {track.get('ext'): track for track in tracks if track.get('url')}
+    for ext in FORMAT_PREFERENCE:
+        if ext in by_ext:
+            return by_ext[ext]
+    return None
+
+
+def pick_caption_track(info):
+    """Best caption track as (source, language, track), or None.
+
+    Uploaded captions win over automatic ones. For automatic captions only
+    the original-language track counts: the other languages YouTube offers
+    are machine translations of it.
+    """
+    languages = _language_candidates(info)
+
+    subtitles = info.get('subtitles') or {}
+    for lang in languages:
+        for key in (lang, *sorted(k for k in subtitles if k.startswith(f'{lang}-'))):
+            track = _pick_format(subtitles.get(key) or [])
+            if track:
+                return BlogPost.SOURCE_CAPTIONS, key, track
+
+    automatic = info.get('automatic_captions') or {}
+    for lang in languages:
+        for key in (f'{lang}-orig', lang):
+            track = _pick_format(automatic.get(key) or [])
+            if track:
+                return BlogPost.SOURCE_AUTO_CAPTIONS, key, track
+    return None
+
+
+async def aget_caption_transcript(info):
+    """(source, transcript) from the video's captions, or None if there is no usable track"""
+    if not info:
+        return None
+    picked = pick_caption_track(info)
+    if picked is None:
+        return None
+    source, lang, track = picked
+
+    try:
+        response = await http_client.aget(track['url'], headers=info.get('http_headers') or {}, timeout=(5, 30))
+        response.raise_for_status()
+        response.encoding = 'utf-8'
+    except Exception as e:
+        print(f"Could not read {lang} {track['ext']} captions: {e}")
+        return None
+    return transcript_from_track(source, lang, track, response.text)
+
+
+def transcript_from_track(source, lang, track, text):
+    """Parse a fetched caption track into (source, transcript); None if it is unreadable or too short"""
+    try:
+        lines = PARSERS[track['ext']](text, rolling=source == BlogPost.SOURCE_AUTO_CAPTIONS)
+    except Exception as e:
+        print(f"Could not read {lang} {track['ext']} captions: {e}")
+        return None
+
+    transcript = " ".join(lines)
+    if len(transcript.split()) < settings.CAPTION_MIN_WORDS:
+        print(f"{lang} captions too short ({len(transcript.split())} words), ignoring them")
+        return None
+    print(f"Using {source} ({lang}, {track['ext']}): {len(transcript)} chars")
+    return source, transcript
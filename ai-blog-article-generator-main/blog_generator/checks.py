@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_page_cache_backend(app_configs, **kwargs):
+    # Posts saved by run_generation_worker would never invalidate the web processes' fragments
+    if settings.PAGE_CACHE_BACKEND == 'locmem' and settings.GENERATION_JOB_RUNNER == 'external':
+        return [Error(
+            "PAGE_CACHE_BACKEND = 'locmem' cannot be invalidated by run_generation_worker.",
+            hint="Use 'file' or 'redis' with GENERATION_JOB_RUNNER = 'external'.",
+            id='blog_generator.E001',
+        )]
+    return []
@@ -0,0 +1,97 @@
+"""Derived representations of generated blog content.
+
+BlogPost stores an excerpt, word count, reading time and pre-rendered HTML
+alongside generated_content; they are computed here once, when the post is
+saved, so read paths never have to parse the full content again.
+"""
+import math
+import re
+
+from bs4 import BeautifulSoup
+from django.utils.html import escape
+
+WORDS_PER_MINUTE = 200
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*)$')
+LIST_ITEM_RE = re.compile(r'^\s*(?:[-*]|\d+\.)\s+')
+BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+ITALIC_RE = re.compile(r'(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?![*\w])')
+CITATION_RE = re.compile(r'\s*\[\d+\]')
+MARKDOWN_MARKUP_RE = re.compile(r'(^|\n)\s*(#{1,6}|[-*]|\d+\.)\s+|\*\*|__')
+
+HEADING_CLASSES = {
+    1: 'text-3xl font-bold text-purple-700 mb-4',
+    2: 'text-2xl font-semibold text-indigo-700 mt-6 mb-3',
+    3: 'text-xl font-semibold text-indigo-700 mt-4 mb-2',
+}
+
+
+def build_summary(text: str, min_len: int = 600, max_len: int = 800) -> str:
+    if not text:
+        return ""
+
+    text = " ".join(text.split())  # normalize spaces
+
+    if len(text) <= min_len:
+        return text
+
+    if len(text) <= max_len:
+        return text
+
+    cutoff = text.rfind(" ", 0, max_len)
+    if cutoff == -1:
+        cutoff = max_len
+
+    return text[:cutoff].rstrip() + "..."
+
+
+def plain_text(content):
+    """Reader-visible text: HTML tags and markdown markup removed"""
+    text = BeautifulSoup(content or "", "html.parser").get_text()
+    text = MARKDOWN_MARKUP_RE.sub(lambda m: m.group(1) or '', text)
+    text = ITALIC_RE.sub(r'\1', text)
+    return CITATION_RE.sub('', text)
+
+
+def _inline(text):
+    text = escape(text)
+    text = BOLD_RE.sub(r'<strong>\1</strong>', text)
+    return ITALIC_RE.sub(r'<em>\1</em>', text)
+
+
+def render_html(content):
+    """Sanitized HTML for generated markdown-ish content.
+
+    Same rules as the original client-side conversion in index.html (blank
+    line separated blocks, #/## headings, -/* lists), plus bold/italic.
+    All text is escaped first, so the result is safe to mark safe.
+    """
+    blocks = []
+    for block in re.split(r'\n\s*\n', (content or '').strip()):
+        block = block.strip()
+        if not block:
+            continue
+        lines = block.split('\n')
+
+        heading = HEADING_RE.match(block)
+        if heading and len(lines) == 1:
+            level = min(len(heading.group(1)), 3)
+            blocks.append(f'<h{level} class="{HEADING_CLASSES[level]}">{_inline(heading.group(2))}</h{level}>')
+        elif all(LIST_ITEM_RE.match(line) for line in lines):
+            items = ''.join(f'<li>{_inline(LIST_ITEM_RE.sub("", line, count=1).strip())}</li>' for line in lines)
+            blocks.append(f'<ul class="list-disc list-inside ml-4 space-y-2">{items}</ul>')
+        else:
+            blocks.append(f'<p class="leading-relaxed">{"<br>".join(_inline(line) for line in lines)}</p>')
+    return ''.join(blocks)
+
+
+def derive_fields(content):
+    """Values of BlogPost's derived columns for the given generated_content"""
+    text = plain_text(content)
+    word_count = len(text.split())
+    return {
+        'excerpt': build_summary(text, min_len=600, max_len=800),
+        'word_count': word_count,
+        'reading_time': max(1, math.ceil(word_count / WORDS_PER_MINUTE)) if word_count else 0,
+        'rendered_html': render_html(content),
+    }
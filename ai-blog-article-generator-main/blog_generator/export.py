@@ -0,0 +1,139 @@
+"""Streaming ZIP export of a user's blog posts.
+
+``iter_export`` yields the archive as it is written: posts are read in
+keyset batches of EXPORT_BATCH_SIZE, each post becomes a Markdown file
+and, optionally, its PDF, and the bytes zipfile writes are handed to the
+response after every entry. Memory stays at one batch of posts plus the
+PDFs rendering ahead, however many posts there are.
+
+PDFs come from pdf_cache, so cached ones are reused and missing ones are
+rendered on its process pool. Up to EXPORT_PDF_LOOKAHEAD posts ahead of
+the one being written are rendering at a time.
+"""
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .pdf_cache import get_pdf_path
+
+EXPORT_FIELDS = ('id', 'youtube_title', 'youtube_link', 'created_at', 'generated_content', 'rendered_html')
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class _StreamBuffer:
+    """Write-only file for zipfile whose contents are taken out with drain()"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self.data)
+        self.data.clear()
+        return data
+
+
+def iter_posts(queryset, batch_size):
+    """Posts of queryset by ascending id, loaded batch_size rows at a time"""
+    queryset = queryset.only(*EXPORT_FIELDS).order_by('id')
+    last_id = 0
+    while True:
+        # Keyset batches: MySQL drivers buffer whole result sets, so iterator() alone would not bound memory
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield from batch
+        last_id = batch[-1].id
+
+
+def entry_name(post):
+    return f"{post.pk}-{slugify(post.youtube_title)[:60] or 'blog'}"
+
+
+def post_markdown(post):
+    return (
+        f"# {post.youtube_title}\n\n"
+        f"Source: {post.youtube_link}  \n"
+        f"Generated: {timezone.localtime(post.created_at):%Y-%m-%d %H:%M}\n\n"
+        f"{post.generated_content}\n"
+    )
+
+
+def _zip_info(name, post, compress_type):
+    info = zipfile.ZipInfo(name, date_time=timezone.localtime(post.created_at).timetuple()[:6])
+    info.compress_type = compress_type
+    return info
+
+
+def _render_pdf(post):
+    def render_html():
+        return render_to_string('blog_pdf.html', {'blog_article_detail': post})
+
+    return get_pdf_path(post.pk, post.content_hash, render_html)
+
+
+def _with_pdfs(posts, pool):
+    """(post, future of its PDF path or None), keeping EXPORT_PDF_LOOKAHEAD renders in flight"""
+    if pool is None:
+        for post in posts:
+            yield post, None
+        return
+    pending = deque()
+    for post in posts:
+        pending.append((post, pool.submit(_render_pdf, post)))
+        if len(pending) > settings.EXPORT_PDF_LOOKAHEAD:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def iter_export(queryset, include_pdf=False):
+    """Yield a ZIP of the posts in queryset: <id>-<title>.md, plus .pdf with include_pdf"""
+    buffer = _StreamBuffer()
+    failed = []
+    pool = ThreadPoolExecutor(max_workers=settings.PDF_RENDER_WORKERS, thread_name_prefix='export-pdf') \
+        if include_pdf else None
+    try:
+        # zipfile streams to a non-seekable file by writing a data descriptor after each entry
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for post, pdf in _with_pdfs(iter_posts(queryset, settings.EXPORT_BATCH_SIZE), pool):
+                name = entry_name(post)
+                archive.writestr(_zip_info(f"{name}.md", post, zipfile.ZIP_DEFLATED), post_markdown(post))
+                yield buffer.drain()
+                if pdf is None:
+                    continue
+
+                try:
+                    source = open(pdf.result(), 'rb')
+                except Exception as e:
+                    print(f"Export: no PDF for blog {post.pk}: {type(e).__name__}: {e}")
+                    failed.append(f"{name}.pdf")
+                    continue
+                # PDFs are compressed already
+                with source, archive.open(_zip_info(f"{name}.pdf", post, zipfile.ZIP_STORED), 'w') as dest:
+                    while chunk := source.read(COPY_CHUNK_SIZE):
+                        dest.write(chunk)
+                        yield buffer.drain()
+
+            if failed:
+                archive.writestr('export-errors.txt', "These PDFs could not be rendered:\n" + "\n".join(failed) + "\n")
+        # The central directory
+        yield buffer.drain()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def export_filename(user):
+    return f"blogs-{slugify(user.get_username()) or 'export'}-{timezone.localdate():%Y-%m-%d}.zip"
@@ -0,0 +1,321 @@
+"""Local stand-ins for YouTube, AssemblyAI and the chat-completions API.
+
+Used by the ``benchmark_generation`` command to run the whole pipeline
+offline. Each service is a small threaded HTTP server on 127.0.0.1 with
+its own latency and failure rate, so every external hop still goes
+through the real clients (http_client's async and blocking clients, yt-dlp's
+format selection) - only the far end is fake:
+
+* FakeYouTube serves audio formats and VTT captions, and ``FakeYoutubeIE``
+  is a yt-dlp extractor for youtube.com / youtu.be links whose metadata
+  points at it.
+* FakeAssemblyAI implements /v2/upload and /v2/transcript.
+* FakeChat implements /chat/completions, streamed or not.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import ExtractorError
+
+WORDS = (
+    "the video explains how small changes in a process add up over time and why measuring each step "
+    "matters more than guessing where the time goes so we start with a simple example and build on it"
+).split()
+
+
+class ServiceProfile:
+    """Latency (mean seconds, +/- jitter fraction) and failure rate of one fake service"""
+
+    def __init__(self, latency=0.0, jitter=0.2, failure_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+
+    def delay(self):
+        if self.latency > 0:
+            time.sleep(max(0.0, random.uniform(1 - self.jitter, 1 + self.jitter) * self.latency))
+
+    def fails(self):
+        return random.random() < self.failure_rate
+
+
+def fake_transcript(video_id, words):
+    rng = random.Random(video_id)
+    sentences = []
+    count = 0
+    while count < words:
+        length = rng.randint(8, 20)
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + ".")
+        count += length
+    return " ".join(sentences)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return bytes(body)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def send(self, status, body=b'', content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.service.handle(self, 'GET')
+
+    def do_POST(self):
+        self.service.handle(self, 'POST')
+
+
+class FakeService:
+    """Base class: runs a ThreadingHTTPServer on a free local port"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        handler = type(f'{type(self).__name__}Handler', (_Handler,), {'service': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.failures += failed
+
+    def handle(self, handler, method):
+        raise NotImplementedError
+
+
+class FakeYouTube(FakeService):
+    """Media and caption server behind FakeYoutubeIE.
+
+    ``profile`` applies to metadata extraction (done in FakeYoutubeIE);
+    media and captions are served without extra latency.
+    """
+
+    def __init__(self, profile, audio_bytes=256 * 1024, transcript_words=1500, caption_ratio=0.0):
+        super().__init__(profile)
+        self.audio_bytes = audio_bytes
+        self.transcript_words = transcript_words
+        self.caption_ratio = caption_ratio
+
+    def has_captions(self, video_id):
+        return random.Random(f"captions-{video_id}").random() < self.caption_ratio
+
+    def video_info(self, video_id):
+        """What the YouTube extractor would return for the video, pointing at this server"""
+        self.profile.delay()
+        failed = self.profile.fails()
+        self.count(failed)
+        if failed:
+            raise ExtractorError(f"{video_id}: fake extraction failure", expected=True)
+
+        duration = max(60, self.transcript_words * 60 // 150)  # ~150 spoken words a minute
+        formats = []
+        for format_id, ext, acodec, abr in (('249', 'webm', 'opus', 50), ('251', 'webm', 'opus', 160),
+                                            ('140', 'm4a', 'mp4a.40.2', 128)):
+            formats.append({
+                'format_id': format_id,
+                'url': f"{self.base_url}/media/{video_id}/{format_id}.{ext}",
+                'ext': ext,
+                'acodec': acodec,
+                'vcodec': 'none',
+                'abr': abr,
+                'filesize': self.audio_bytes * abr // 50,
+                'protocol': 'http',
+            })
+        info = {
+            'id': video_id,
+            'title': f"Benchmark video {video_id}",
+            'duration': duration,
+            'language': 'en',
+            'formats': formats,
+            'subtitles': {},
+            'automatic_captions': {},
+        }
+        if self.has_captions(video_id):
+            info['automatic_captions']['en'] = [{'ext': 'vtt', 'url': f"{self.base_url}/captions/{video_id}.vtt"}]
+        return info
+
+    def caption_vtt(self, video_id):
+        words = fake_transcript(video_id, self.transcript_words).split()
+        cues = ["WEBVTT", ""]
+        previous = ""
+        for index in range(0, len(words), 8):
+            line = " ".join(words[index:index + 8])
+            start = index // 8 * 2
+            # Rolling auto-captions: every cue repeats the previous line
+            cues += [f"00:{start // 60:02d}:{start % 60:02d}.000 --> 00:{(start + 2) // 60:02d}:{(start + 2) % 60:02d}.000",
+                     previous, line, ""]
+            previous = line
+        return "\n".join(cues).encode('utf-8')
+
+    def handle(self, handler, method):
+        parts = handler.path.strip('/').split('/')
+        if parts[0] == 'media' and len(parts) == 3:
+            abr = {'249': 50, '251': 160, '140': 128}.get(parts[2].split('.')[0], 50)
+            handler.send(200, b'\0' * (self.audio_bytes * abr // 50), 'application/octet-stream')
+        elif parts[0] == 'captions' and len(parts) == 2:
+            handler.send(200, self.caption_vtt(parts[1].split('.')[0]), 'text/vtt')
+        else:
+            handler.send(404, {'error': 'not found'})
+
+
+class FakeAssemblyAI(FakeService):
+    """/v2/upload and /v2/transcript; a transcript completes ``profile.latency`` after it is requested"""
+
+    def __init__(self, profile, transcript_words=1500):
+        super().__init__(profile)
+        self.transcript_words = transcript_words
+        self.transcripts = {}
+
+    def handle(self, handler, method):
+        path = handler.path.rstrip('/')
+        if method == 'POST' and path == '/v2/upload':
+            size = len(handler.read_body())
+            handler.send(200, {'upload_url': f"{self.base_url}/uploads/{uuid.uuid4().hex}?bytes={size}"})
+        elif method == 'POST' and path == '/v2/transcript':
+            request = json.loads(handler.read_body() or b'{}')
+            transcript_id = uuid.uuid4().hex
+            failed = self.profile.fails()
+            self.count(failed)
+            with self._lock:
+                self.transcripts[transcript_id] = {
+                    'ready_at': time.monotonic() + self.profile.latency * random.uniform(
+                        1 - self.profile.jitter, 1 + self.profile.jitter),
+                    'audio_url': request.get('audio_url', ''),
+                    'failed': failed,
+                }
+            handler.send(200, self.transcript_body(transcript_id, 'queued'))
+        elif method == 'GET' and path.startswith('/v2/transcript/'):
+            transcript_id = path.rsplit('/', 1)[1]
+            if transcript_id not in self.transcripts:
+                handler.send(404, {'error': 'not found'})
+                return
+            entry = self.transcripts[transcript_id]
+            if time.monotonic() < entry['ready_at']:
+                handler.send(200, self.transcript_body(transcript_id, 'processing'))
+            elif entry['failed']:
+                handler.send(200, self.transcript_body(transcript_id, 'error', error='fake transcription failure'))
+            else:
+                handler.send(200, self.transcript_body(transcript_id, 'completed'))
+        else:
+            handler.send(404, {'error': 'not found'})
+
+    def transcript_body(self, transcript_id, status, error=None):
+        entry = self.transcripts[transcript_id]
+        return {
+            'id': transcript_id,
+            'status': status,
+            'audio_url': entry['audio_url'],
+            'error': error,
+            'text': fake_transcript(entry['audio_url'], self.transcript_words) if status == 'completed' else None,
+        }
+
+
+class FakeChat(FakeService):
+    """OpenAI-style /chat/completions; ``profile.latency`` is the time to the first token"""
+
+    def __init__(self, profile, reply_words=600, token_delay=0.0):
+        super().__init__(profile)
+        self.reply_words = reply_words
+        self.token_delay = token_delay
+
+    def reply(self, max_tokens):
+        words = fake_transcript(uuid.uuid4().hex, min(self.reply_words, max_tokens or self.reply_words)).split()
+        paragraphs = [" ".join(words[index:index + 60]) for index in range(0, len(words), 60)]
+        return "# Benchmark article\n\n" + "\n\n".join(paragraphs)
+
+    def handle(self, handler, method):
+        if method != 'POST' or handler.path.rstrip('/') != '/chat/completions':
+            handler.send(404, {'error': 'not found'})
+            return
+        request = json.loads(handler.read_body() or b'{}')
+        self.profile.delay()
+        failed = self.profile.fails()
+        self.count(failed)
+        if failed:
+            handler.send(503, {'error': 'fake upstream failure'})
+            return
+
+        content = self.reply(request.get('max_tokens'))
+        if not request.get('stream'):
+            handler.send(200, {'choices': [{'message': {'role': 'assistant', 'content': content}}]})
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+        for token in content.split(' '):
+            chunk = {'choices': [{'delta': {'content': token + ' '}}]}
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            handler.wfile.flush()
+            if self.token_delay:
+                time.sleep(self.token_delay)
+        handler.wfile.write(b"data: [DONE]\n\n")
+
+
+class FakeYoutubeIE(InfoExtractor):
+    """yt-dlp extractor answering YouTube video links from a FakeYouTube server"""
+    IE_NAME = 'fakeyoutube'
+    _VALID_URL = r'https?://(?:(?:www|m)\.)?(?:youtube\.com/(?:watch\?v=|shorts/)|youtu\.be/)(?P<id>[A-Za-z0-9_-]{11})'
+    youtube = None  # set by fake_youtube_dl()
+
+    def _real_extract(self, url):
+        return self.youtube.video_info(self._match_id(url))
+
+
+def fake_youtube_dl(youtube):
+    """A YoutubeDL subclass that tries FakeYoutubeIE (backed by ``youtube``) before the real extractors"""
+    extractor = type('FakeYoutubeIE', (FakeYoutubeIE,), {'youtube': youtube})
+
+    class FakeYoutubeDL(yt_dlp.YoutubeDL):
+        def __init__(self, params=None, auto_init=True):
+            super().__init__(params, auto_init)
+            ie = extractor()
+            self.add_info_extractor(ie)
+            key = ie.ie_key()
+            self._ies = {key: self._ies.pop(key), **self._ies}
+
+    return FakeYoutubeDL
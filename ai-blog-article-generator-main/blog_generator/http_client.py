@@ -0,0 +1,324 @@
+"""Shared outbound HTTP clients for the providers.
+
+* blocking callers get one ``requests.Session`` per host, so connections are
+  kept alive and reused (pool size HTTP_POOL_MAXSIZE per host)
+* coroutines (``arequest``) share one ``httpx.AsyncClient`` per process,
+  living on the I/O loop of async_pipeline, with at most
+  ASYNC_HTTP_MAX_CONNECTIONS connections open across all hosts
+* 429/5xx responses and connection errors are retried with jittered
+  exponential backoff; a ``Retry-After`` header wins over the computed delay
+* a per-host circuit breaker opens after HTTP_BREAKER_THRESHOLD consecutive
+  failures and fails fast for HTTP_BREAKER_COOLDOWN seconds, then lets a
+  single trial request through
+* ``pool_stats()`` reports connection pool hits (reused connections) and
+  misses (new connections) per host, exported as blog_http_pool_requests_total
+* hosts in PROVIDER_RATE_LIMITS are paced: each attempt first takes a token
+  from the host's shared bucket (see rate_limit.py), waiting if needed
+* every attempt is timed into the blog_outbound_request_duration_seconds
+  histogram (see metrics.py)
+
+Both clients follow the same rules through ``_Attempts`` and share the
+breakers, so a host failing for one fails fast for the other.
+"""
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics, rate_limit
+from .async_pipeline import io_loop
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without sending a request while a host's circuit breaker is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial_in_flight:
+                return False
+            # Half-open: let one request through to probe the provider
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        """End a half-open trial that never reached the provider, leaving the failure count alone"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+_sessions = {}
+_breakers = {}
+_lock = threading.Lock()
+_async_client = None
+_async_client_loop = None
+
+
+def _host_key(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url):
+    key = _host_key(url)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.HTTP_POOL_MAXSIZE)
+            session.mount(key, adapter)
+            _sessions[key] = session
+        return session
+
+
+def get_breaker(url):
+    key = _host_key(url)
+    with _lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(settings.HTTP_BREAKER_THRESHOLD, settings.HTTP_BREAKER_COOLDOWN)
+            _breakers[key] = breaker
+        return breaker
+
+
+def retry_after_seconds(response):
+    """Parse Retry-After (delta-seconds or HTTP-date); None if absent or invalid"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, response=None):
+    if response is not None:
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return min(retry_after, settings.HTTP_BACKOFF_MAX)
+    # "Full jitter" exponential backoff
+    return random.uniform(0, min(settings.HTTP_BACKOFF_MAX, settings.HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+class _Attempts:
+    """Breaker, retry and metrics bookkeeping of one request, shared by request() and arequest()"""
+
+    def __init__(self, method, url, retries):
+        self.method = method
+        self.host_key = _host_key(url)
+        self.host = urlsplit(url).netloc
+        self.retries = settings.HTTP_MAX_RETRIES if retries is None else retries
+        self.breaker = get_breaker(url)
+        self.attempt = 0
+        self.start = None
+
+    def begin(self):
+        """Start an attempt once it is paced; raises CircuitOpenError while the host's breaker is open"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.host_key}, not sending request")
+        self.start = time.perf_counter()
+
+    def _observe(self, status):
+        metrics.observe_request(self.host, self.method, status, time.perf_counter() - self.start)
+
+    def connection_failed(self, error):
+        """Seconds to wait before retrying a connection error or timeout; None to raise it"""
+        self._observe(type(error).__name__)
+        self.breaker.record_failure()
+        return self._retry_delay() if self.attempt < self.retries else None
+
+    def aborted(self, error):
+        # Anything else (an invalid URL, an error raised by a streamed upload body) says nothing about
+        # the provider's health: hand back a half-open trial without counting a failure
+        self._observe(type(error).__name__)
+        self.breaker.release_trial()
+
+    def responded(self, response):
+        """Seconds to wait before retrying this response; None to return it"""
+        self._observe(response.status_code)
+        if response.status_code not in RETRY_STATUSES:
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        return self._retry_delay(response) if self.attempt < self.retries else None
+
+    def _retry_delay(self, response=None):
+        delay = backoff_delay(self.attempt, response)
+        self.attempt += 1
+        metrics.OUTBOUND_RETRIES.inc(host=self.host)
+        print(f"Retrying {self.method} {self.host_key} in {delay:.1f}s (attempt {self.attempt + 1} of {self.retries + 1})")
+        return delay
+
+
+def request(method, url, retries=None, **kwargs):
+    """Send a request through the pooled session for the URL's host.
+
+    Retryable responses are returned as-is once the retries are used up, so
+    callers keep checking ``status_code``. Pass ``retries=0`` for bodies
+    that cannot be replayed (e.g. a streamed upload).
+    """
+    session = get_session(url)
+    attempts = _Attempts(method, url, retries)
+    while True:
+        # Paced before asking the breaker: a half-open allow() hands out the one trial, which only a sent request returns
+        rate_limit.wait_for_provider(attempts.host_key)
+        attempts.begin()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            delay = attempts.connection_failed(e)
+            if delay is None:
+                raise
+        except Exception as e:
+            attempts.aborted(e)
+            raise
+        else:
+            delay = attempts.responded(response)
+            if delay is None:
+                return response
+            response.close()
+        time.sleep(delay)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def get_async_client():
+    """The process's httpx.AsyncClient; it belongs to the I/O loop and is only used there"""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if loop is not io_loop():
+        raise RuntimeError("The async HTTP client is only used on the I/O loop; go through async_pipeline.on_io_loop")
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_POOL_MAXSIZE,
+            ),
+            timeout=httpx.Timeout(30),
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+def httpx_timeout(timeout):
+    # Accept the (connect, read) tuples the requests-based callers use
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+async def arequest(method, url, retries=None, timeout=30, stream=False, **kwargs):
+    """request() for coroutines on the I/O loop, through the shared httpx.AsyncClient.
+
+    The same pacing, breakers, retries and metrics apply. With
+    ``stream=True`` the body is left unread and the caller must
+    ``await response.aclose()``. Pass ``retries=0`` for bodies that cannot be
+    replayed (async iterators).
+    """
+    client = get_async_client()
+    attempts = _Attempts(method, url, retries)
+    while True:
+        await rate_limit.await_provider(attempts.host_key)
+        attempts.begin()
+        try:
+            response = await client.send(
+                client.build_request(method, url, timeout=httpx_timeout(timeout), **kwargs), stream=stream,
+            )
+        except httpx.TransportError as e:
+            delay = attempts.connection_failed(e)
+            if delay is None:
+                raise
+        except Exception as e:
+            attempts.aborted(e)
+            raise
+        else:
+            delay = attempts.responded(response)
+            if delay is None:
+                return response
+            await response.aclose()
+        await asyncio.sleep(delay)
+
+
+async def aget(url, **kwargs):
+    return await arequest('GET', url, **kwargs)
+
+
+async def apost(url, **kwargs):
+    return await arequest('POST', url, **kwargs)
+
+
+def pool_stats():
+    """Connection pool hits/misses per host: a miss is a newly opened connection"""
+    stats = {}
+    with _lock:
+        sessions = list(_sessions.items())
+    for key, session in sessions:
+        adapter = session.get_adapter(key)
+        hits = misses = 0
+        pools = adapter.poolmanager.pools
+        for pool_key in list(pools.keys()):
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            misses += pool.num_connections
+            hits += max(0, pool.num_requests - pool.num_connections)
+        stats[key] = {'hits': hits, 'misses': misses}
+    return stats
+
+
+def _pool_samples():
+    return {
+        (host, result): stats[result]
+        for host, stats in pool_stats().items()
+        for result in ('hits', 'misses')
+    }
+
+
+POOL_REQUESTS = metrics.CollectedCounter(
+    'blog_http_pool_requests_total', 'Outbound requests on a reused (hits) or new (misses) pooled connection',
+    ['host', 'result'], _pool_samples)
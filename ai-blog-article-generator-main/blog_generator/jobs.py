@@ -0,0 +1,441 @@
+"""Background processing for GenerationJob rows.
+
+``generate_blog`` only records a job and returns its id; the pipeline
+stages run here. A job is a coroutine on the process's I/O loop (see
+async_pipeline): waiting on YouTube, AssemblyAI or the LLM holds no thread,
+and yt-dlp, ffmpeg and the ORM run on bounded pools. Runners:
+
+* 'async': jobs are started on the I/O loop, at most ASYNC_GENERATION_JOBS
+  at once per process
+* 'thread': each job occupies one of GENERATION_WORKERS threads while it runs
+* 'external': a separate ``manage.py run_generation_worker`` process
+
+Jobs are claimed with a conditional UPDATE, so any number of workers can
+share the same queue table.
+
+The in-process pool only hears of jobs queued by its own process, so each
+web process re-dispatches the queue on its first request (a restart loses
+the old pool's backlog) and every runner fails jobs left 'running' longer
+than GENERATION_JOB_TIMEOUT, whose worker is gone.
+
+A job whose video is already being generated by another job or stream is
+parked on that single-flight lease (waiting_on) instead of holding a worker
+while it waits; releasing the lease puts the parked jobs back in the queue.
+"""
+import asyncio
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import BlogPost, GenerationBatch, GenerationJob
+from . import metrics, single_flight
+from .async_pipeline import run_blocking, run_db, run_sync, submit
+from .audio_format import AudioLimitError
+from .pipeline import (
+    canonical_video_id, expand_video_links, extract_video_info, yt_title, aget_transcription,
+    agenerate_blog_from_transcription,
+)
+from .video_cache import get_cached_video, store_video_metadata, store_transcript
+
+TRANSCRIPT_FAILED_MESSAGE = "Failed to get transcript. Check the YouTube link, video availability, or API key status."
+GENERATION_FAILED_MESSAGE = "Failed to generate blog article from transcription."
+INTERRUPTED_MESSAGE = "Generation was interrupted before it finished. Please try again."
+
+_executor = None
+_executor_lock = threading.Lock()
+_stage_slots = {}
+_job_slots = {}
+_last_recovery = None
+_recovery_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.GENERATION_WORKERS,
+                thread_name_prefix='blog-generation',
+            )
+        return _executor
+
+
+def enqueue_generation(user, link):
+    """Create a queued job and hand it to the in-process pool (if enabled)"""
+    job = GenerationJob.objects.create(user=user, youtube_link=link)
+    # Only dispatch once the row is visible to the worker's connection
+    transaction.on_commit(lambda: dispatch_jobs([job.pk]))
+    return job
+
+
+def enqueue_batch(user, links):
+    """Expand playlists/channels in links and queue one job per distinct video"""
+    video_links = []
+    seen = set()
+    for link in links:
+        for video_link in expand_video_links(link, settings.BATCH_MAX_ITEMS):
+            key = canonical_video_id(video_link) or video_link
+            if key not in seen and len(video_links) < settings.BATCH_MAX_ITEMS:
+                seen.add(key)
+                video_links.append(video_link)
+
+    with transaction.atomic():
+        batch = GenerationBatch.objects.create(user=user, source="\n".join(links))
+        jobs = GenerationJob.objects.bulk_create([
+            GenerationJob(user=user, youtube_link=video_link, batch=batch) for video_link in video_links
+        ])
+        job_ids = [job.pk for job in jobs]
+        transaction.on_commit(lambda: dispatch_jobs(job_ids))
+    return batch, jobs
+
+
+def dispatch_jobs(job_ids):
+    """Hand queued jobs to the in-process runner; with 'external' the worker command picks them up"""
+    if settings.GENERATION_JOB_RUNNER == 'async':
+        for job_id in job_ids:
+            submit(arun_dispatched_job(job_id))
+    elif settings.GENERATION_JOB_RUNNER != 'external':
+        for job_id in job_ids:
+            get_executor().submit(run_generation_job, job_id)
+
+
+def park_job(job, key):
+    """Put a job back in the queue, out of claim_job's reach, until the lease for key is released"""
+    job.status, job.waiting_on = GenerationJob.STATUS_QUEUED, key
+    GenerationJob.objects.filter(pk=job.pk).update(status=job.status, waiting_on=key)
+    # The leader may have released between our poll and the update above, missing this job
+    wake_waiters(key)
+
+
+def wake_waiters(key):
+    """Re-queue the jobs parked on key once its lease is no longer running.
+
+    A woken job finds the leader's post (or, if it failed, takes the lease
+    over) when it runs again. The conditional UPDATE wakes each job once
+    however many releases, parks and recoveries race for it.
+    """
+    if single_flight.poll(key) is single_flight.RUNNING:
+        return
+    parked = GenerationJob.objects.filter(waiting_on=key, status=GenerationJob.STATUS_QUEUED)
+    woken = [job_id for job_id in parked.values_list('pk', flat=True)
+             if GenerationJob.objects.filter(pk=job_id, waiting_on=key).update(waiting_on='')]
+    dispatch_jobs(woken)
+
+
+def wake_orphaned_waiters():
+    """wake_waiters for every parked-on lease, for those whose leader died without releasing"""
+    for key in GenerationJob.objects.exclude(waiting_on='').values_list('waiting_on', flat=True).distinct():
+        wake_waiters(key)
+
+
+def reap_stale_jobs():
+    """Fail the jobs that have been running for longer than GENERATION_JOB_TIMEOUT; returns how many"""
+    now = timezone.now()
+    reaped = GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_RUNNING,
+        started_at__lt=now - timedelta(seconds=settings.GENERATION_JOB_TIMEOUT),
+    ).update(status=GenerationJob.STATUS_FAILED, error=INTERRUPTED_MESSAGE, finished_at=now)
+    if reaped:
+        print(f"Failed {reaped} generation jobs running for over {settings.GENERATION_JOB_TIMEOUT}s")
+    return reaped
+
+
+def recover_jobs(redispatch=False):
+    """Reap stale jobs, wake orphaned parked ones and, with ``redispatch``, hand every queued job to this process's pool"""
+    close_old_connections()
+    try:
+        reap_stale_jobs()
+        wake_orphaned_waiters()
+        if redispatch:
+            # Jobs another process claims first are skipped by claim_job
+            dispatch_jobs(list(GenerationJob.objects.filter(
+                status=GenerationJob.STATUS_QUEUED, waiting_on='',
+            ).order_by('created_at').values_list('pk', flat=True)))
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Could not recover generation jobs: {type(e).__name__}: {e}")
+    finally:
+        close_old_connections()
+
+
+def maybe_recover_jobs():
+    """Run recover_jobs in the background on this process's first request, then every GENERATION_RECOVERY_INTERVAL"""
+    global _last_recovery
+    if settings.GENERATION_JOB_RUNNER == 'external':
+        return  # run_generation_worker reaps and claims the queue itself
+    now = time.monotonic()
+    with _recovery_lock:
+        first = _last_recovery is None
+        if not first and now - _last_recovery < settings.GENERATION_RECOVERY_INTERVAL:
+            return
+        _last_recovery = now
+    threading.Thread(target=recover_jobs, kwargs={'redispatch': first}, name='blog-generation-recovery',
+                     daemon=True).start()
+
+
+def _loop_semaphore(slots, key, size):
+    # Only used on the I/O loop's thread; keyed by the loop, as the loop is replaced after a fork
+    loop_key = (asyncio.get_running_loop(), key)
+    slot = slots.get(loop_key)
+    if slot is None:
+        slot = slots[loop_key] = asyncio.Semaphore(size)
+    return slot
+
+
+def stage_slot(stage):
+    """Semaphore bounding how many jobs in this process run the stage at once"""
+    return _loop_semaphore(_stage_slots, stage, settings.GENERATION_STAGE_CONCURRENCY[stage])
+
+
+async def arun_dispatched_job(job_id):
+    """The 'async' runner: run a job once one of this process's ASYNC_GENERATION_JOBS slots is free"""
+    async with _loop_semaphore(_job_slots, None, settings.ASYNC_GENERATION_JOBS):
+        await arun_generation_job(job_id)
+
+
+def claim_job(job_id):
+    """Atomically move a queued job to running. Returns False if another worker got it (or it is parked)."""
+    claimed = GenerationJob.objects.filter(pk=job_id, status=GenerationJob.STATUS_QUEUED, waiting_on='').update(
+        status=GenerationJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+    )
+    return claimed == 1
+
+
+def claim_next_job():
+    """Claim the oldest queued job, or return None when the queue is empty"""
+    queued_ids = GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_QUEUED, waiting_on='',
+    ).order_by('created_at').values_list('pk', flat=True)[:10]
+    for job_id in queued_ids:
+        if claim_job(job_id):
+            return job_id
+    return None
+
+
+def set_stage(job, stage):
+    progress = {key: percent for key, _, percent in GenerationJob.STAGES}[stage]
+    job.stage = stage
+    job.progress = progress
+    GenerationJob.objects.filter(pk=job.pk).update(stage=stage, progress=progress)
+
+
+def fail_job(job, message):
+    metrics.STAGE_FAILURES.inc(stage=job.stage)
+    job.status = GenerationJob.STATUS_FAILED
+    job.error = message
+    job.finished_at = timezone.now()
+    GenerationJob.objects.filter(pk=job.pk).update(
+        status=job.status, error=message, finished_at=job.finished_at,
+    )
+
+
+def complete_job(job, blog_post):
+    job.blog_post = blog_post
+    job.status = GenerationJob.STATUS_SUCCEEDED
+    job.finished_at = timezone.now()
+    set_stage(job, GenerationJob.STAGE_DONE)
+    GenerationJob.objects.filter(pk=job.pk).update(
+        blog_post=blog_post, status=job.status, finished_at=job.finished_at,
+    )
+
+
+def start_job(job_id, claimed):
+    """Claim (unless the caller did) and load a job; None if another worker got it first"""
+    if not claimed and not claim_job(job_id):
+        return None
+    job = GenerationJob.objects.select_related('user').get(pk=job_id)
+    if job.started_at:
+        metrics.STAGE_SECONDS.observe((job.started_at - job.created_at).total_seconds(), stage='queued')
+    return job
+
+
+async def arun_generation_job(job_id, claimed=False):
+    """Run every pipeline stage for one job, recording progress as it goes"""
+    job = await run_db(start_job, job_id, claimed)
+    if job is None:
+        return
+    with metrics.bind(job_id=str(job.pk)):
+        await aprocess_job(job)
+
+
+def run_generation_job(job_id, claimed=False):
+    """arun_generation_job for the 'thread' runner and run_generation_worker; blocks until the job is done"""
+    run_sync(arun_generation_job(job_id, claimed))
+
+
+async def _ignore_stage(stage):
+    pass
+
+
+async def aget_title_and_transcript(link, on_stage=None, stats=None):
+    """Run the title and transcription stages, using the per-video cache when possible.
+
+    ``on_stage`` is awaited with the stage key before each stage starts;
+    ``stats`` is passed on to aget_transcription.
+    Returns (title, transcription); transcription is None if it failed.
+    Raises AudioLimitError for videos over the duration/size limits.
+    """
+    on_stage = on_stage or _ignore_stage
+    stats = stats if stats is not None else {}
+
+    await on_stage(GenerationJob.STAGE_TITLE)
+    video_id = canonical_video_id(link)
+    cached = await run_db(get_cached_video, video_id)
+    metrics.cache_lookup('video', bool(cached and cached.transcript))
+
+    if cached and cached.transcript:
+        # Repeat submission: skip the metadata extraction, download and ASR entirely
+        print(f"Video cache hit for {video_id}")
+        stats['transcript_source'] = cached.transcript_source
+        return cached.title, cached.transcript
+
+    # One metadata extraction per job, shared by the title and the download
+    async with stage_slot(GenerationJob.STAGE_TITLE):
+        with metrics.span(GenerationJob.STAGE_TITLE):
+            info = await run_blocking(extract_video_info, link)
+    title = yt_title(link, info=info)
+    await run_db(store_video_metadata, video_id, info)
+
+    await on_stage(GenerationJob.STAGE_TRANSCRIPTION)
+    async with stage_slot(GenerationJob.STAGE_TRANSCRIPTION):
+        with metrics.span(GenerationJob.STAGE_TRANSCRIPTION):
+            transcription = await aget_transcription(link, info=info, stats=stats)
+    if transcription:
+        await run_db(store_transcript, video_id, transcription, stats.get('transcript_source', ''))
+    return title, transcription
+
+
+def record_audio_stats(job, stats):
+    if 'bytes_downloaded' not in stats:
+        return  # no audio was fetched (cache hit, captions or an early failure)
+    metrics.AUDIO_BYTES.inc(stats.get('bytes_downloaded') or 0, direction='downloaded')
+    metrics.AUDIO_BYTES.inc(stats.get('bytes_uploaded') or 0, direction='uploaded')
+    job.bytes_downloaded = stats.get('bytes_downloaded')
+    job.bytes_uploaded = stats.get('bytes_uploaded')
+    GenerationJob.objects.filter(pk=job.pk).update(
+        bytes_downloaded=job.bytes_downloaded, bytes_uploaded=job.bytes_uploaded,
+    )
+    print(f"Job {job.pk} audio: {job.bytes_downloaded} bytes downloaded, {job.bytes_uploaded} bytes uploaded")
+
+
+def log_job_finished(job, stats, seconds):
+    """Count the finished job and write its one-line JSON summary"""
+    metrics.JOBS.inc(status=job.status)
+    metrics.JOB_SECONDS.observe(seconds, status=job.status)
+    metrics.log_event(
+        'job_finished',
+        status=job.status,
+        stage=job.stage,
+        seconds=round(seconds, 3),
+        timings=metrics.current_timings(),
+        transcript_source=stats.get('transcript_source'),
+        coalesced=stats.get('coalesced', False),
+        bytes_downloaded=job.bytes_downloaded,
+        bytes_uploaded=job.bytes_uploaded,
+        blog_id=job.blog_post_id,
+        error=job.error or None,
+    )
+
+
+def lead_or_park(job, key):
+    """single_flight.follow_steps for a queued job: (token, None) to lead, (None, lease) to copy a
+    finished generation, or (None, None) once the job is parked on the one still running"""
+    try:
+        next(single_flight.follow_steps(key))
+    except StopIteration as done:
+        return done.value
+    park_job(job, key)
+    return None, None
+
+
+def finish_from_lease(job, lease, stats):
+    """Finish a job with the post of the identical generation it waited for"""
+    stats['coalesced'] = True
+    stats['transcript_source'] = lease.blog_post.transcript_source
+    set_stage(job, GenerationJob.STAGE_SAVING)
+    with metrics.span(GenerationJob.STAGE_SAVING):
+        blog_post = single_flight.copy_post(lease, job.user, job.youtube_link)
+    complete_job(job, blog_post)
+
+
+def release_lease(key, token, blog_post=None, error=''):
+    """Release a lease this job or stream leads, and re-queue the jobs parked on it"""
+    if token:
+        single_flight.release(key, token, blog_post, error)
+        wake_waiters(key)
+
+
+async def arun_stages(job, stats):
+    """The pipeline stages of a job this worker leads (or runs without single-flight)"""
+    async def on_stage(stage):
+        await run_db(set_stage, job, stage)
+
+    try:
+        title, transcription = await aget_title_and_transcript(job.youtube_link, on_stage=on_stage, stats=stats)
+    except AudioLimitError as e:
+        await run_db(fail_job, job, str(e))
+        return
+    finally:
+        await run_db(record_audio_stats, job, stats)
+    if not transcription:
+        await run_db(fail_job, job, TRANSCRIPT_FAILED_MESSAGE)
+        return
+
+    await on_stage(GenerationJob.STAGE_GENERATION)
+    async with stage_slot(GenerationJob.STAGE_GENERATION):
+        with metrics.span(GenerationJob.STAGE_GENERATION):
+            blog_content = await agenerate_blog_from_transcription(transcription)
+    if not blog_content:
+        await run_db(fail_job, job, GENERATION_FAILED_MESSAGE)
+        return
+
+    await on_stage(GenerationJob.STAGE_SAVING)
+    with metrics.span(GenerationJob.STAGE_SAVING):
+        new_blog_article = await run_db(
+            BlogPost.objects.create,
+            user=job.user,
+            youtube_title=title,
+            youtube_link=job.youtube_link,
+            generated_content=blog_content,
+            transcript_source=stats.get('transcript_source', ''),
+        )
+
+    await run_db(complete_job, job, new_blog_article)
+
+
+async def aprocess_job(job):
+    start = time.perf_counter()
+    stats = {}
+    key = single_flight.generation_key(job.youtube_link)
+    token = None
+    heartbeat = None
+
+    try:
+        if key:
+            # An identical generation in flight elsewhere: wait for it instead of repeating it
+            token, lease = await run_db(lead_or_park, job, key)
+            if lease is not None:
+                await run_db(finish_from_lease, job, lease, stats)
+                return
+            if token is None:
+                return  # parked; wake_waiters re-queues it when the lease is released
+            heartbeat = asyncio.create_task(single_flight.heartbeat(key, token))
+        await arun_stages(job, stats)
+    except Exception as e:
+        traceback.print_exc()
+        print(f"CRITICAL ERROR during blog generation job {job.pk}: {type(e).__name__}: {e}")
+        await run_db(fail_job, job, f"Server processing failed: {type(e).__name__} - check server logs for details.")
+    finally:
+        if heartbeat:
+            heartbeat.cancel()
+        succeeded = job.status == GenerationJob.STATUS_SUCCEEDED
+        await run_db(release_lease, key, token, job.blog_post if succeeded else None, job.error)
+        if not job.waiting_on:
+            log_job_finished(job, stats, time.perf_counter() - start)
@@ -0,0 +1,201 @@
+"""Local CPU speech recognition with faster-whisper, parallelized over a process pool.
+
+The audio is decoded by ffmpeg to 16 kHz mono PCM and cut into segments
+of about ``target_seconds`` as it is read, each cut placed in the middle
+of a pause so no word is split. Segments are transcribed on a pool of
+worker processes (each holding its own copy of the model) while decoding
+continues, and the texts are joined in order.
+
+This module does not import Django: the pool uses the "spawn" start
+method (forking a threaded web process is unsafe), so the workers import
+it on their own. faster-whisper and numpy are optional dependencies,
+imported only when the local backend is used.
+"""
+import math
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+SAMPLE_RATE = 16000  # what Whisper models expect
+FRAME_SECONDS = 0.03  # silence is detected on 30 ms frames
+
+_pool = None
+_pool_config = None
+_pool_lock = threading.Lock()
+
+# Set in each worker process by _init_worker
+_model = None
+_language = None
+
+
+def segmenting_available():
+    """None if audio can be decoded and cut at pauses here (numpy and ffmpeg), else why not"""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return "numpy is not installed"
+    if shutil.which('ffmpeg') is None:
+        return "ffmpeg is not installed"
+    return None
+
+
+def available():
+    """None if the local backend can run here, else why not"""
+    try:
+        import faster_whisper  # noqa: F401
+    except ImportError:
+        return "faster_whisper is not installed (pip install faster-whisper)"
+    return segmenting_available()
+
+
+def iter_pcm(path, chunk_seconds=10):
+    """Decode any audio/video file to 16 kHz mono 16-bit PCM, yielding bytes chunks"""
+    process = subprocess.Popen(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-i', path,
+         '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', 'pipe:1'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    try:
+        while True:
+            data = process.stdout.read(SAMPLE_RATE * 2 * chunk_seconds)
+            if not data:
+                break
+            yield data
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {process.stderr.read().decode('utf-8', 'replace').strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def find_cut(samples, target_seconds, min_silence, silence_db):
+    """Sample index to cut ``samples`` at: the middle of the pause nearest to target_seconds.
+
+    Pauses are runs of at least min_silence seconds of frames quieter than
+    silence_db (dBFS). Without a pause past target_seconds / 2 the window is
+    cut at its end.
+    """
+    import numpy as np
+
+    frame = int(SAMPLE_RATE * FRAME_SECONDS)
+    count = len(samples) // frame
+    if count == 0:
+        return len(samples)
+    frames = samples[:count * frame].astype(np.float32).reshape(count, frame) / 32768.0
+    level = 20 * np.log10(np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10)
+    silent = np.concatenate(([0], (level < silence_db).astype(np.int8), [0]))
+    edges = np.diff(silent)
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    min_frames = math.ceil(min_silence / FRAME_SECONDS)
+    target = target_seconds / FRAME_SECONDS
+    # Pauses too early in the window would leave a uselessly short segment
+    pauses = [(start + end) // 2 for start, end in zip(starts, ends)
+              if end - start >= min_frames and (start + end) // 2 >= target / 2]
+    if not pauses:
+        return len(samples)
+    return int(min(pauses, key=lambda middle: abs(middle - target))) * frame
+
+
+def iter_segments(pcm_chunks, target_seconds=60, max_seconds=120, min_silence=0.3, silence_db=-35):
+    """Cut a stream of 16-bit PCM chunks into int16 arrays of at most max_seconds, cutting in pauses"""
+    import numpy as np
+
+    max_samples = int(max_seconds * SAMPLE_RATE)
+    pending = bytearray()
+    for chunk in pcm_chunks:
+        pending += chunk
+        while len(pending) // 2 > max_samples:
+            window = np.frombuffer(bytes(pending[:max_samples * 2]), dtype=np.int16)
+            cut = find_cut(window, target_seconds, min_silence, silence_db)
+            yield window[:cut]
+            del pending[:cut * 2]
+    if len(pending) >= 2:
+        yield np.frombuffer(bytes(pending[:len(pending) // 2 * 2]), dtype=np.int16)
+
+
+def _init_worker(model_name, compute_type, threads, language):
+    global _model, _language
+    from faster_whisper import WhisperModel
+    _model = WhisperModel(model_name, device='cpu', compute_type=compute_type, cpu_threads=threads)
+    _language = language
+
+
+def _transcribe_segment(samples):
+    import numpy as np
+
+    audio = samples.astype(np.float32) / 32768.0
+    segments, _ = _model.transcribe(audio, language=_language, beam_size=1, condition_on_previous_text=False)
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+def get_pool(workers, model_name, compute_type, threads, language):
+    """The shared worker pool, (re)created when it is missing, broken or configured differently"""
+    global _pool, _pool_config
+    config = (workers, model_name, compute_type, threads, language)
+    with _pool_lock:
+        if _pool is None or _pool_config != config:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model_name, compute_type, threads, language),
+            )
+            _pool_config = config
+        return _pool
+
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def default_workers(threads):
+    return max(1, (os.cpu_count() or 1) // max(1, threads))
+
+
+def submit_to(pool):
+    """``submit`` for transcribe_segments that runs faster-whisper on a get_pool pool"""
+    return lambda samples: pool.submit(_transcribe_segment, samples)
+
+
+def transcribe_segments(segments, submit, max_pending):
+    """Transcribe segments concurrently, with at most max_pending submitted ahead.
+
+    ``submit(samples)`` starts one segment and returns its future. Returns
+    ([(offset in seconds, result)] in order, total seconds of audio).
+    """
+    pending = deque()
+    results = []
+    seconds = 0.0
+    try:
+        for samples in segments:
+            pending.append((seconds, submit(samples)))
+            seconds += len(samples) / SAMPLE_RATE
+            # Decoding outruns recognition; don't hold the whole video in memory
+            while len(pending) >= max_pending:
+                offset, future = pending.popleft()
+                results.append((offset, future.result()))
+        while pending:
+            offset, future = pending.popleft()
+            results.append((offset, future.result()))
+    except BrokenProcessPool:
+        reset_pool()
+        raise
+    finally:
+        for _, future in pending:
+            future.cancel()
+    return results, seconds
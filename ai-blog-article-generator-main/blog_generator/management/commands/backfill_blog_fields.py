@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog_generator.content import derive_fields
+from blog_generator.models import BlogPost, posts_updated
+
+
+class Command(BaseCommand):
+    help = "Compute excerpt, word count, reading time and rendered HTML for existing blog posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows loaded and updated per batch')
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every post, not only posts that were never derived')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = BlogPost.all_objects.all()
+        if not options['all']:
+            queryset = queryset.filter(rendered_html='')
+        queryset = queryset.only('id', 'user_id', 'generated_content', *BlogPost.DERIVED_FIELDS).order_by('id')
+
+        last_id = 0
+        updated = 0
+        while True:
+            # Keyset batches: each batch is an index range scan on the primary key
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            for post in batch:
+                for field, value in derive_fields(post.generated_content).items():
+                    setattr(post, field, value)
+            with transaction.atomic():
+                BlogPost.all_objects.bulk_update(batch, BlogPost.DERIVED_FIELDS)
+            # bulk_update() sends no post_save; the cached pages show the derived fields
+            posts_updated.send(sender=BlogPost, pks=[post.pk for post in batch],
+                               user_ids={post.user_id for post in batch})
+
+            last_id = batch[-1].id
+            updated += len(batch)
+            self.stdout.write(f"Updated {updated} posts (up to id {last_id})")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} posts"))
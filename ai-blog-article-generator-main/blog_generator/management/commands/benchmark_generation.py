@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_generator.benchmark import compare_to_baseline, format_report, run_benchmark
+from blog_generator.fake_services import ServiceProfile
+
+
+class Command(BaseCommand):
+    help = "Benchmark blog generation end to end against local fake YouTube, AssemblyAI and chat services"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Number of generate-blog requests')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+        parser.add_argument('--mode', choices=['queued', 'stream'], default='queued',
+                            help='Queued jobs polled for status, or the SSE streaming response')
+        parser.add_argument('--runner', choices=['async', 'thread'], default='async',
+                            help='GENERATION_JOB_RUNNER of the queued jobs')
+        parser.add_argument('--unique-videos', type=int, default=None,
+                            help='Distinct videos to cycle through (fewer than --requests exercises the video cache)')
+        parser.add_argument('--poll-interval', type=float, default=0.05, help='Job status poll interval (s)')
+        for service, latency in (('youtube', 0.3), ('asr', 2.0), ('llm', 1.0)):
+            parser.add_argument(f'--{service}-latency', type=float, default=latency,
+                                help=f'Mean {service} latency in seconds (default {latency})')
+            parser.add_argument(f'--{service}-failure-rate', type=float, default=0.0,
+                                help=f'Fraction of {service} calls that fail')
+        parser.add_argument('--jitter', type=float, default=0.2, help='Latency jitter, as a fraction of the mean')
+        parser.add_argument('--caption-ratio', type=float, default=0.0,
+                            help='Fraction of videos that have automatic captions')
+        parser.add_argument('--audio-kb', type=int, default=256, help='Size of the ASR-grade audio format in KB')
+        parser.add_argument('--transcript-words', type=int, default=1500, help='Words per transcript')
+        parser.add_argument('--token-delay', type=float, default=0.0, help='Delay between streamed LLM tokens (s)')
+        parser.add_argument('--asr-poll-interval', type=float, default=0.25,
+                            help='AssemblyAI polling interval during the run (s)')
+        parser.add_argument('--keep', action='store_true', help="Keep the benchmark user's posts and jobs")
+        parser.add_argument('--save', help='Write the report as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against a report saved with --save')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed slowdown against the baseline before failing (fraction)')
+
+    def handle(self, *args, **options):
+        def profile(service):
+            return ServiceProfile(
+                latency=options[f'{service}_latency'],
+                jitter=options['jitter'],
+                failure_rate=options[f'{service}_failure_rate'],
+            )
+
+        report = run_benchmark(
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            mode=options['mode'],
+            unique_videos=options['unique_videos'],
+            poll_interval=options['poll_interval'],
+            youtube=profile('youtube'),
+            asr=profile('asr'),
+            llm=profile('llm'),
+            audio_bytes=options['audio_kb'] * 1024,
+            transcript_words=options['transcript_words'],
+            caption_ratio=options['caption_ratio'],
+            token_delay=options['token_delay'],
+            asr_poll_interval=options['asr_poll_interval'],
+            runner=options['runner'],
+            keep=options['keep'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(format_report(report))
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report saved to {options['save']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare_to_baseline(report, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog_generator.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Permanently delete blog posts that were soft-deleted more than --days days ago"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.DELETED_BLOG_RETENTION_DAYS,
+                            help='Keep soft-deleted posts this many days')
+        parser.add_argument('--batch-size', type=int, default=settings.PURGE_BATCH_SIZE,
+                            help='Posts deleted per batch (each batch is its own short transaction)')
+        parser.add_argument('--sleep', type=float, default=settings.PURGE_BATCH_SLEEP,
+                            help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the posts that would be deleted')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = BlogPost.all_objects.filter(deleted_at__lt=cutoff).order_by('id')
+
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} posts were deleted before {cutoff:%Y-%m-%d %H:%M}")
+            return
+
+        last_id = 0
+        purged = 0
+        while True:
+            # Keyset batches on the primary key; locks are held for one small batch at a time
+            batch = list(expired.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+
+            # The deleted_at check is repeated in case a post was restored since the batch was read;
+            # user_id is loaded for the post_delete receiver that invalidates the owner's cached pages
+            BlogPost.all_objects.filter(id__in=batch, deleted_at__lt=cutoff).only('id', 'user_id').delete()
+
+            last_id = batch[-1]
+            purged += len(batch)
+            self.stdout.write(f"Purged {purged} posts (up to id {last_id})")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} posts deleted before {cutoff:%Y-%m-%d %H:%M}"))
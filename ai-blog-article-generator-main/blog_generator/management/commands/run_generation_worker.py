@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog_generator.async_pipeline import submit
+from blog_generator.jobs import arun_generation_job, claim_next_job, reap_stale_jobs, wake_orphaned_waiters
+
+
+class Command(BaseCommand):
+    help = "Process queued blog generation jobs (use with GENERATION_JOB_RUNNER = 'external')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.ASYNC_GENERATION_JOBS,
+                            help='Number of jobs to run at the same time (as coroutines on one I/O loop)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as the queue is drained')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        self.stdout.write(f"Generation worker started with {workers} workers")
+
+        running = set()
+        last_reap = None
+        while True:
+            # Jobs whose worker (or whose lease's leader) died, this one before a restart or another, would wait forever
+            if last_reap is None or time.monotonic() - last_reap >= settings.GENERATION_RECOVERY_INTERVAL:
+                reap_stale_jobs()
+                wake_orphaned_waiters()
+                last_reap = time.monotonic()
+
+            # Fill every free slot before waiting
+            while len(running) < workers:
+                job_id = claim_next_job()
+                if job_id is None:
+                    break
+                self.stdout.write(f"Picked up job {job_id}")
+                running.add(submit(arun_generation_job(job_id, claimed=True)))
+
+            if running:
+                _, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['poll_interval'])
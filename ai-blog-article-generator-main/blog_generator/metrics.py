@@ -0,0 +1,222 @@
+"""Timing spans, counters and histograms for the generation pipeline.
+
+``span('transcription')`` times a block: the duration goes into the
+``blog_stage_duration_seconds`` histogram, into the timings of the current
+job (see ``bind``) and into a DEBUG log line carrying the current
+request/job IDs. Outbound HTTP calls are timed the same way by
+http_client.
+
+The registry is in-process (no extra dependency), so with several worker
+processes each one exposes its own numbers - scrape every process, or
+run a single one. ``render()`` produces the Prometheus text format served
+by the /metrics view.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('blog_generator')
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# {'request_id': ..., 'job_id': ..., 'timings': {span name: seconds}} of the current request/job
+_context = contextvars.ContextVar('blog_generator_context', default=None)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+
+class CollectedCounter(Counter):
+    """Counter kept by another component: ``collect()`` returns {label values: value}, read at render time"""
+
+    def __init__(self, name, help_text, labels, collect):
+        super().__init__(name, help_text, labels)
+        self.collect = collect
+
+    def render(self):
+        values = {tuple(str(value) for value in key): count for key, count in self.collect().items()}
+        with self._lock:
+            self._values = values
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            buckets, total, count = self._values.get(key, ((0,) * len(self.buckets), 0.0, 0))
+            # Buckets are cumulative: an observation counts in every bucket whose bound it is under
+            buckets = tuple(seen + (value <= bound) for seen, bound in zip(buckets, self.buckets))
+            self._values[key] = (buckets, total + value, count + 1)
+
+    def _samples(self, key, value):
+        buckets, total, count = value
+        lines = [
+            f"{self.name}_bucket{_labels(self.label_names, key, [('le', _number(float(bound)))])} {seen}"
+            for bound, seen in zip(self.buckets, buckets)
+        ]
+        lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+STAGE_SECONDS = Histogram(
+    'blog_stage_duration_seconds', 'Time spent in each pipeline stage', ['stage'], STAGE_BUCKETS)
+OUTBOUND_SECONDS = Histogram(
+    'blog_outbound_request_duration_seconds', 'Outbound HTTP request time (to response headers), per attempt',
+    ['host', 'method', 'status'], REQUEST_BUCKETS)
+OUTBOUND_RETRIES = Counter('blog_outbound_retries_total', 'Outbound HTTP requests retried', ['host'])
+JOB_SECONDS = Histogram('blog_job_duration_seconds', 'Generation time from claim to finish', ['status'], STAGE_BUCKETS)
+JOBS = Counter('blog_jobs_total', 'Finished generations', ['status'])
+STAGE_FAILURES = Counter('blog_stage_failures_total', 'Failed generations by the stage they failed in', ['stage'])
+AUDIO_BYTES = Counter('blog_audio_bytes_total', 'Audio bytes moved by the transcription stage', ['direction'])
+LLM_TOKENS = Counter('blog_llm_tokens_total', 'Tokens generated by the LLM', ['mode'])
+CACHE_REQUESTS = Counter('blog_cache_requests_total', 'Cache lookups', ['cache', 'result'])
+COALESCED_REQUESTS = Counter(
+    'blog_coalesced_requests_total', 'Generations served by an identical in-flight generation', ['result'])
+RATE_LIMITED = Counter('blog_rate_limited_total', 'Requests refused with 429, by the limit they hit', ['limit'])
+PROVIDER_WAIT_SECONDS = Histogram(
+    'blog_provider_wait_seconds', 'Time outbound requests waited for a provider rate limit token', ['host'],
+    STAGE_BUCKETS)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+# --- Context and spans -------------------------------------------------------
+
+@contextmanager
+def bind(**ids):
+    """Attach IDs (request_id, job_id) to everything logged or timed inside the block"""
+    parent = _context.get() or {}
+    context = {**{key: value for key, value in parent.items() if key != 'timings'}, **ids, 'timings': {}}
+    token = _context.set(context)
+    try:
+        yield context
+    finally:
+        _context.reset(token)
+
+
+def set_request_id(request_id):
+    """Start a fresh context for a request (not reset on exit, so streamed bodies keep it)"""
+    _context.set({'request_id': request_id, 'timings': {}})
+
+
+def current_ids():
+    context = _context.get() or {}
+    return {key: value for key, value in context.items() if key != 'timings'}
+
+
+def current_timings():
+    context = _context.get() or {}
+    return context.get('timings', {})
+
+
+def log_event(event, **fields):
+    logger.info(json.dumps({'event': event, **current_ids(), **fields}, default=str))
+
+
+@contextmanager
+def span(stage, **fields):
+    """Time a pipeline stage"""
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = current_timings()
+        timings[stage] = round(timings.get(stage, 0.0) + elapsed, 4)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps(
+                {'event': 'span', 'stage': stage, 'seconds': round(elapsed, 4), 'outcome': outcome,
+                 **current_ids(), **fields},
+                default=str,
+            ))
+
+
+def observe_request(host, method, status, seconds):
+    OUTBOUND_SECONDS.observe(seconds, host=host, method=method, status=status)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(json.dumps({'event': 'http', 'host': host, 'method': method, 'status': status,
+                                 'seconds': round(seconds, 4), **current_ids()}))
@@ -0,0 +1,45 @@
+import re
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestIdMiddleware:
+    """Give every request an ID (the incoming X-Request-ID if it looks sane) for metrics.log_event and spans.
+
+    Sync and async capable, so under ASGI the async views are not pushed onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        request_id = request.META.get('HTTP_X_REQUEST_ID', '')
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        metrics.set_request_id(request_id)
+        return request_id
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_id = self.start(request)
+        response = self.get_response(request)
+        response['X-Request-ID'] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id = self.start(request)
+        response = await self.get_response(request)
+        response['X-Request-ID'] = request_id
+        return response
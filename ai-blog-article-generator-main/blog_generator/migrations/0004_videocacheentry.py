@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0003_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoCacheEntry',
+            fields=[
+                ('video_id', models.CharField(max_length=11, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=300)),
+                ('duration', models.PositiveIntegerField(blank=True, null=True)),
+                ('transcript', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0004_videocacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlogTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('target_lang', models.CharField(max_length=10)),
+                ('translated_text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='blog_generator.blogpost')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='blogtranslation',
+            constraint=models.UniqueConstraint(fields=('post', 'content_hash', 'target_lang'), name='unique_blog_translation'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0005_blogtranslation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['user', 'deleted_at', 'created_at', 'id'], name='blogpost_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['user', 'deleted_at', 'id'], name='blogpost_user_deleted_idx'),
+        ),
+    ]
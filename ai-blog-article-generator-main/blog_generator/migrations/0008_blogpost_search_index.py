@@ -0,0 +1,49 @@
+from django.db import migrations
+
+FTS_TABLE = 'blog_generator_blogpost_fts'
+MYSQL_FULLTEXT_INDEX = 'blogpost_fulltext'
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        from blog_generator.content import plain_text
+
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, body, user_id UNINDEXED, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        BlogPost = apps.get_model('blog_generator', 'BlogPost')
+        rows = BlogPost.objects.filter(deleted_at__isnull=True).values_list(
+            'id', 'youtube_title', 'generated_content', 'user_id',
+        ).iterator(chunk_size=500)
+        with connection.cursor() as cursor:
+            for pk, title, content, user_id in rows:
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, title, body, user_id) VALUES (%s, %s, %s, %s)",
+                    [pk, title, plain_text(content), user_id],
+                )
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(
+            f"ALTER TABLE blog_generator_blogpost "
+            f"ADD FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} (youtube_title, generated_content)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(f"ALTER TABLE blog_generator_blogpost DROP INDEX {MYSQL_FULLTEXT_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0007_blogpost_derived_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0009_generationbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='bytes_downloaded',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='bytes_uploaded',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
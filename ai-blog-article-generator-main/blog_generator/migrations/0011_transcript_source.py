@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0010_generationjob_audio_bytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='transcript_source',
+            field=models.CharField(blank=True, choices=[('captions', 'YouTube captions'), ('auto_captions', 'YouTube automatic captions'), ('asr', 'Audio transcription')], max_length=16),
+        ),
+        migrations.AddField(
+            model_name='videocacheentry',
+            name='transcript_source',
+            field=models.CharField(blank=True, choices=[('captions', 'YouTube captions'), ('auto_captions', 'YouTube automatic captions'), ('asr', 'Audio transcription')], max_length=16),
+        ),
+    ]
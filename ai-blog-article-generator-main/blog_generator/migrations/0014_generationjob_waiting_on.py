@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0013_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='waiting_on',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -1,10 +1,42 @@
 from django.db import models
+from django.dispatch import Signal
 from django.contrib.auth.models import User
 from django.utils import timezone
 from bs4 import BeautifulSoup
+import hashlib
 import re
+import uuid
 
-class ActiveBlogPostManager(models.Manager):
+from .content import derive_fields
+
+# Sent with ``pks`` and ``user_ids`` after queryset updates of posts, which
+# bypass post_save: the search index and page cache handlers listen to it
+posts_updated = Signal()
+
+
+class BlogPostQuerySet(models.QuerySet):
+    # Both run a single UPDATE, which skips save() and its signals, so they
+    # send posts_updated instead
+    def soft_delete(self):
+        """Soft-delete the active posts in this queryset; returns how many were deleted"""
+        return self._set_deleted_at(timezone.now())
+
+    def restore(self):
+        """Restore the soft-deleted posts in this queryset; returns how many were restored"""
+        return self._set_deleted_at(None)
+
+    def _set_deleted_at(self, deleted_at):
+        # The receivers need the IDs, and the UPDATE is pinned to them so both see the same rows
+        rows = list(self.filter(deleted_at__isnull=deleted_at is not None).values_list('pk', 'user_id'))
+        if not rows:
+            return 0
+        pks = [pk for pk, _ in rows]
+        count = BlogPost.all_objects.filter(pk__in=pks).update(deleted_at=deleted_at)
+        posts_updated.send(sender=BlogPost, pks=pks, user_ids={user_id for _, user_id in rows})
+        return count
+
+
+class ActiveBlogPostManager(models.Manager.from_queryset(BlogPostQuerySet)):
     def get_queryset(self):
         return super().get_queryset().filter(deleted_at__isnull=True)
 
@@ -16,17 +48,218 @@ class BlogPost(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     deleted_at = models.DateTimeField(null=True, blank=True)  # soft delete timestamp
+
+    # Derived from generated_content on save (see content.derive_fields)
+    excerpt = models.TextField(blank=True, default='')
+    word_count = models.PositiveIntegerField(default=0)
+    reading_time = models.PositiveSmallIntegerField(default=0)  # minutes
+    rendered_html = models.TextField(blank=True, default='')
+
+    # Where the transcript the post was written from came from
+    SOURCE_CAPTIONS = 'captions'
+    SOURCE_AUTO_CAPTIONS = 'auto_captions'
+    SOURCE_ASR = 'asr'
+    SOURCE_CHOICES = [
+        (SOURCE_CAPTIONS, 'YouTube captions'),
+        (SOURCE_AUTO_CAPTIONS, 'YouTube automatic captions'),
+        (SOURCE_ASR, 'Audio transcription'),
+    ]
+    transcript_source = models.CharField(max_length=16, choices=SOURCE_CHOICES, blank=True)
     
     objects = ActiveBlogPostManager()  # default manager: only active (not deleted) posts
-    all_objects = models.Manager()     # includes deleted posts
+    all_objects = BlogPostQuerySet.as_manager()  # includes deleted posts
+
+    class Meta:
+        indexes = [
+            # blog_list: user = ? AND deleted_at IS NULL ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', 'deleted_at', 'created_at', 'id'], name='blogpost_user_active_idx'),
+            # recently_deleted_blogs: user = ? AND deleted_at IS NOT NULL ORDER BY deleted_at DESC, id DESC
+            models.Index(fields=['user', 'deleted_at', 'id'], name='blogpost_user_deleted_idx'),
+        ]
     
+    DERIVED_FIELDS = ('excerpt', 'word_count', 'reading_time', 'rendered_html')
+
     def __str__(self):
         return self.youtube_title
+
+    def refresh_derived_fields(self):
+        for field, value in derive_fields(self.generated_content).items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        # Only re-derive when the content may have changed
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'generated_content' in update_fields:
+            self.refresh_derived_fields()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.DERIVED_FIELDS)
+        super().save(*args, **kwargs)
     
     def soft_delete(self):
+        BlogPost.all_objects.filter(pk=self.pk).soft_delete()
         self.deleted_at = timezone.now()
-        self.save()
     
     def restore(self):
+        BlogPost.all_objects.filter(pk=self.pk).restore()
         self.deleted_at = None
-        self.save()
+
+    @property
+    def content_hash(self):
+        """SHA-256 of generated_content, used to key derived artifacts (translations, ...)"""
+        return hashlib.sha256(self.generated_content.encode('utf-8')).hexdigest()
+
+
+class BlogTranslation(models.Model):
+    """Translated text of a blog post, valid for one version of its content"""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='translations')
+    content_hash = models.CharField(max_length=64)
+    target_lang = models.CharField(max_length=10)
+    translated_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'content_hash', 'target_lang'], name='unique_blog_translation'),
+        ]
+
+    def __str__(self):
+        return f"{self.post} ({self.target_lang})"
+
+
+class VideoCacheEntry(models.Model):
+    """Title, duration and transcript of a YouTube video, keyed by its canonical video ID"""
+    video_id = models.CharField(max_length=11, primary_key=True)
+    title = models.CharField(max_length=300)
+    duration = models.PositiveIntegerField(null=True, blank=True)  # seconds
+    transcript = models.TextField(blank=True)
+    transcript_source = models.CharField(max_length=16, choices=BlogPost.SOURCE_CHOICES, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.video_id}: {self.title}"
+
+
+class GenerationBatch(models.Model):
+    """A set of generation jobs submitted together (a playlist, a channel or a list of links)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_batches')
+    source = models.TextField()  # the submitted link(s), one per line
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Batch {self.pk} ({self.user})"
+
+
+class GenerationJob(models.Model):
+    """A queued YouTube -> blog generation, processed by the worker pool in jobs.py"""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # Pipeline stages in order, with the overall progress (%) reached when the stage starts
+    STAGE_QUEUED = 'queued'
+    STAGE_TITLE = 'title'
+    STAGE_TRANSCRIPTION = 'transcription'
+    STAGE_GENERATION = 'generation'
+    STAGE_SAVING = 'saving'
+    STAGE_DONE = 'done'
+    STAGES = [
+        (STAGE_QUEUED, 'Waiting for a worker', 0),
+        (STAGE_TITLE, 'Fetching video details', 5),
+        (STAGE_TRANSCRIPTION, 'Transcribing audio', 15),
+        (STAGE_GENERATION, 'Writing the blog article', 70),
+        (STAGE_SAVING, 'Saving the blog article', 95),
+        (STAGE_DONE, 'Done', 100),
+    ]
+    STAGE_CHOICES = [(key, label) for key, label, _ in STAGES]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_jobs')
+    youtube_link = models.URLField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    stage = models.CharField(max_length=16, choices=STAGE_CHOICES, default=STAGE_QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)  # overall percent, 0-100
+    error = models.TextField(blank=True)
+    blog_post = models.ForeignKey(BlogPost, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    batch = models.ForeignKey(GenerationBatch, null=True, blank=True, on_delete=models.CASCADE, related_name='jobs')
+    # Single-flight key of the identical generation this queued job is parked on (jobs.park_job)
+    waiting_on = models.CharField(max_length=64, blank=True, db_index=True)
+    # Audio traffic of the transcription stage (null when the transcript came from the video cache)
+    bytes_downloaded = models.PositiveBigIntegerField(null=True, blank=True)
+    bytes_uploaded = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.youtube_link} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    def stage_list(self):
+        """Per-stage state (pending/running/done/failed) for the status endpoint"""
+        keys = [key for key, _, _ in self.STAGES]
+        current = keys.index(self.stage)
+        stages = []
+        for index, (key, label, _) in enumerate(self.STAGES[1:-1], start=1):
+            if index < current or self.status == self.STATUS_SUCCEEDED:
+                state = 'done'
+            elif index == current:
+                state = 'failed' if self.status == self.STATUS_FAILED else 'running'
+            else:
+                state = 'pending'
+            stages.append({'key': key, 'label': label, 'state': state})
+        return stages
+
+
+class GenerationLease(models.Model):
+    """Single-flight lease: while one request generates a video, identical requests wait for its post.
+
+    Keyed by the canonical video ID and the generation settings (single_flight.generation_key).
+    """
+
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    key = models.CharField(max_length=64, primary_key=True)
+    owner = models.CharField(max_length=32)  # random token of the request holding the lease
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    # A running lease past this time is taken over; a finished one is no longer handed out
+    expires_at = models.DateTimeField(db_index=True)
+    blog_post = models.ForeignKey(BlogPost, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket of one rate limit (see rate_limit.py), shared by all worker processes"""
+
+    key = models.CharField(max_length=100, primary_key=True)  # e.g. 'generate:user:42', 'provider:https://host'
+    tokens = models.FloatField()
+    updated_at = models.FloatField()  # epoch seconds of the last refill
+
+    def __str__(self):
+        return f"{self.key} ({self.tokens:.1f} tokens)"
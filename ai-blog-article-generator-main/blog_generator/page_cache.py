@@ -0,0 +1,69 @@
+"""Cache of rendered page fragments: a user's listing cards and a post's article body.
+
+Fragments live in the 'pages' cache (settings.PAGE_CACHE_BACKEND: local
+memory, files, or a Redis-protocol server). Keys are versioned in two ways:
+
+* PAGE_CACHE_VERSION, Django's cache key version, retires every fragment
+  when the templates change;
+* a generation per user for the listing pages (one per cursor), and one per
+  post for the article body. The signal handlers in signals.py replace the
+  generation whenever a post is saved, deleted, soft-deleted or restored,
+  so the old fragments are never read again and simply expire.
+
+Generations are timestamps rather than counters, so a generation evicted
+from the cache comes back as a new value instead of reviving old keys.
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+
+from . import metrics
+
+
+def get_cache():
+    return caches['pages']
+
+
+def _generation(scope):
+    cache = get_cache()
+    key = f"gen:{scope}"
+    generation = cache.get(key)
+    if generation is None:
+        # add() so that concurrent first readers agree on one value
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key, time.time_ns())
+    return generation
+
+
+def invalidate(pks=(), user_ids=()):
+    """Retire the cached bodies of posts pks and the listing pages of user_ids"""
+    scopes = [f"post:{pk}" for pk in pks] + [f"user:{user_id}" for user_id in user_ids]
+    if scopes:
+        generation = time.time_ns()
+        get_cache().set_many({f"gen:{scope}": generation for scope in scopes}, timeout=None)
+
+
+def _cached_fragment(name, key, render):
+    cache = get_cache()
+    fragment = cache.get(key)
+    metrics.cache_lookup(name, fragment is not None)
+    if fragment is None:
+        fragment = render()
+        cache.set(key, fragment)
+    return fragment
+
+
+def listing_cards(user_id, cursor, render):
+    """Cards (and pager) HTML of one listing page; ``render()`` builds it on a miss"""
+    cursor_key = hashlib.sha256((cursor or '').encode('utf-8')).hexdigest()[:16]
+    key = f"list:{user_id}:{_generation(f'user:{user_id}')}:{cursor_key}"
+    return mark_safe(_cached_fragment('blog_list', key, render))
+
+
+def detail_body(pk, render):
+    """(owner's user ID, article body HTML) of a post; ``render()`` returns the pair on a miss"""
+    key = f"detail:{pk}:{_generation(f'post:{pk}')}"
+    user_id, html = _cached_fragment('blog_detail', key, render)
+    return user_id, mark_safe(html)
@@ -0,0 +1,67 @@
+"""Keyset (cursor) pagination for the blog listing pages.
+
+Pages are fetched with ``WHERE (key, id) < (cursor key, cursor id)`` on an
+index-ordered query instead of OFFSET, so the cost of a page does not grow
+with the number of posts in front of it.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, is_first):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(key_value, pk):
+    raw = json.dumps([key_value.isoformat(), pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (datetime, pk), or None for a missing or malformed cursor"""
+    if not cursor:
+        return None
+    try:
+        key_value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(key_value), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_page(queryset, key_field, cursor, page_size):
+    """Newest-first page of queryset ordered by (key_field, id), starting after cursor"""
+    queryset = queryset.order_by(f'-{key_field}', '-id')
+    position = decode_cursor(cursor)
+    if position is not None:
+        key_value, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{key_field}__lt': key_value}) | Q(**{key_field: key_value, 'id__lt': pk})
+        )
+
+    # One extra row tells us whether there is a next page
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, key_field), last.pk)
+    return KeysetPage(items, next_cursor, is_first=position is None)
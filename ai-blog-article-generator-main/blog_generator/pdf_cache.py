@@ -0,0 +1,107 @@
+"""On-disk cache of rendered blog PDFs.
+
+PDFs are stored in PDF_CACHE_DIR as ``<post pk>-<content hash>.pdf``, so a
+content change produces a new file (older versions of the post's PDF are
+deleted once the new one exists). Cache misses are rendered by xhtml2pdf
+in a process pool of PDF_RENDER_WORKERS processes; concurrent requests for
+the same missing PDF share one render.
+
+This module must not import models: the pool's worker processes import it
+to run ``render_pdf_file``.
+"""
+import glob
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from . import metrics
+
+_pool = None
+_pool_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class PDFRenderError(Exception):
+    pass
+
+
+def render_pdf_file(html, path):
+    """Render HTML to a PDF at path. Runs in a worker process."""
+    from xhtml2pdf import pisa
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as dest:
+            pisa_status = pisa.CreatePDF(html, dest=dest)
+        if pisa_status.err:
+            return False
+        # Atomic publish: readers never see a half-written PDF
+        os.replace(tmp_path, path)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web worker can deadlock the child
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def cache_path(pk, content_hash):
+    return os.path.join(settings.PDF_CACHE_DIR, f"{pk}-{content_hash}.pdf")
+
+
+def remove_stale_pdfs(pk, keep_path):
+    for path in glob.glob(os.path.join(settings.PDF_CACHE_DIR, f"{pk}-*.pdf")):
+        if path != keep_path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def get_pdf_path(pk, content_hash, render_html):
+    """Path of the cached PDF, rendering it first on a miss.
+
+    ``render_html`` is called (in this process) only on a miss and returns
+    the HTML to convert.
+    """
+    path = cache_path(pk, content_hash)
+    hit = os.path.exists(path)
+    metrics.cache_lookup('pdf', hit)
+    if hit:
+        return path
+
+    os.makedirs(settings.PDF_CACHE_DIR, exist_ok=True)
+    with _inflight_lock:
+        future = _inflight.get(path)
+        owner = future is None
+        if owner:
+            future = get_pool().submit(render_pdf_file, render_html(), path)
+            _inflight[path] = future
+
+    try:
+        with metrics.span('pdf_render'):
+            ok = future.result(timeout=settings.PDF_RENDER_TIMEOUT)
+    finally:
+        if owner:
+            with _inflight_lock:
+                _inflight.pop(path, None)
+
+    if not ok:
+        raise PDFRenderError(f"Error generating PDF for blog {pk}")
+    remove_stale_pdfs(pk, path)
+    return path
@@ -0,0 +1,499 @@
+"""YouTube -> transcript -> blog pipeline stages.
+
+These helpers are shared by the request views and the background
+generation workers in ``jobs.py``. The stages that talk to providers are
+coroutines for the I/O loop (see async_pipeline); yt-dlp and ffmpeg only
+block, so the coroutines hand them to the blocking pool.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import traceback
+from urllib.parse import urlparse, parse_qs
+
+import yt_dlp
+from django.conf import settings
+
+from . import http_client, metrics
+from .async_pipeline import run_blocking
+from .models import BlogPost
+from .audio_format import (
+    AudioLimitError, aiter_transcoded, asr_format_options, check_audio_limits, expected_size, needs_transcode,
+    transcode_file,
+)
+from .audio_stream import CountingIterator, aiter_audio_chunks, can_stream
+from .captions import aget_caption_transcript
+from .transcribers import get_transcriber
+
+
+YOUTUBE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtube-nocookie.com',
+                 'www.youtube-nocookie.com')
+
+
+def canonical_video_id(link):
+    """Normalize watch?v=, youtu.be, shorts, embed and live URLs to the 11-char video ID.
+
+    Returns None when the link is not a recognisable single-video YouTube URL.
+    """
+    try:
+        parsed = urlparse(link.strip())
+    except (AttributeError, ValueError):
+        return None
+
+    host = (parsed.hostname or '').lower()
+    path_parts = [part for part in parsed.path.split('/') if part]
+    video_id = None
+
+    if host == 'youtu.be' and path_parts:
+        video_id = path_parts[0]
+    elif host in YOUTUBE_HOSTS:
+        if parsed.path == '/watch':
+            video_id = parse_qs(parsed.query).get('v', [None])[0]
+        elif len(path_parts) >= 2 and path_parts[0] in ('shorts', 'embed', 'live', 'v'):
+            video_id = path_parts[1]
+
+    if video_id and YOUTUBE_ID_RE.match(video_id):
+        return video_id
+    return None
+
+
+def extract_video_info(link):
+    """Extract video metadata once; the result is reused by yt_title and download_audio"""
+    try:
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            **asr_format_options(),
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(link, download=False)
+    except Exception as e:
+        print(f"Error extracting video info: {e}")
+        return None
+
+
+def watch_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def expand_video_links(link, max_items, _depth=0):
+    """Expand a playlist or channel URL into single-video links with yt-dlp's flat extraction.
+
+    Only the listing pages are fetched, not the videos themselves. A link
+    that is already a single video is returned as-is.
+    """
+    if canonical_video_id(link) and 'list=' not in link:
+        return [link]
+
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'playlistend': max_items,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(link, download=False)
+
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        return [watch_url(info['id'])] if info.get('id') else [link]
+
+    links = []
+    for entry in info.get('entries') or []:
+        if not entry or len(links) >= max_items:
+            continue
+        if entry.get('ie_key') == 'Youtube' or canonical_video_id(entry.get('url') or ''):
+            links.append(watch_url(entry['id']) if entry.get('id') else entry['url'])
+        elif entry.get('url') and _depth == 0:
+            # Channel URLs list their tabs (Videos, Shorts, ...) as nested playlists
+            links.extend(expand_video_links(entry['url'], max_items - len(links), _depth=1))
+    return links[:max_items]
+
+
+def yt_title(link, info=None):
+    """Get YouTube video title using yt-dlp"""
+    if info is None:
+        info = extract_video_info(link)
+    if not info:
+        return "Unknown Title"
+    return info.get('title', 'Unknown Title')
+
+def download_audio(link, info=None, workdir=None):
+    """Download the ASR-grade audio format of a YouTube video using yt-dlp
+
+    When ``info`` from extract_video_info is passed, the download reuses it
+    instead of extracting the metadata a second time. The file is named after
+    the video ID inside ``workdir`` (MEDIA_ROOT by default); concurrent jobs
+    pass their own directory so they never write to the same path.
+    """
+    workdir = workdir or settings.MEDIA_ROOT
+    try:
+        print(f"Attempting to download audio from: {link}")
+        
+        # Ensure the download directory exists
+        if not os.path.exists(workdir):
+            os.makedirs(workdir)
+        
+        # Smallest audio-only format that is still good enough for speech recognition
+        ydl_opts = {
+            **asr_format_options(),
+            'outtmpl': os.path.join(workdir, '%(id)s.%(ext)s'),
+            'quiet': False,
+            'max_filesize': settings.MAX_AUDIO_BYTES,
+        }
+        
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if info is None:
+                info = ydl.extract_info(link, download=True)
+            else:
+                info = ydl.process_ie_result(info, download=True)
+            filename = ydl.prepare_filename(info)
+            
+            print(f"Downloaded audio file: {filename}")
+            
+            if os.path.exists(filename):
+                return filename
+            else:
+                # Sometimes the extension changes, try to find it
+                base = os.path.splitext(filename)[0]
+                for ext in ['.webm', '.m4a', '.opus', '.mp3']:
+                    possible_file = base + ext
+                    if os.path.exists(possible_file):
+                        return possible_file
+                
+                print(f"Audio file not found")
+                return None
+                
+    except Exception as e:
+        print(f"Error downloading audio: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+async def atranscribe_stream(info, stats=None, transcriber=None):
+    """Transcribe by streaming the audio from YouTube straight into the transcriber's upload
+
+    Oversized sources are transcoded on the way through (see audio_format).
+    """
+    stats = stats if stats is not None else {}
+    transcriber = transcriber or get_transcriber()
+
+    async with contextlib.aclosing(aiter_audio_chunks(info)) as source:
+        downloaded = CountingIterator(source)
+        body = aiter_transcoded(downloaded) if needs_transcode(info) else downloaded
+        uploaded = CountingIterator(body)
+        try:
+            print(f"Streaming audio to {transcriber.name}...")
+            try:
+                text = await transcriber.transcribe_stream(uploaded)
+            finally:
+                stats['bytes_downloaded'] = downloaded.bytes_sent
+                stats['bytes_uploaded'] = uploaded.bytes_sent
+            print("Transcription completed successfully")
+            return text
+        except AudioLimitError:
+            raise
+        except Exception as e:
+            print(f"Streaming Transcription Error ({transcriber.name}): {e}")
+            traceback.print_exc()
+            return None
+
+
+async def aget_transcription(link, info=None, stats=None):
+    """Transcript text of the video, or None if any step failed.
+
+    Existing caption tracks are used when there is a usable one
+    (CAPTIONS_FIRST); the audio is only downloaded and run through the
+    TRANSCRIBER_BACKEND otherwise. Raises AudioLimitError when that audio is over the
+    duration/size limits. ``stats``, if given, receives transcript_source
+    and, for audio, bytes_downloaded and bytes_uploaded.
+    """
+    stats = stats if stats is not None else {}
+    if info is None:
+        info = await run_blocking(extract_video_info, link)
+
+    if settings.CAPTIONS_FIRST:
+        with metrics.span('captions'):
+            captions = await aget_caption_transcript(info)
+        if captions:
+            stats['transcript_source'], transcript = captions
+            return transcript
+
+    return await atranscribe_audio(link, info, stats)
+
+
+def check_selected_audio(info):
+    """Enforce the audio limits on the selected format (AudioLimitError) and log what was picked"""
+    if info:
+        check_audio_limits(info)
+        print(f"Selected audio format {info.get('format_id')} ({info.get('ext')}, "
+              f"{info.get('abr') or '?'} kbps, ~{expected_size(info) or '?'} bytes)")
+
+
+async def atranscribe_audio(link, info, stats):
+    """The audio half of aget_transcription: download (or stream) the audio and run the transcriber on it"""
+    stats['transcript_source'] = BlogPost.SOURCE_ASR
+    check_selected_audio(info)
+    transcriber = get_transcriber()
+    segmented = transcriber.segmented(info)
+
+    if settings.AUDIO_INGEST_MODE == 'stream' and transcriber.supports_streaming and not segmented:
+        if can_stream(info):
+            return await atranscribe_stream(info, stats, transcriber)
+        print("Selected audio format cannot be streamed, falling back to a file download")
+
+    # A directory per job: two jobs for the same video (or same title) must not share a file
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix='audio-', dir=settings.MEDIA_ROOT)
+    try:
+        return await atranscribe_downloaded(link, info, stats, transcriber, segmented, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def atranscribe_downloaded(link, info, stats, transcriber, segmented, workdir):
+    with metrics.span('download'):
+        audio_file = await run_blocking(download_audio, link, info=info, workdir=workdir)
+    
+    if not audio_file:
+        print("Audio download failed, cannot transcribe")
+        return None
+    
+    if not os.path.exists(audio_file):
+        print(f"Audio file doesn't exist at: {audio_file}")
+        return None
+        
+    stats['bytes_downloaded'] = os.path.getsize(audio_file)
+    print(f"Audio file exists, size: {stats['bytes_downloaded']} bytes")
+
+    # Local and segmented transcription decode the file themselves; transcoding only shrinks uploads
+    if transcriber.uploads_audio and not segmented and needs_transcode(info):
+        try:
+            with metrics.span('transcode'):
+                transcoded = await run_blocking(transcode_file, audio_file)
+        except Exception as e:
+            print(f"Transcoding failed, uploading the original audio: {e}")
+        else:
+            os.remove(audio_file)
+            audio_file = transcoded
+    stats['bytes_uploaded'] = os.path.getsize(audio_file) if transcriber.uploads_audio and not segmented else 0
+    
+    try:
+        print(f"Starting transcription ({transcriber.name})...")
+        transcription_text = await transcriber.transcribe_file(audio_file, info)
+        print("Transcription completed successfully")
+    except Exception as e:
+        print(f"Transcription Error ({transcriber.name}): {e}")
+        traceback.print_exc()
+        transcription_text = None
+    finally:
+        # Delete the file after use
+        if os.path.exists(audio_file):
+            os.remove(audio_file)
+            print(f"Cleaned up audio file: {audio_file}")
+        if transcriber.bytes_uploaded is not None:
+            stats['bytes_uploaded'] = transcriber.bytes_uploaded
+            
+    return transcription_text
+
+
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+MODEL = "sonar-pro"
+
+
+def split_transcript(transcription, max_chars):
+    """Split a transcript into chunks of at most max_chars, breaking on sentence boundaries"""
+    chunks = []
+    current = ""
+    for sentence in SENTENCE_END_RE.split(transcription.strip()):
+        # A single "sentence" longer than a chunk (no punctuation) is cut on whitespace
+        while len(sentence) > max_chars:
+            cutoff = sentence.rfind(" ", 0, max_chars)
+            if cutoff <= 0:
+                cutoff = max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cutoff].strip())
+            sentence = sentence[cutoff:].strip()
+
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chat_request(prompt, max_tokens=1000):
+    """Headers and JSON payload of a single-message chat completion"""
+    headers = {
+        "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "<YOUR_SITE_URL>",  # optional, replace with your site
+        "X-Title": "<YOUR_SITE_NAME>",      # optional, replace with your site name
+    }
+
+    payload = {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,    # Maximum tokens for the output
+        "verbosity": "low"           # Lower verbosity for conciseness
+    }
+    return headers, payload
+
+
+def completion_content(response):
+    """Reply text of a chat completion response (None on failure)"""
+    if response.status_code == 200:
+        result = response.json()
+        # Extract the generated content from the response
+        content = result['choices'][0]['message']['content']
+        # Providers report usage; without it, count words as a rough stand-in
+        usage = result.get('usage') or {}
+        metrics.LLM_TOKENS.inc(usage.get('completion_tokens') or len(content.split()), mode='completion')
+        return content
+    else:
+        print(f"API Error: {response.status_code} - {response.text}")
+        return None
+
+
+async def achat_completion(prompt, max_tokens=1000):
+    """Send a single-message chat completion and return the reply text (None on failure)"""
+    headers, payload = chat_request(prompt, max_tokens)
+    response = await http_client.apost(settings.LLM_API_URL, headers=headers, json=payload, timeout=30)
+    return completion_content(response)
+
+
+def chunk_summary_prompt(number, total, chunk):
+    return (
+        f"This is part {number} of {total} of a video transcription. Summarize the key points, "
+        f"facts and examples of this part as concise notes for a blog writer:\n\n{chunk}"
+    )
+
+
+async def asummarize_chunks(chunks):
+    """Map step: summarize every chunk, with at most LLM_MAX_CONCURRENCY requests in flight"""
+    total = len(chunks)
+    slots = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+
+    async def summarize(number, chunk):
+        async with slots:
+            return await achat_completion(chunk_summary_prompt(number, total, chunk),
+                                          max_tokens=settings.LLM_SUMMARY_MAX_TOKENS)
+
+    with metrics.span('summarize'):
+        # gather() keeps the summaries in transcript order
+        return await asyncio.gather(*(summarize(number, chunk) for number, chunk in enumerate(chunks, start=1)))
+
+
+async def astream_chat_completion(prompt, max_tokens=1000):
+    """Like achat_completion, but with ``stream: true``; yields content tokens as they arrive"""
+    headers = {
+        "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+    }
+
+    payload = {
+        "model": MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+        "verbosity": "low",
+        "stream": True,
+    }
+
+    response = await http_client.apost(settings.LLM_API_URL, headers=headers, json=payload, stream=True, timeout=30)
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            raise RuntimeError(f"API Error: {response.status_code} - {response.text}")
+
+        tokens = 0  # one content delta per token
+        try:
+            async for line in response.aiter_lines():
+                # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]"
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                delta = json.loads(data)['choices'][0].get('delta') or {}
+                if delta.get('content'):
+                    tokens += 1
+                    yield delta['content']
+        finally:
+            metrics.LLM_TOKENS.inc(tokens, mode='stream')
+    finally:
+        await response.aclose()
+
+
+def prompt_chunks(transcription):
+    """(prompt, chunks): the final prompt when the transcript fits in one request, else the chunks to summarize"""
+    if not settings.LLM_CHUNKED_GENERATION:
+        return f"Write a blog article based on the following transcription:\n\n{transcription[:1500]}", None
+
+    chunks = split_transcript(transcription, settings.LLM_CHUNK_CHARS)
+    if len(chunks) <= 1:
+        return f"Write a blog article based on the following transcription:\n\n{transcription}", None
+    return None, chunks
+
+
+def notes_prompt(summaries):
+    """Reduce step: the article-writing prompt from the chunk summaries (None if one of them failed)"""
+    if not all(summaries):
+        print("One or more chunk summaries failed")
+        return None
+    sections = "\n\n".join(
+        f"Section {number}:\n{summary}" for number, summary in enumerate(summaries, start=1)
+    )
+    return (
+        "Write a blog article based on the following section-by-section notes of a video "
+        f"transcription. Cover the whole video in order:\n\n{sections}"
+    )
+
+
+async def abuild_blog_prompt(transcription):
+    """Return the final article-writing prompt, running the map step first for long transcripts.
+
+    Returns None when a chunk summary failed.
+    """
+    prompt, chunks = prompt_chunks(transcription)
+    if prompt is not None:
+        return prompt
+
+    print(f"Summarizing {len(chunks)} transcript chunks...")
+    return notes_prompt(await asummarize_chunks(chunks))
+
+
+async def agenerate_blog_from_transcription(transcription):
+    """Generate blog using OpenRouter API
+
+    Transcripts longer than LLM_CHUNK_CHARS are summarized chunk by chunk in
+    parallel (map) and the article is written from the section summaries
+    (reduce), so the whole video is covered instead of only its start.
+    """
+    try:
+        print("Generating blog with OpenRouter AI...")
+
+        prompt = await abuild_blog_prompt(transcription)
+        if prompt is None:
+            return None
+
+        generated_content = await achat_completion(prompt)
+        if generated_content:
+            print("✓ Blog generated successfully")
+        return generated_content
+
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
@@ -0,0 +1,87 @@
+"""On-disk cache of blog QR codes.
+
+A QR image only depends on the post content (through its summary), the
+absolute URL of the post and the output format, so it is stored in
+QR_CACHE_DIR as ``<post pk>-<origin>-<hash of those>.<png|svg>`` and
+encoded at most once per version. A post reached through several hosts
+(or schemes) keeps one file per origin; writing a new version only removes
+the older versions for the same origin, so the hosts never evict each
+other's file.
+"""
+import glob
+import hashlib
+import os
+import uuid
+from io import BytesIO
+from urllib.parse import urlsplit
+
+import qrcode
+from qrcode.constants import ERROR_CORRECT_L
+from django.conf import settings
+
+from . import metrics
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def qr_key(content_hash, absolute_url, fmt):
+    return hashlib.sha256(f"{content_hash}\n{absolute_url}\n{fmt}".encode('utf-8')).hexdigest()
+
+
+def origin_key(absolute_url):
+    """Short hash of the scheme and host the QR points at"""
+    parts = urlsplit(absolute_url)
+    return hashlib.sha256(f"{parts.scheme}://{parts.netloc}".encode('utf-8')).hexdigest()[:12]
+
+
+def cache_path(pk, origin, key, fmt):
+    return os.path.join(settings.QR_CACHE_DIR, f"{pk}-{origin}-{key}.{fmt}")
+
+
+def encode_qr(qr_text, fmt):
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(qr_text)
+    qr.make(fit=True)
+
+    buffer = BytesIO()
+    if fmt == 'svg':
+        # Pure-Python SVG output, no Pillow needed
+        from qrcode.image.svg import SvgPathImage
+        qr.make_image(image_factory=SvgPathImage).save(buffer)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def get_qr_path(pk, absolute_url, key, fmt, build_text):
+    """Path of the cached QR image for the post at absolute_url; ``build_text`` is only called on a miss"""
+    origin = origin_key(absolute_url)
+    path = cache_path(pk, origin, key, fmt)
+    hit = os.path.exists(path)
+    metrics.cache_lookup('qr', hit)
+    if hit:
+        return path
+
+    os.makedirs(settings.QR_CACHE_DIR, exist_ok=True)
+    data = encode_qr(build_text(), fmt)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    for old_path in glob.glob(os.path.join(settings.QR_CACHE_DIR, f"{pk}-{origin}-*.{fmt}")):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+    return path
@@ -0,0 +1,147 @@
+"""Token-bucket rate limits, shared by all worker processes through the database.
+
+Two kinds of limits use the same buckets (RateLimitBucket rows):
+
+* Admission: each user (or, for anonymous requests, each client address)
+  gets a bucket per action in USER_RATE_LIMITS. A request that finds its
+  bucket empty is refused with 429 and a Retry-After of the time until the
+  next token, and generations are also refused while the job queue is
+  over GENERATION_QUEUE_MAX_DEPTH (USER_MAX_ACTIVE_JOBS for one user).
+* Pacing: every outbound request to a host in PROVIDER_RATE_LIMITS takes a
+  token from that host's bucket first, waiting for one when it is empty, so
+  a burst of jobs reaches the provider at its quota instead of as a wave
+  of 429s and retries.
+
+A take is one conditional UPDATE (refill, then spend if there is enough),
+so concurrent takers in any process never overdraw a bucket.
+"""
+import asyncio
+import math
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThanOrEqual
+from django.http import JsonResponse
+
+from . import metrics
+from .async_pipeline import run_db
+from .models import GenerationJob, RateLimitBucket
+
+
+class ProviderThrottledError(Exception):
+    """A provider's bucket stayed empty for longer than PROVIDER_RATE_LIMIT_MAX_WAIT"""
+
+
+def take(key, rate, burst, cost=1):
+    """Spend cost tokens from bucket key (refilled at rate/second up to burst).
+
+    Returns 0 when the tokens were spent, else the seconds until they will
+    be available. Costs above burst are charged as burst.
+    """
+    cost = min(cost, burst)
+    for _ in range(2):
+        now = time.time()
+        available = Least(Value(float(burst)), F('tokens') + (Value(now) - F('updated_at')) * Value(float(rate)))
+        spent = RateLimitBucket.objects.filter(GreaterThanOrEqual(available, cost), key=key).update(
+            tokens=available - cost, updated_at=now,
+        )
+        if spent:
+            return 0
+
+        bucket = RateLimitBucket.objects.filter(key=key).first()
+        if bucket is not None:
+            tokens = min(burst, bucket.tokens + (now - bucket.updated_at) * rate)
+            return max(cost - tokens, 0) / rate if rate > 0 else math.inf
+        try:
+            with transaction.atomic():
+                RateLimitBucket.objects.create(key=key, tokens=burst - cost, updated_at=now)
+            return 0
+        except IntegrityError:
+            pass  # created by a concurrent request; take from it
+    return 1 / rate if rate > 0 else math.inf
+
+
+def client_key(request, user):
+    return f"user:{user.pk}" if user is not None else f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def admit(request, user, action, cost=1):
+    """Seconds the client must wait before doing action again, or 0 if it may go ahead now"""
+    limit = settings.USER_RATE_LIMITS.get(action)
+    if not settings.RATE_LIMIT_ENABLED or limit is None:
+        return 0
+    rate, burst = limit
+    retry_after = take(f"{action}:{client_key(request, user)}", rate, burst, cost)
+    if retry_after:
+        metrics.RATE_LIMITED.inc(limit=action)
+    return retry_after
+
+
+def queue_retry_after(user):
+    """GENERATION_QUEUE_RETRY_AFTER if the job queue (or the user's share of it) is full, else 0.
+
+    Checked before a submission is expanded, so one batch can take the queue
+    past its depth by up to BATCH_MAX_ITEMS jobs.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return 0
+    active = GenerationJob.objects.filter(status__in=(GenerationJob.STATUS_QUEUED, GenerationJob.STATUS_RUNNING))
+    if (active.filter(user=user).count() >= settings.USER_MAX_ACTIVE_JOBS
+            or active.count() >= settings.GENERATION_QUEUE_MAX_DEPTH):
+        metrics.RATE_LIMITED.inc(limit='queue')
+        return settings.GENERATION_QUEUE_RETRY_AFTER
+    return 0
+
+
+def admit_generation(request, user, action='generate', queued=True):
+    """admit() for generations; work that will be queued is refused first while the queue is full"""
+    # The queue is checked first, so a refusal for a full queue does not cost a token
+    return (queued and queue_retry_after(user)) or admit(request, user, action)
+
+
+def throttled_response(retry_after, message="Too many requests, please try again later."):
+    response = JsonResponse({'error': message, 'retry_after': math.ceil(retry_after)}, status=429)
+    response['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+def _provider_bucket(host_key):
+    limit = settings.PROVIDER_RATE_LIMITS.get(host_key) if settings.RATE_LIMIT_ENABLED else None
+    return (f"provider:{host_key}", *limit) if limit else None
+
+
+def _check_provider_wait(host_key, waited, delay):
+    if waited + delay > settings.PROVIDER_RATE_LIMIT_MAX_WAIT:
+        raise ProviderThrottledError(f"{host_key} is over its rate limit, not sending request")
+
+
+def wait_for_provider(host_key):
+    """Block until the host's bucket has a token (no-op for hosts without a limit)"""
+    bucket = _provider_bucket(host_key)
+    if bucket is None:
+        return
+    waited = 0.0
+    while delay := take(*bucket):
+        _check_provider_wait(host_key, waited, delay)
+        time.sleep(delay)
+        waited += delay
+    if waited:
+        metrics.PROVIDER_WAIT_SECONDS.observe(waited, host=host_key)
+
+
+async def await_provider(host_key):
+    """wait_for_provider() for coroutines: the bucket is read on the DB pool and the wait holds no thread"""
+    bucket = _provider_bucket(host_key)
+    if bucket is None:
+        return
+    waited = 0.0
+    while delay := await run_db(take, *bucket):
+        _check_provider_wait(host_key, waited, delay)
+        await asyncio.sleep(delay)
+        waited += delay
+    if waited:
+        metrics.PROVIDER_WAIT_SECONDS.observe(waited, host=host_key)
+
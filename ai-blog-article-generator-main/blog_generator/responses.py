@@ -0,0 +1,136 @@
+"""Conditional (ETag / Last-Modified) and byte-range file responses for cached artifacts, and async streaming."""
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _FileSlice:
+    """File-like view of ``length`` bytes of an open file, for 206 responses"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single "bytes=" range, None to ignore it, or False if unsatisfiable"""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None  # malformed or multiple ranges: serve the whole file
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def conditional_response(request, etag, last_modified=None):
+    """304/412 response if the client's validators match, else None"""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # The artifacts belong to one user, so shared caches must not store them
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def file_response(request, path, content_type, filename, etag, as_attachment=True):
+    """FileResponse for a cached file with ETag/If-None-Match and single byte-range support"""
+    last_modified = int(os.path.getmtime(path))
+    not_modified = conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    size = os.path.getsize(path)
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range == etag):
+        byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(
+            _FileSlice(file, start, end - start + 1),
+            status=206,
+            content_type=content_type,
+            as_attachment=as_attachment,
+            filename=filename,
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = FileResponse(file, content_type=content_type, as_attachment=as_attachment, filename=filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    return set_validators(response, etag, last_modified)
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """A StreamingHttpResponse whose body is an async iterator.
+
+    Django 4.1 streams only sync iterators, and under ASGI it iterates them
+    with a plain for loop on the event loop. This body is awaited instead, by
+    the handler in ai_blog_app.asgi, so it can only be served over ASGI.
+    """
+    is_async = True
+
+    @property
+    def streaming_content(self):
+        async def encoded():
+            async for part in self._iterator:
+                yield self.make_bytes(part)
+        return encoded()
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        self._iterator = value
+
+    async def aclose(self):
+        """Close the body iterator (its cleanup may await), then the response"""
+        try:
+            if hasattr(self._iterator, 'aclose'):
+                await self._iterator.aclose()
+        finally:
+            await sync_to_async(self.close, thread_sensitive=True)()
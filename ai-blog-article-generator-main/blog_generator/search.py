@@ -0,0 +1,182 @@
+"""Full-text search over a user's blog posts.
+
+The index depends on the configured database:
+
+* SQLite: an FTS5 table (``blog_generator_blogpost_fts``, rowid = post id)
+  kept in sync by the signal handlers in signals.py - posts are indexed on
+  save, removed on hard delete, and updated after soft_delete()/restore()
+  through the posts_updated signal. Ranked with bm25().
+* MySQL: a FULLTEXT index on (youtube_title, generated_content), which
+  InnoDB maintains itself; soft-deleted posts are filtered out by the query.
+  Ranked by MATCH ... AGAINST relevance.
+* anything else: a plain icontains scan, so search still works.
+
+Both the title and the snippet come back with matches wrapped in <mark>;
+everything else is escaped.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .content import plain_text
+from .models import BlogPost
+
+FTS_TABLE = 'blog_generator_blogpost_fts'
+MYSQL_FULLTEXT_INDEX = 'blogpost_fulltext'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Private-use markers survive escape(), then become <mark> tags
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+SNIPPET_CHARS = 240
+
+
+def query_terms(query):
+    return TOKEN_RE.findall(query.lower())[:10]
+
+
+def _marks_to_html(text):
+    return escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def highlight(text, terms):
+    """Escape text and wrap every word starting with one of the terms in <mark>"""
+    if not terms:
+        return escape(text)
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE)
+    return _marks_to_html(pattern.sub(lambda m: f'{MARK_START}{m.group(0)}{MARK_END}', text))
+
+
+def make_snippet(text, terms, size=SNIPPET_CHARS):
+    """Window of text around the first matching term, highlighted"""
+    text = " ".join(text.split())
+    start = 0
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms if lowered.find(term) != -1]
+    if positions:
+        start = max(0, min(positions) - size // 3)
+        space = text.rfind(' ', 0, start)
+        start = space + 1 if space != -1 and start > 0 else start
+    snippet = text[start:start + size]
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if start + size < len(text) else ''
+    return prefix + highlight(snippet, terms) + suffix
+
+
+class SearchResult:
+    def __init__(self, post, title_html, snippet_html):
+        self.post = post
+        self.title_html = title_html
+        self.snippet_html = snippet_html
+
+
+# --- SQLite FTS5 -----------------------------------------------------------
+
+def _fts_match_expression(terms):
+    # Every term must match, as a prefix; quoting keeps user input from being parsed as FTS syntax
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _sqlite_search(user, terms, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, highlight({FTS_TABLE}, 0, %s, %s), "
+            f"snippet({FTS_TABLE}, 1, %s, %s, '…', 32) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND user_id = %s "
+            f"ORDER BY bm25({FTS_TABLE}, 5.0, 1.0) LIMIT %s",
+            [MARK_START, MARK_END, MARK_START, MARK_END, _fts_match_expression(terms), user.pk, limit],
+        )
+        rows = cursor.fetchall()
+
+    posts = BlogPost.objects.only('id', 'youtube_title', 'created_at', 'reading_time').in_bulk(
+        [row[0] for row in rows]
+    )
+    return [
+        SearchResult(posts[pk], _marks_to_html(title), _marks_to_html(snippet))
+        for pk, title, snippet in rows if pk in posts
+    ]
+
+
+def fts_enabled():
+    """True when posts must be (un)indexed by hand, i.e. on SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    """Add or refresh a post in the FTS5 index (removing it if it is soft-deleted)"""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+        if post.deleted_at is None:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body, user_id) VALUES (%s, %s, %s, %s)",
+                [post.pk, post.youtube_title, plain_text(post.generated_content), post.user_id],
+            )
+
+
+def index_posts(pks):
+    """Index the active posts among pks (for bulk updates, which send no signals)"""
+    if not fts_enabled() or not pks:
+        return
+    posts = BlogPost.objects.filter(pk__in=pks).only('id', 'youtube_title', 'generated_content', 'user_id')
+    rows = [[post.pk, post.youtube_title, plain_text(post.generated_content), post.user_id] for post in posts]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[pk] for pk in pks])
+        cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, title, body, user_id) VALUES (%s, %s, %s, %s)", rows)
+
+
+def unindex_posts(pks):
+    if not fts_enabled() or not pks:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[pk] for pk in pks])
+
+
+# --- MySQL FULLTEXT --------------------------------------------------------
+
+def _mysql_search(user, terms, limit):
+    # Boolean mode with +term* = every term required, prefix match (same semantics as FTS5 above)
+    against = ' '.join(f'+{term}*' for term in terms)
+    score = RawSQL("MATCH (youtube_title, generated_content) AGAINST (%s IN BOOLEAN MODE)", [against])
+    posts = (
+        BlogPost.objects.filter(user=user)
+        .annotate(score=score)
+        .filter(score__gt=0)
+        .only('id', 'youtube_title', 'created_at', 'reading_time', 'generated_content')
+        .order_by('-score')[:limit]
+    )
+    return [
+        SearchResult(post, highlight(post.youtube_title, terms), make_snippet(plain_text(post.generated_content), terms))
+        for post in posts
+    ]
+
+
+# --- Fallback ----------------------------------------------------------------
+
+def _scan_search(user, terms, limit):
+    queryset = BlogPost.objects.filter(user=user)
+    for term in terms:
+        queryset = queryset.filter(Q(youtube_title__icontains=term) | Q(generated_content__icontains=term))
+    posts = queryset.order_by('-created_at')[:limit]
+    return [
+        SearchResult(post, highlight(post.youtube_title, terms), make_snippet(plain_text(post.generated_content), terms))
+        for post in posts
+    ]
+
+
+def search_posts(user, query, limit=20):
+    """Ranked, highlighted matches among the user's active posts"""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(user, terms, limit)
+    if connection.vendor == 'mysql':
+        return _mysql_search(user, terms, limit)
+    return _scan_search(user, terms, limit)
@@ -0,0 +1,42 @@
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import page_cache
+from .models import BlogPost, posts_updated
+from .search import index_post, index_posts, unindex_posts
+
+
+@receiver(post_save, sender=BlogPost)
+def update_search_index(sender, instance, **kwargs):
+    # Covers create and content edits
+    index_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_posts([instance.pk])
+
+
+@receiver(posts_updated, sender=BlogPost)
+def reindex_updated_posts(sender, pks, **kwargs):
+    # soft_delete() and restore(); index_posts() drops the posts that are now deleted
+    index_posts(pks)
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def invalidate_cached_pages(sender, instance, **kwargs):
+    page_cache.invalidate(pks=[instance.pk], user_ids=[instance.user_id])
+
+
+@receiver(posts_updated, sender=BlogPost)
+def invalidate_updated_pages(sender, pks, user_ids, **kwargs):
+    page_cache.invalidate(pks=pks, user_ids=user_ids)
+
+
+@receiver(request_started)
+def recover_generation_jobs(sender, **kwargs):
+    from .jobs import maybe_recover_jobs  # jobs imports the whole pipeline
+
+    maybe_recover_jobs()
@@ -0,0 +1,149 @@
+"""Single-flight coalescing of identical generations.
+
+When several requests ask for the same video with the same generation
+settings at once, the first one takes a lease (a GenerationLease row, so
+it works across worker processes and hosts) and runs the pipeline; the
+others copy its article into their own BlogPost once it succeeds. Queued
+jobs do not hold a worker while they wait: they are parked on the lease
+and re-queued when it is released (jobs.park_job, jobs.wake_waiters).
+
+Only successes are shared. A failed lease, even one failed by a transient
+error, is taken over by the next request, which runs the pipeline itself.
+
+A leader renews its lease from a heartbeat task every
+SINGLE_FLIGHT_HEARTBEAT seconds; if it dies, the lease expires after
+SINGLE_FLIGHT_LEASE_TTL and a waiting request takes it over. A succeeded
+lease is handed out for SINGLE_FLIGHT_RESULT_TTL more seconds, long enough
+for every waiter to see it.
+"""
+import asyncio
+import hashlib
+import json
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import metrics
+from .async_pipeline import run_db
+from .models import BlogPost, GenerationLease
+from .pipeline import MODEL, canonical_video_id
+
+RUNNING = object()
+
+
+def generation_key(link):
+    """Lease key for a link: canonical video ID plus a hash of the settings that shape the article"""
+    video_id = canonical_video_id(link)
+    if not settings.SINGLE_FLIGHT or not video_id:
+        return None
+    params = json.dumps([MODEL, settings.LLM_CHUNKED_GENERATION, settings.LLM_CHUNK_CHARS,
+                         settings.LLM_SUMMARY_MAX_TOKENS, settings.CAPTIONS_FIRST])
+    return f"{video_id}:{hashlib.sha256(params.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.SINGLE_FLIGHT_LEASE_TTL)
+
+
+def acquire(key):
+    """Take the lease for key; returns the owner token, or None while another request holds it"""
+    token = uuid.uuid4().hex
+    try:
+        with transaction.atomic():
+            GenerationLease.objects.create(key=key, owner=token, expires_at=_lease_expiry())
+        return token
+    except IntegrityError:
+        pass
+    # Take over an expired or failed lease, or a succeeded one whose post has since been deleted
+    taken = GenerationLease.objects.filter(key=key).filter(
+        Q(expires_at__lt=timezone.now())
+        | Q(status=GenerationLease.STATUS_FAILED)
+        | Q(status=GenerationLease.STATUS_SUCCEEDED, blog_post__isnull=True)
+    ).update(owner=token, status=GenerationLease.STATUS_RUNNING, expires_at=_lease_expiry(), blog_post=None, error='')
+    return token if taken == 1 else None
+
+
+def renew(key, token):
+    """Push back the expiry of a lease this request holds"""
+    GenerationLease.objects.filter(key=key, owner=token, status=GenerationLease.STATUS_RUNNING).update(
+        expires_at=_lease_expiry(),
+    )
+
+
+async def heartbeat(key, token):
+    """Renew the lease every SINGLE_FLIGHT_HEARTBEAT seconds until the task running this is cancelled.
+
+    A single stage (local ASR of a long video) can outlast the lease TTL, so
+    renewing only between stages would let another request take it over.
+    """
+    while True:
+        await asyncio.sleep(settings.SINGLE_FLIGHT_HEARTBEAT)
+        try:
+            await run_db(renew, key, token)
+        except Exception as e:
+            metrics.logger.warning("Could not renew the lease for %s: %s: %s", key, type(e).__name__, e)
+
+
+def release(key, token, blog_post=None, error=''):
+    """Publish the leader's outcome: its post for the waiting requests, or a failure for the next one to retry"""
+    GenerationLease.objects.filter(key=key, owner=token).update(
+        status=GenerationLease.STATUS_SUCCEEDED if blog_post else GenerationLease.STATUS_FAILED,
+        blog_post=blog_post,
+        error='' if blog_post else (error or "Generation failed."),
+        expires_at=timezone.now() + timedelta(seconds=settings.SINGLE_FLIGHT_RESULT_TTL),
+    )
+    # Leases of videos nobody asked for again
+    GenerationLease.objects.filter(expires_at__lt=timezone.now() - timedelta(hours=1)).delete()
+
+
+def poll(key):
+    """The succeeded lease for key, RUNNING while its leader is still at work, or None if it can be taken over"""
+    lease = GenerationLease.objects.select_related('blog_post').filter(key=key).first()
+    if lease is None or lease.expires_at < timezone.now():
+        return None
+    if lease.status == GenerationLease.STATUS_RUNNING:
+        return RUNNING
+    if lease.status == GenerationLease.STATUS_FAILED or lease.blog_post is None:
+        return None
+    return lease
+
+
+def coalesced(lease):
+    """Count a request served from another request's lease"""
+    metrics.COALESCED_REQUESTS.inc(result=lease.status)
+    metrics.logger.info("Coalesced with the in-flight generation %s", lease.key)
+    return lease
+
+
+def follow_steps(key):
+    """Lead or follow the generation for key: yields whenever another request is running it.
+
+    Returns (token, None) when this request should run the pipeline, or
+    (None, lease) with the succeeded lease of the request it waited for.
+    The caller decides how to wait between steps (the stream polls, a
+    queued job parks itself).
+    """
+    while True:
+        token = acquire(key)
+        if token:
+            return token, None
+        while (lease := poll(key)) is RUNNING:
+            yield
+        if lease is not None:
+            return None, coalesced(lease)
+
+
+def copy_post(lease, user, link):
+    """The requesting user's own BlogPost with the leader's article"""
+    source = lease.blog_post
+    return BlogPost.objects.create(
+        user=user,
+        youtube_title=source.youtube_title,
+        youtube_link=link,
+        generated_content=source.generated_content,
+        transcript_source=source.transcript_source,
+    )
@@ -1,3 +1,1039 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import re
+import tempfile
+import time
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+import yt_dlp
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    asgi, audio_format, captions, checks, http_client, jobs, metrics, page_cache, pipeline, qr_cache, rate_limit,
+    single_flight, transcribers, translation, views,
+)
+from .async_pipeline import iter_on_io_loop, iter_sync, run_sync
+from .audio_format import AudioLimitError, asr_format_options
+from .export import iter_export
+from .fake_services import FakeAssemblyAI, FakeChat, FakeYouTube, ServiceProfile, fake_youtube_dl
+from .models import BlogPost, BlogTranslation, GenerationJob, VideoCacheEntry, posts_updated
+from .pagination import keyset_page
+from .responses import AsyncStreamingHttpResponse, file_response
+from .search import FTS_TABLE, highlight, search_posts
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    url = 'https://breaker.test/v1/chat'
+
+    def setUp(self):
+        http_client._breakers.pop(http_client._host_key(self.url), None)
+        self.breaker = http_client.get_breaker(self.url)
+
+    def half_open(self):
+        self.breaker.failures = self.breaker.threshold
+        self.breaker.opened_at = time.monotonic() - self.breaker.cooldown - 1
+
+    def test_throttled_request_does_not_take_the_half_open_trial(self):
+        self.half_open()
+        with mock.patch.object(rate_limit, 'wait_for_provider', side_effect=rate_limit.ProviderThrottledError):
+            with self.assertRaises(rate_limit.ProviderThrottledError):
+                http_client.get(self.url)
+        self.assertFalse(self.breaker.trial_in_flight)
+        self.assertTrue(self.breaker.allow())
+
+    def test_any_exception_releases_the_half_open_trial(self):
+        self.half_open()
+        session = http_client.get_session(self.url)
+        with mock.patch.object(session, 'request', side_effect=requests.exceptions.InvalidURL):
+            with self.assertRaises(requests.exceptions.InvalidURL):
+                http_client.get(self.url)
+        self.assertFalse(self.breaker.trial_in_flight)
+        # Not the provider's fault: the next request gets the trial
+        self.assertTrue(self.breaker.allow())
+
+    def test_errors_raised_by_the_body_do_not_count_as_failures(self):
+        session = http_client.get_session(self.url)
+        with mock.patch.object(session, 'request', side_effect=AudioLimitError("Too large")):
+            for _ in range(self.breaker.threshold):
+                with self.assertRaises(AudioLimitError):
+                    http_client.post(self.url, data=iter([b'audio']), retries=0)
+        self.assertEqual(self.breaker.failures, 0)
+        self.assertTrue(self.breaker.allow())
+
+    def test_connection_errors_still_open_the_circuit(self):
+        session = http_client.get_session(self.url)
+        with mock.patch.object(session, 'request', side_effect=requests.ConnectionError), \
+                mock.patch.object(http_client.time, 'sleep'):
+            for _ in range(self.breaker.threshold):
+                with self.assertRaises(requests.ConnectionError):
+                    http_client.get(self.url, retries=0)
+        self.assertFalse(self.breaker.allow())
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        for _ in range(self.breaker.threshold):
+            self.breaker.record_failure()
+        session = http_client.get_session(self.url)
+        with mock.patch.object(session, 'request') as send:
+            with self.assertRaises(http_client.CircuitOpenError):
+                http_client.get(self.url)
+        send.assert_not_called()
+
+    def test_pool_stats_are_exported(self):
+        with mock.patch.object(http_client, 'pool_stats', return_value={'https://breaker.test': {'hits': 3, 'misses': 1}}):
+            rendered = metrics.render()
+        self.assertIn('blog_http_pool_requests_total{host="https://breaker.test",result="hits"} 3', rendered)
+        self.assertIn('blog_http_pool_requests_total{host="https://breaker.test",result="misses"} 1', rendered)
+
+
+class AsyncHTTPClientTests(SimpleTestCase):
+    url = 'https://async-breaker.test/v1/chat'
+
+    def setUp(self):
+        http_client._breakers.pop(http_client._host_key(self.url), None)
+        self.breaker = http_client.get_breaker(self.url)
+
+    def send(self, handler, method='GET', **kwargs):
+        async def request():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                with mock.patch.object(http_client, 'get_async_client', return_value=client):
+                    return await http_client.arequest(method, self.url, **kwargs)
+        return run_sync(request())
+
+    def test_the_process_shares_one_client_on_the_io_loop(self):
+        async def client():
+            return http_client.get_async_client()
+
+        self.assertIs(run_sync(client()), run_sync(client()))
+        with self.assertRaises(RuntimeError):
+            asyncio.run(client())  # any other event loop
+
+    def test_retryable_responses_are_retried(self):
+        statuses = iter([503, 429, 200])
+        with mock.patch.object(http_client, 'backoff_delay', return_value=0):
+            response = self.send(lambda request: httpx.Response(next(statuses)), retries=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_connection_errors_open_the_shared_circuit(self):
+        def refuse(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        for _ in range(self.breaker.threshold):
+            with self.assertRaises(httpx.ConnectError):
+                self.send(refuse, retries=0)
+        # The blocking client fails fast for the same host
+        with self.assertRaises(http_client.CircuitOpenError):
+            http_client.get(self.url)
+
+
+class AsyncPipelineTests(SimpleTestCase):
+    def test_the_callers_context_is_carried_to_the_io_loop(self):
+        async def ids():
+            return metrics.current_ids()
+
+        with metrics.bind(job_id='42'):
+            self.assertEqual(run_sync(ids())['job_id'], '42')
+
+    def test_closing_the_sync_iterator_closes_the_generator_on_the_io_loop(self):
+        closed = []
+
+        async def events():
+            try:
+                yield 1
+                yield 2
+            finally:
+                await asyncio.sleep(0)  # cleanup may await
+                closed.append(True)
+
+        items = iter_sync(events())
+        self.assertEqual(next(items), 1)
+        items.close()
+        self.assertEqual(closed, [True])
+
+
+class StreamingASGIHandlerTests(SimpleTestCase):
+    async def test_async_body_is_sent_and_closed_when_the_client_disconnects(self):
+        closed = asyncio.Event()
+        disconnect = asyncio.Event()
+        sent = []
+
+        async def events():
+            try:
+                for number in range(1000):
+                    yield f"event {number}\n"
+                    await asyncio.sleep(0.01)
+            finally:
+                closed.set()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 3:
+                disconnect.set()
+
+        handler = asgi.StreamingASGIHandler()
+        asgi._receive.set(receive)
+        response = AsyncStreamingHttpResponse(iter_on_io_loop(events()), content_type='text/event-stream')
+        await handler.send_response(response, send)
+
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+        self.assertEqual(sent[1], {'type': 'http.response.body', 'body': b'event 0\n', 'more_body': True})
+        self.assertLess(len(sent), 10)
+        await asyncio.wait_for(closed.wait(), 1)
+
+
+class JobRecoveryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('recovery')
+
+    def job(self, status, started_minutes_ago=None):
+        started_at = timezone.now() - timedelta(minutes=started_minutes_ago) if started_minutes_ago else None
+        return GenerationJob.objects.create(user=self.user, youtube_link='https://youtu.be/dQw4w9WgXcQ',
+                                            status=status, started_at=started_at)
+
+    @override_settings(GENERATION_JOB_TIMEOUT=60 * 60)
+    def test_stale_running_jobs_fail_and_queued_jobs_are_redispatched(self):
+        queued = self.job(GenerationJob.STATUS_QUEUED)
+        stale = self.job(GenerationJob.STATUS_RUNNING, started_minutes_ago=61)
+        running = self.job(GenerationJob.STATUS_RUNNING, started_minutes_ago=5)
+
+        with mock.patch.object(jobs, 'dispatch_jobs') as dispatch, mock.patch.object(jobs, 'close_old_connections'):
+            jobs.recover_jobs(redispatch=True)
+
+        dispatch.assert_called_once_with([queued.pk])
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stale.status, GenerationJob.STATUS_FAILED)
+        self.assertEqual(stale.error, jobs.INTERRUPTED_MESSAGE)
+        self.assertEqual(running.status, GenerationJob.STATUS_RUNNING)
+
+
+
+class SingleFlightTests(TestCase):
+    key = 'dQw4w9WgXcQ:0123456789abcdef'
+
+    def setUp(self):
+        self.user = User.objects.create_user('single-flight')
+        self.job = GenerationJob.objects.create(user=self.user, youtube_link='https://youtu.be/dQw4w9WgXcQ',
+                                                status=GenerationJob.STATUS_RUNNING)
+
+    def test_failed_lease_is_taken_over_not_shared(self):
+        token = single_flight.acquire(self.key)
+        single_flight.release(self.key, token, error="Transient upstream error")
+        self.assertIsNone(single_flight.poll(self.key))
+        self.assertIsNotNone(single_flight.acquire(self.key))
+
+    def test_follower_is_parked_and_requeued_on_release(self):
+        token = single_flight.acquire(self.key)
+        with mock.patch.object(jobs, 'dispatch_jobs') as dispatch:
+            self.assertEqual(jobs.lead_or_park(self.job, self.key), (None, None))
+            self.job.refresh_from_db()
+            self.assertEqual((self.job.status, self.job.waiting_on), (GenerationJob.STATUS_QUEUED, self.key))
+            self.assertFalse(jobs.claim_job(self.job.pk))
+
+            post = BlogPost.objects.create(user=self.user, youtube_title='t', youtube_link=self.job.youtube_link,
+                                           generated_content='article')
+            jobs.release_lease(self.key, token, post)
+
+        dispatch.assert_called_once_with([self.job.pk])
+        self.assertTrue(jobs.claim_job(self.job.pk))
+        self.assertEqual(jobs.lead_or_park(self.job, self.key)[1].blog_post, post)
+
+    @override_settings(SINGLE_FLIGHT_HEARTBEAT=0.01)
+    def test_heartbeat_renews_the_lease(self):
+        token = single_flight.acquire(self.key)
+
+        async def lead_for_a_while():
+            heartbeat = asyncio.create_task(single_flight.heartbeat(self.key, token))
+            await asyncio.sleep(0.1)
+            heartbeat.cancel()
+
+        with mock.patch.object(single_flight, 'renew') as renew:
+            run_sync(lead_for_a_while())
+        renew.assert_called_with(self.key, token)
+
+
+
+
+class TranscriberTests(SimpleTestCase):
+    def test_backends_declare_streaming_support(self):
+        self.assertTrue(transcribers.AssemblyAITranscriber.supports_streaming)
+        self.assertFalse(transcribers.LocalTranscriber.supports_streaming)
+
+    def test_backend_must_implement_the_abstract_methods(self):
+        class Incomplete(transcribers.Transcriber):
+            name = 'incomplete'
+
+            def transcribe_file(self, path, info=None):
+                return ''
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class SegmentedTranscriptionTests(SimpleTestCase):
+    def test_merge_transcripts_joins_the_segment_texts_in_order(self):
+        merged = transcribers.merge_transcripts([{'text': ' First part. '}, {'text': None}, {'text': 'Second part.'}])
+        self.assertEqual(merged, "First part. Second part.")
+
+    @override_settings(ASSEMBLYAI_SEGMENT_TIMEOUT=0.2, ASSEMBLYAI_POLL_INTERVAL=0.05, ASSEMBLYAI_SEGMENT_RETRIES=5)
+    def test_stuck_segment_fails_at_the_deadline(self):
+        response = mock.Mock()
+        response.json.return_value = {'id': 'seg', 'status': 'processing', 'upload_url': 'https://upload.test/1'}
+        with mock.patch.object(http_client, 'apost', mock.AsyncMock(return_value=response)), \
+                mock.patch.object(http_client, 'aget', mock.AsyncMock(return_value=response)), \
+                mock.patch.object(http_client, 'backoff_delay', return_value=0.01):
+            start = time.monotonic()
+            with self.assertRaises(transcribers.TranscriptionError):
+                run_sync(transcribers.atranscribe_remote_segment(b'audio'))
+        self.assertLess(time.monotonic() - start, 1)
+
+
+class PageCacheCheckTests(SimpleTestCase):
+    @override_settings(PAGE_CACHE_BACKEND='locmem', GENERATION_JOB_RUNNER='external')
+    def test_locmem_is_refused_with_the_external_runner(self):
+        errors = checks.check_page_cache_backend(None)
+        self.assertEqual([e.id for e in errors], ['blog_generator.E001'])
+
+    @override_settings(PAGE_CACHE_BACKEND='file', GENERATION_JOB_RUNNER='external')
+    def test_shared_backends_pass(self):
+        self.assertEqual(checks.check_page_cache_backend(None), [])
+
+
+class QRCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        overridden = override_settings(QR_CACHE_DIR=cache_dir.name)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+    def qr_path(self, url, content_hash):
+        key = qr_cache.qr_key(content_hash, url, 'svg')
+        return qr_cache.get_qr_path(1, url, key, 'svg', lambda: f"summary\n\nRead full blog: {url}")
+
+    def test_hosts_keep_their_own_file(self):
+        internal = self.qr_path('http://internal:8000/blog-details/1/', 'v1')
+        public = self.qr_path('https://blog.example.com/blog-details/1/', 'v1')
+        self.assertTrue(os.path.exists(internal))
+        self.assertTrue(os.path.exists(public))
+
+        # A new version replaces only the same host's old file
+        updated = self.qr_path('https://blog.example.com/blog-details/1/', 'v2')
+        self.assertTrue(os.path.exists(updated))
+        self.assertFalse(os.path.exists(public))
+        self.assertTrue(os.path.exists(internal))
+
+
+class StreamedGenerationTests(TransactionTestCase):
+    def test_disconnect_mid_stream_saves_the_post_and_succeeds(self):
+        user = User.objects.create_user('streamer')
+
+        async def stages(yt_link, on_stage, stats):
+            await on_stage(GenerationJob.STAGE_TITLE)
+            return 'A title', 'A transcript.'
+
+        async def tokens(prompt):
+            for token in ('Hello ', 'world.'):
+                yield token
+
+        with mock.patch.object(views, 'aget_title_and_transcript', stages), \
+                mock.patch.object(views, 'abuild_blog_prompt', mock.AsyncMock(return_value='prompt')), \
+                mock.patch.object(views, 'astream_chat_completion', tokens), \
+                mock.patch.object(single_flight, 'generation_key', return_value=None), \
+                mock.patch.object(views, '_log_stream_finished') as log_finished:
+            events = iter_sync(views.astream_generation_events(user, 'https://youtu.be/dQw4w9WgXcQ'))
+            while 'event: token' not in next(events):
+                pass
+            events.close()  # what the server does when the browser goes away
+
+        self.assertEqual(BlogPost.objects.get(user=user).generated_content, 'Hello world.')
+        stats = log_finished.call_args[0][0]
+        self.assertEqual((stats['status'], stats['stage']), (GenerationJob.STATUS_SUCCEEDED, GenerationJob.STAGE_DONE))
+
+
+@override_settings(GENERATION_JOB_RUNNER='external')
+class PostDownloadAccessTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user('owner')
+        self.post = BlogPost.objects.create(user=owner, youtube_title='t', youtube_link='https://youtu.be/dQw4w9WgXcQ',
+                                            generated_content='article')
+        self.urls = [reverse('generate_pdf', args=[self.post.pk]), reverse('download_blog_qr', args=[self.post.pk])]
+
+    def test_anonymous_users_are_sent_to_log_in(self):
+        for url in self.urls:
+            self.assertEqual(self.client.get(url).status_code, 302, url)
+
+    def test_other_users_posts_are_not_found(self):
+        self.client.force_login(User.objects.create_user('someone-else'))
+        for url in self.urls:
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+
+@override_settings(GENERATION_JOB_RUNNER='external', RATE_LIMIT_ENABLED=False, HTTP_MAX_RETRIES=0,
+                   ASSEMBLYAI_POLL_INTERVAL=0.05)
+class GenerationPipelineTests(TransactionTestCase):
+    """Queued jobs through every stage, against the local stand-ins in fake_services"""
+    link = 'https://www.youtube.com/watch?v=testvideo01'
+
+    def setUp(self):
+        self.user = User.objects.create_user('pipeline')
+        self.start_services()
+
+    def start_services(self, llm=None):
+        self.services = {
+            'youtube': FakeYouTube(ServiceProfile(), audio_bytes=64 * 1024, transcript_words=300).start(),
+            'asr': FakeAssemblyAI(ServiceProfile(), transcript_words=300).start(),
+            'llm': FakeChat(llm or ServiceProfile(), reply_words=200).start(),
+        }
+        for service in self.services.values():
+            self.addCleanup(service.stop)
+        endpoints = override_settings(ASSEMBLYAI_BASE_URL=self.services['asr'].base_url,
+                                      LLM_API_URL=f"{self.services['llm'].base_url}/chat/completions")
+        endpoints.enable()
+        self.addCleanup(endpoints.disable)
+        patcher = mock.patch.object(yt_dlp, 'YoutubeDL', fake_youtube_dl(self.services['youtube']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_job(self, link=None):
+        job = jobs.enqueue_generation(self.user, link or self.link)
+        self.assertEqual(jobs.claim_next_job(), job.pk)
+        jobs.run_generation_job(job.pk, claimed=True)
+        job.refresh_from_db()
+        return job
+
+    def test_queued_job_runs_every_stage(self):
+        job = self.run_job()
+
+        self.assertEqual((job.status, job.stage, job.progress), (GenerationJob.STATUS_SUCCEEDED, 'done', 100))
+        self.assertTrue(job.blog_post.generated_content)
+        self.assertEqual(job.blog_post.user, self.user)
+        self.assertEqual(job.blog_post.transcript_source, BlogPost.SOURCE_ASR)
+        self.assertTrue(VideoCacheEntry.objects.get(video_id='testvideo01').transcript)
+
+    def test_repeat_video_skips_the_download_and_asr(self):
+        self.run_job()
+        asr_calls = self.services['asr'].requests
+
+        job = self.run_job('https://youtu.be/testvideo01')
+        self.assertEqual(job.status, GenerationJob.STATUS_SUCCEEDED)
+        self.assertEqual(self.services['asr'].requests, asr_calls)
+
+    def test_failing_llm_fails_the_job_at_generation(self):
+        self.start_services(llm=ServiceProfile(failure_rate=1.0))
+        job = self.run_job()
+
+        self.assertEqual((job.status, job.stage), (GenerationJob.STATUS_FAILED, GenerationJob.STAGE_GENERATION))
+        self.assertEqual(job.error, jobs.GENERATION_FAILED_MESSAGE)
+
+
+class JobClaimTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('claims')
+
+    def test_a_job_is_claimed_once(self):
+        job = GenerationJob.objects.create(user=self.user, youtube_link='https://youtu.be/dQw4w9WgXcQ')
+        self.assertTrue(jobs.claim_job(job.pk))
+        self.assertFalse(jobs.claim_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_RUNNING)
+        self.assertIsNotNone(job.started_at)
+
+    def test_oldest_queued_job_is_claimed_first(self):
+        first, second = (GenerationJob.objects.create(user=self.user, youtube_link='https://youtu.be/dQw4w9WgXcQ')
+                         for _ in range(2))
+        self.assertEqual(jobs.claim_next_job(), first.pk)
+        self.assertEqual(jobs.claim_next_job(), second.pk)
+        self.assertIsNone(jobs.claim_next_job())
+
+
+@override_settings(RATE_LIMIT_ENABLED=True)
+class TokenBucketTests(TestCase):
+    def take_at(self, now, key='bucket', rate=1.0, burst=2):
+        with mock.patch.object(rate_limit, 'time', mock.Mock(time=mock.Mock(return_value=now))):
+            return rate_limit.take(key, rate, burst)
+
+    def test_burst_then_wait_for_the_refill(self):
+        self.assertEqual(self.take_at(1000.0), 0)
+        self.assertEqual(self.take_at(1000.0), 0)
+        self.assertAlmostEqual(self.take_at(1000.0), 1.0)
+        self.assertAlmostEqual(self.take_at(1000.25), 0.75)
+        self.assertEqual(self.take_at(1001.0), 0)
+
+    def test_refill_is_capped_at_the_burst(self):
+        self.take_at(1000.0)
+        self.take_at(1000.0)
+        for _ in range(2):
+            self.assertEqual(self.take_at(5000.0), 0)
+        self.assertGreater(self.take_at(5000.0), 0)
+
+    @override_settings(USER_RATE_LIMITS={'generate': (0.01, 1)})
+    def test_users_have_their_own_buckets(self):
+        request = RequestFactory().post('/generate-blog')
+        alice, bob = User.objects.create_user('alice'), User.objects.create_user('bob')
+        self.assertEqual(rate_limit.admit(request, alice, 'generate'), 0)
+        self.assertGreater(rate_limit.admit(request, alice, 'generate'), 0)
+        self.assertEqual(rate_limit.admit(request, bob, 'generate'), 0)
+
+
+class KeysetPaginationTests(TestCase):
+    def test_pages_cover_every_post_once_newest_first(self):
+        user = User.objects.create_user('pages')
+        created = timezone.now()
+        posts = [BlogPost.objects.create(user=user, youtube_title=f'post {n}', youtube_link='https://youtu.be/x',
+                                         generated_content='article') for n in range(5)]
+        # Two posts share a timestamp, so the id has to break the tie
+        for post, minutes in zip(posts, (1, 2, 2, 3, 4)):
+            BlogPost.objects.filter(pk=post.pk).update(created_at=created + timedelta(minutes=minutes))
+
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(BlogPost.objects.filter(user=user), 'created_at', cursor, 2)
+            self.assertEqual(page.is_first, cursor is None)
+            seen.extend(post.pk for post in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, [posts[4].pk, posts[3].pk, posts[2].pk, posts[1].pk, posts[0].pk])
+
+    def test_malformed_cursor_starts_from_the_first_page(self):
+        page = keyset_page(BlogPost.objects.all(), 'created_at', 'not-a-cursor', 2)
+        self.assertTrue(page.is_first)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                           'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                     'LOCATION': 'page-cache-tests'}})
+class PageCacheInvalidationTests(TestCase):
+    def setUp(self):
+        page_cache.get_cache().clear()
+        self.user = User.objects.create_user('cached')
+        self.post = BlogPost.objects.create(user=self.user, youtube_title='t', youtube_link='https://youtu.be/x',
+                                            generated_content='article')
+        self.renders = 0
+
+    def render(self):
+        self.renders += 1
+        return f"render {self.renders}"
+
+    def test_listing_is_cached_until_a_post_changes(self):
+        self.assertEqual(page_cache.listing_cards(self.user.pk, None, self.render), "render 1")
+        self.assertEqual(page_cache.listing_cards(self.user.pk, None, self.render), "render 1")
+
+        self.post.youtube_title = 'renamed'
+        self.post.save()
+        self.assertEqual(page_cache.listing_cards(self.user.pk, None, self.render), "render 2")
+
+    @override_settings(GENERATION_JOB_RUNNER='external')
+    def test_missing_and_soft_deleted_posts_are_not_found(self):
+        self.client.force_login(self.user)
+        url = reverse('blog-details', args=[self.post.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.post.soft_delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('blog-details', args=[self.post.pk + 1000])).status_code, 404)
+
+    def test_detail_body_is_invalidated_on_delete(self):
+        render = lambda: (self.user.pk, self.render())
+        page_cache.detail_body(self.post.pk, render)
+        page_cache.detail_body(self.post.pk, render)
+        self.assertEqual(self.renders, 1)
+
+        pk = self.post.pk
+        self.post.delete()
+        page_cache.detail_body(pk, render)
+        self.assertEqual(self.renders, 2)
+
+
+class FileResponseTests(SimpleTestCase):
+    etag = '"pdf-1-abc"'
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        self.addCleanup(os.remove, self.path)
+        with os.fdopen(handle, 'wb') as f:
+            f.write(bytes(range(100)))
+
+    def get(self, **headers):
+        response = file_response(RequestFactory().get('/download', **headers), self.path, 'application/pdf',
+                                 'blog.pdf', self.etag)
+        self.addCleanup(response.close)
+        return response
+
+    def test_full_file_with_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(100)))
+        self.assertEqual((response['ETag'], response['Accept-Ranges']), (self.etag, 'bytes'))
+
+    def test_matching_etag_is_not_modified(self):
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=self.etag).status_code, 304)
+
+    def test_byte_range(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+
+    def test_suffix_range(self):
+        response = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(95, 100)))
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        self.assertEqual(self.get(HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"pdf-1-old"').status_code, 200)
+
+
+@override_settings(EXPORT_BATCH_SIZE=2)
+class ExportTests(TestCase):
+    def test_zip_has_a_markdown_file_per_post(self):
+        user = User.objects.create_user('exporter')
+        posts = [BlogPost.objects.create(user=user, youtube_title=f'Video {n}', youtube_link='https://youtu.be/x',
+                                         generated_content=f'Article {n}') for n in range(3)]
+        BlogPost.objects.create(user=User.objects.create_user('other'), youtube_title='Not mine',
+                                youtube_link='https://youtu.be/y', generated_content='Other article')
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(iter_export(BlogPost.objects.filter(user=user)))))
+
+        self.assertEqual(archive.namelist(), [f"{post.pk}-video-{n}.md" for n, post in enumerate(posts)])
+        self.assertIn('Article 1', archive.read(f"{posts[1].pk}-video-1.md").decode('utf-8'))
+        self.assertIsNone(archive.testzip())
+
+
+ROLLING_VTT = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.160 --> 00:00:02.070 align:start position:0%
+ 
+so<00:00:00.400><c> today</c><00:00:00.720><c> we're</c><00:00:00.960><c> looking</c><00:00:01.280><c> at</c>
+
+00:00:02.070 --> 00:00:02.080 align:start position:0%
+so today we're looking at
+ 
+
+00:00:02.080 --> 00:00:04.309 align:start position:0%
+so today we're looking at
+[Music]<00:00:02.480><c> caching</c><00:00:03.000><c> &amp;</c><00:00:03.200><c> queues</c>
+
+00:00:04.309 --> 00:00:04.319 align:start position:0%
+caching &amp; queues
+ 
+"""
+
+MANUAL_VTT = """WEBVTT
+
+NOTE transcribed by hand
+
+1
+00:00:01.000 --> 00:00:03.000
+<v Singer>We will, we will rock you</v>
+
+2
+00:00:03.000 --> 00:00:05.000
+We will, we will rock you
+
+3
+00:00:05.000 --> 00:00:07.000
+Buddy, you&#39;re a boy
+"""
+
+SRV3 = """<?xml version="1.0" encoding="utf-8" ?><timedtext format="3">
+<body>
+<p t="160" d="1910" w="1"><s ac="0">so</s><s t="240" ac="0"> today</s><s t="560" ac="0"> we&#39;re</s></p>
+<p t="2070" d="10" a="1">so today we&#39;re</p>
+<p t="2080" d="2229" w="1">looking<s t="400"> at caching</s></p>
+</body>
+</timedtext>"""
+
+
+class CaptionParserTests(SimpleTestCase):
+    def test_rolling_auto_captions_collapse_to_one_copy_of_each_line(self):
+        self.assertEqual(captions.parse_vtt(ROLLING_VTT, rolling=True),
+                         ["so today we're looking at", "caching & queues"])
+
+    def test_manual_captions_keep_repeated_lines(self):
+        self.assertEqual(captions.parse_vtt(MANUAL_VTT),
+                         ["We will, we will rock you", "We will, we will rock you", "Buddy, you're a boy"])
+
+    def test_srv3(self):
+        self.assertEqual(captions.parse_srv3(SRV3, rolling=True), ["so today we're", "looking at caching"])
+
+    @override_settings(CAPTION_MIN_WORDS=5)
+    def test_track_source_decides_the_dedupe(self):
+        track = {'ext': 'vtt'}
+        _, manual = captions.transcript_from_track(BlogPost.SOURCE_CAPTIONS, 'en', track, MANUAL_VTT)
+        self.assertEqual(manual.count("rock you"), 2)
+        _, auto = captions.transcript_from_track(BlogPost.SOURCE_AUTO_CAPTIONS, 'en', track, ROLLING_VTT)
+        self.assertEqual(auto, "so today we're looking at caching & queues")
+
+
+class SearchTests(TransactionTestCase):
+    """The SQLite FTS5 index and the signal handlers keeping it in sync.
+
+    Not a TestCase: SQLite's FTS5 reports the index as malformed when a row is
+    deleted, searched for and re-inserted inside one transaction, which the
+    app (in autocommit) never does but a per-test transaction would.
+    """
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")  # flushing the models leaves the FTS5 table alone
+        self.user = User.objects.create_user('searcher')
+        self.post = self.create('<b>Caching</b> & queues', 'How a write-through cache sits in front of a job queue.')
+
+    def create(self, title, content, user=None):
+        return BlogPost.objects.create(user=user or self.user, youtube_title=title,
+                                       youtube_link='https://youtu.be/x', generated_content=content)
+
+    def found(self, query, user=None):
+        return [result.post.pk for result in search_posts(user or self.user, query)]
+
+    def test_terms_match_as_prefixes(self):
+        self.assertEqual(self.found('cach que'), [self.post.pk])
+        self.assertEqual(self.found('write-through'), [self.post.pk])
+        self.assertEqual(self.found('cache database'), [])
+
+    def test_results_are_scoped_to_the_user(self):
+        other = User.objects.create_user('other-searcher')
+        theirs = self.create('Caching for others', 'Their cache.', user=other)
+        self.assertEqual(self.found('caching'), [self.post.pk])
+        self.assertEqual(self.found('caching', user=other), [theirs.pk])
+
+    def test_soft_deleted_posts_leave_the_results_until_restored(self):
+        BlogPost.objects.filter(pk=self.post.pk).soft_delete()
+        self.assertEqual(self.found('caching'), [])
+        BlogPost.all_objects.filter(pk=self.post.pk).restore()
+        self.assertEqual(self.found('caching'), [self.post.pk])
+
+    def test_edits_and_hard_deletes_update_the_index(self):
+        self.post.youtube_title = 'Rate limits'
+        self.post.save()
+        self.assertEqual(self.found('rate'), [self.post.pk])
+        self.assertEqual(self.found('queue'), [self.post.pk])  # still in the body
+        self.assertEqual(self.found('caching'), [])
+
+        self.post.delete()
+        self.assertEqual(self.found('rate'), [])
+
+    def test_title_is_escaped_around_the_marks(self):
+        result, = search_posts(self.user, 'cach')
+        self.assertEqual(result.title_html, '&lt;b&gt;<mark>Caching</mark>&lt;/b&gt; &amp; queues')
+        self.assertIn('<mark>cache</mark>', result.snippet_html)
+
+    def test_highlight_escapes_text_outside_the_marks(self):
+        self.assertEqual(highlight('<i>Queue</i> & Queues', ['queue']),
+                         '&lt;i&gt;<mark>Queue</mark>&lt;/i&gt; &amp; <mark>Queues</mark>')
+
+
+
+@override_settings(GENERATION_JOB_RUNNER='external')
+class BulkDeleteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner')
+        self.mine = [self.make_post(self.user, n) for n in range(2)]
+        self.theirs = self.make_post(User.objects.create_user('someone-else'), 2)
+        self.client.force_login(self.user)
+        self.updates = []
+        posts_updated.connect(self.record_update, sender=BlogPost)
+        self.addCleanup(posts_updated.disconnect, self.record_update, sender=BlogPost)
+
+    def make_post(self, user, n):
+        return BlogPost.objects.create(user=user, youtube_title=f'Video {n}', youtube_link='https://youtu.be/x',
+                                       generated_content=f'Article {n}')
+
+    def record_update(self, sender, pks, user_ids, **kwargs):
+        self.updates.append((sorted(pks), user_ids))
+
+    def post_ids(self, name, posts):
+        return self.client.post(reverse(name), {'blog_ids': [post.pk for post in posts]})
+
+    def deleted_ids(self):
+        return set(BlogPost.all_objects.filter(deleted_at__isnull=False).values_list('pk', flat=True))
+
+    def test_delete_only_touches_the_users_posts(self):
+        response = self.post_ids('delete_blogs', self.mine + [self.theirs])
+
+        self.assertEqual(response.json(), {"success": True, "deleted": 2})
+        self.assertEqual(self.deleted_ids(), {post.pk for post in self.mine})
+        self.assertEqual(self.updates, [(sorted(post.pk for post in self.mine), {self.user.pk})])
+
+    def test_restore_only_touches_the_users_posts(self):
+        BlogPost.all_objects.soft_delete()
+        self.updates.clear()
+
+        response = self.post_ids('restore_blogs', self.mine + [self.theirs])
+
+        self.assertRedirects(response, reverse('recently_deleted_blogs'), fetch_redirect_response=False)
+        self.assertEqual(self.deleted_ids(), {self.theirs.pk})
+        self.assertEqual(self.updates, [(sorted(post.pk for post in self.mine), {self.user.pk})])
+
+    def test_nothing_matching_sends_no_signal(self):
+        response = self.post_ids('delete_blogs', [self.theirs])
+
+        self.assertEqual(response.json(), {"success": True, "deleted": 0})
+        self.assertEqual(self.deleted_ids(), set())
+        self.assertEqual(self.updates, [])
+
+    def test_bad_ids_are_rejected(self):
+        self.assertEqual(self.client.post(reverse('delete_blogs'), {'blog_ids': ['x']}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('restore_blogs')).status_code, 400)
+        self.assertEqual(self.deleted_ids(), set())
+
+
+class PurgeDeletedBlogsTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('purger')
+        now = timezone.now()
+        self.expired = []
+        for n, age in enumerate([40, 35, 31, 50, 10, None]):
+            post = BlogPost.objects.create(user=user, youtube_title=f'Video {n}', youtube_link='https://youtu.be/x',
+                                           generated_content=f'Article {n}')
+            if age is not None:
+                BlogPost.all_objects.filter(pk=post.pk).update(deleted_at=now - timedelta(days=age))
+                if age > 30:
+                    self.expired.append(post.pk)
+        self.kept = set(BlogPost.all_objects.exclude(pk__in=self.expired).values_list('pk', flat=True))
+
+    def purge(self, *args):
+        out = io.StringIO()
+        call_command('purge_deleted_blogs', '--days', '30', '--sleep', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_only_posts_deleted_before_the_cutoff_are_purged_in_batches(self):
+        output = self.purge('--batch-size', '3')
+
+        self.assertEqual(set(BlogPost.all_objects.values_list('pk', flat=True)), self.kept)
+        self.assertIn(f"Purged 3 posts (up to id {self.expired[2]})", output)
+        self.assertIn(f"Purged 4 posts (up to id {self.expired[3]})", output)
+
+    def test_dry_run_only_counts(self):
+        output = self.purge('--dry-run')
+
+        self.assertTrue(output.startswith("4 posts were deleted before"))
+        self.assertEqual(BlogPost.all_objects.count(), 6)
+
+
+SENTENCES = " ".join(f"Sentence number {n} talks about caching." for n in range(40))
+
+
+class MapReduceGenerationTests(SimpleTestCase):
+    def setUp(self):
+        self.prompts = []
+        self.in_flight = self.max_in_flight = 0
+
+    async def fake_completion(self, prompt, max_tokens=1000):
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        part = re.match(r'This is part (\d+) of', prompt)
+        return f"notes {part.group(1)}" if part else "article"
+
+    def test_transcript_is_split_on_sentences(self):
+        chunks = pipeline.split_transcript(SENTENCES, 200)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 200 and chunk.endswith('caching.') for chunk in chunks))
+        self.assertEqual(" ".join(chunks), SENTENCES)
+
+    def test_a_sentence_longer_than_a_chunk_is_cut_on_whitespace(self):
+        chunks = pipeline.split_transcript("word " * 100, 50)
+
+        self.assertTrue(all(len(chunk) <= 50 for chunk in chunks))
+        self.assertEqual(" ".join(chunks).split(), ["word"] * 100)
+
+    @override_settings(LLM_CHUNK_CHARS=6000)
+    def test_short_transcripts_are_sent_whole(self):
+        prompt = run_sync(pipeline.abuild_blog_prompt(SENTENCES))
+
+        self.assertTrue(prompt.endswith(SENTENCES))  # not cut at 1500 characters
+
+    @override_settings(LLM_CHUNK_CHARS=200, LLM_MAX_CONCURRENCY=2)
+    def test_long_transcripts_are_summarized_in_order_with_bounded_concurrency(self):
+        with mock.patch.object(pipeline, 'achat_completion', self.fake_completion):
+            self.assertEqual(run_sync(pipeline.agenerate_blog_from_transcription(SENTENCES)), "article")
+
+        chunks = pipeline.split_transcript(SENTENCES, 200)
+        self.assertEqual(len(self.prompts), len(chunks) + 1)
+        self.assertLessEqual(self.max_in_flight, 2)
+        self.assertIn("\n\n".join(f"Section {n}:\nnotes {n}" for n in range(1, len(chunks) + 1)), self.prompts[-1])
+
+    @override_settings(LLM_CHUNK_CHARS=200)
+    def test_a_failed_summary_fails_the_generation(self):
+        async def completion(prompt, max_tokens=1000):
+            return None if 'part 2 of' in prompt else "notes"
+
+        with mock.patch.object(pipeline, 'achat_completion', completion):
+            self.assertIsNone(run_sync(pipeline.agenerate_blog_from_transcription(SENTENCES)))
+
+
+class TranslationTests(TransactionTestCase):
+    def setUp(self):
+        self.sent = []
+        patcher = mock.patch.object(translation, 'atranslate_text', self.fake_translate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.post = BlogPost.objects.create(user=User.objects.create_user('reader'), youtube_title='t',
+                                            youtube_link='https://youtu.be/x', generated_content='<p>Hello.</p>')
+
+    async def fake_translate(self, text, target_lang, source_lang='auto'):
+        self.sent.append(text)
+        return f"{target_lang}:{text}"
+
+    def test_segments_stay_under_the_provider_limit(self):
+        paragraphs = translation.split_paragraphs(f"{SENTENCES}\n\nShort one.", max_chars=300)
+
+        self.assertEqual(paragraphs[-1], ["Short one."])
+        self.assertGreater(len(paragraphs[0]), 1)
+        self.assertTrue(all(len(segment) <= 300 for paragraph in paragraphs for segment in paragraph))
+
+    def test_document_keeps_paragraphs_and_sends_repeats_once(self):
+        text = "Subscribe now.\n\nFirst point. Second point.\n\n  \n\nSubscribe now."
+
+        translated = run_sync(translation.atranslate_document(text, 'hi'))
+
+        self.assertEqual(translated, "hi:Subscribe now.\n\nhi:First point. Second point.\n\nhi:Subscribe now.")
+        self.assertEqual(sorted(self.sent), ["First point. Second point.", "Subscribe now."])
+
+    def test_translation_is_stored_per_content_version(self):
+        self.assertEqual(run_sync(translation.aget_blog_translation(self.post, 'mr')), ("mr:Hello.", False))
+        self.assertEqual(run_sync(translation.aget_blog_translation(self.post, 'mr')), ("mr:Hello.", True))
+        self.assertEqual(len(self.sent), 1)
+
+        self.post.generated_content = '<p>Hello again.</p>'
+        self.post.save()
+        self.assertEqual(run_sync(translation.aget_blog_translation(self.post, 'mr')), ("mr:Hello again.", False))
+        self.assertEqual(list(BlogTranslation.objects.values_list('translated_text', flat=True)), ["mr:Hello again."])
+
+    def test_the_translation_is_read_from_the_provider_page(self):
+        response = httpx.Response(200, text='<div class="result-container">  Namaste. </div>')
+        self.assertEqual(translation.translation_from_response(response), "Namaste.")
+
+        with self.assertRaises(translation.TranslationError):
+            translation.translation_from_response(httpx.Response(429, text='Too many requests'))
+
+
+def flat_youtube_dl(listings):
+    """yt_dlp.YoutubeDL stand-in whose extract_info returns listings[url]"""
+    class FlatYoutubeDL:
+        def __init__(self, opts):
+            assert opts['extract_flat'] == 'in_playlist'
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=False):
+            return listings[url]
+    return FlatYoutubeDL
+
+
+def video_entry(video_id):
+    return {'ie_key': 'Youtube', 'id': video_id, 'url': f'https://www.youtube.com/watch?v={video_id}'}
+
+
+class LinkExpansionTests(TestCase):
+    playlist = 'https://www.youtube.com/playlist?list=PL1'
+    channel = 'https://www.youtube.com/@channel'
+    listings = {
+        playlist: {'_type': 'playlist', 'entries': [video_entry('aaaaaaaaaaa'), None, video_entry('bbbbbbbbbbb'),
+                                                    video_entry('ccccccccccc')]},
+        channel: {'_type': 'playlist', 'entries': [
+            {'_type': 'url', 'url': 'https://www.youtube.com/@channel/videos'},
+            {'_type': 'url', 'url': 'https://www.youtube.com/@channel/shorts'},
+        ]},
+        'https://www.youtube.com/@channel/videos': {'_type': 'playlist', 'entries': [video_entry('ddddddddddd')]},
+        'https://www.youtube.com/@channel/shorts': {'_type': 'playlist', 'entries': [video_entry('eeeeeeeeeee')]},
+    }
+
+    def setUp(self):
+        patcher = mock.patch.object(yt_dlp, 'YoutubeDL', flat_youtube_dl(self.listings))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_single_videos_are_not_fetched(self):
+        self.assertEqual(pipeline.expand_video_links('https://youtu.be/aaaaaaaaaaa', 10), ['https://youtu.be/aaaaaaaaaaa'])
+
+    def test_playlists_expand_up_to_max_items(self):
+        self.assertEqual(pipeline.expand_video_links(self.playlist, 2),
+                         [pipeline.watch_url('aaaaaaaaaaa'), pipeline.watch_url('bbbbbbbbbbb')])
+
+    def test_channels_expand_their_tabs(self):
+        self.assertEqual(pipeline.expand_video_links(self.channel, 10),
+                         [pipeline.watch_url('ddddddddddd'), pipeline.watch_url('eeeeeeeeeee')])
+
+    @override_settings(BATCH_MAX_ITEMS=3)
+    def test_batch_queues_each_distinct_video_once(self):
+        user = User.objects.create_user('batcher')
+
+        batch, queued = jobs.enqueue_batch(user, ['https://youtu.be/bbbbbbbbbbb', self.playlist])
+
+        self.assertEqual([job.youtube_link for job in queued],
+                         ['https://youtu.be/bbbbbbbbbbb', pipeline.watch_url('aaaaaaaaaaa'), pipeline.watch_url('ccccccccccc')])
+        self.assertEqual(set(batch.jobs.values_list('status', flat=True)), {GenerationJob.STATUS_QUEUED})
+
+
+@override_settings(ASR_MIN_AUDIO_ABR=32, ASR_MAX_SOURCE_ABR=72, ASR_TRANSCODE=True,
+                   MAX_VIDEO_DURATION=3600, MAX_AUDIO_BYTES=10 * 1024 * 1024)
+class AudioFormatTests(SimpleTestCase):
+    formats = [
+        {'format_id': '251', 'ext': 'webm', 'acodec': 'opus', 'vcodec': 'none', 'abr': 160, 'filesize': 5000},
+        {'format_id': '249', 'ext': 'webm', 'acodec': 'opus', 'vcodec': 'none', 'abr': 48, 'filesize': 1500},
+        {'format_id': '599', 'ext': 'm4a', 'acodec': 'mp4a', 'vcodec': 'none', 'abr': 24, 'filesize': 800},
+        {'format_id': '18', 'ext': 'mp4', 'acodec': 'mp4a', 'vcodec': 'avc1', 'abr': 96, 'height': 360, 'filesize': 9000},
+    ]
+
+    def select(self, formats):
+        info = {'id': 'aaaaaaaaaaa', 'title': 't', 'extractor': 'youtube', 'extractor_key': 'Youtube',
+                'webpage_url': pipeline.watch_url('aaaaaaaaaaa'),
+                'formats': [{**f, 'url': f"https://example.com/{f['format_id']}"} for f in formats]}
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, **asr_format_options()}) as ydl:
+            return ydl.process_ie_result(info, download=False)
+
+    def test_smallest_audio_only_format_above_the_floor_is_selected(self):
+        self.assertEqual(self.select(self.formats)['format_id'], '249')
+
+    def test_muxed_stream_is_the_fallback_and_gets_transcoded(self):
+        selected = self.select(self.formats[-1:])
+
+        self.assertEqual(selected['format_id'], '18')
+        with mock.patch.object(audio_format, 'ffmpeg_available', return_value=True):
+            self.assertTrue(audio_format.needs_transcode(selected))
+        with mock.patch.object(audio_format, 'ffmpeg_available', return_value=False):
+            self.assertFalse(audio_format.needs_transcode(selected))
+
+    def test_only_oversized_audio_is_transcoded(self):
+        with mock.patch.object(audio_format, 'ffmpeg_available', return_value=True):
+            self.assertFalse(audio_format.needs_transcode(self.formats[1]))
+            self.assertTrue(audio_format.needs_transcode(self.formats[0]))
+
+    def test_limits_are_checked_from_the_metadata(self):
+        audio_format.check_audio_limits({'duration': 3600, 'filesize_approx': 10 * 1024 * 1024})
+        with self.assertRaisesMessage(AudioLimitError, "too long (61 min)"):
+            audio_format.check_audio_limits({'duration': 3660})
+        with self.assertRaisesMessage(AudioLimitError, "too large (11 MB)"):
+            audio_format.check_audio_limits({'filesize': 11 * 1024 * 1024})
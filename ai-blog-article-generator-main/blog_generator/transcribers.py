@@ -0,0 +1,252 @@
+"""Speech-to-text backends, selected by settings.TRANSCRIBER_BACKEND.
+
+'assemblyai' uploads the audio to AssemblyAI (streamed straight from
+YouTube when the audio allows it). Videos of at least
+ASSEMBLYAI_SEGMENT_MIN_DURATION are instead cut at pauses into segments
+that are transcribed concurrently and merged, so a long video takes about
+as long as its slowest segment rather than its whole length. 'local' runs
+faster-whisper on this machine's CPUs (see local_asr). A dotted path to a
+Transcriber subclass selects a custom backend.
+
+Transcribers are coroutines on the I/O loop (see async_pipeline): uploads
+and transcript polling go through the shared async HTTP client, and only
+decoding and local recognition run on the blocking pool.
+"""
+import abc
+import asyncio
+import io
+import time
+import wave
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import http_client, local_asr, metrics
+from .async_pipeline import run_blocking, submit
+from .audio_format import iter_transcoded
+from .audio_stream import aiter_file, aupload_audio
+
+
+class TranscriptionError(Exception):
+    """A backend could not produce a transcript"""
+
+
+class Transcriber(abc.ABC):
+    """Turns audio into text.
+
+    Every backend declares ``name``, ``uploads_audio`` and
+    ``supports_streaming``. Backends with ``uploads_audio`` send the audio
+    elsewhere: they get the ASR-grade transcode before the upload. With
+    ``supports_streaming``, the pipeline hands transcribe_stream the bytes
+    as they arrive from YouTube instead of downloading a file first. Both
+    methods are coroutines; blocking work belongs on async_pipeline's pools.
+    """
+    name = None
+    uploads_audio = False
+    supports_streaming = False
+    # Set by transcribers that upload something other than the file they were given
+    bytes_uploaded = None
+
+    def segmented(self, info):
+        """True when this video will be split into segments, which needs the whole file"""
+        return False
+
+    @abc.abstractmethod
+    async def transcribe_file(self, path, info=None):
+        """Transcript text of an audio (or video) file; ``info`` is its yt-dlp metadata if known"""
+
+    @abc.abstractmethod
+    async def transcribe_stream(self, chunks):
+        """Transcript text of an async iterable of audio bytes (only called when ``supports_streaming``)"""
+
+
+class AssemblyAITranscriber(Transcriber):
+    name = 'assemblyai'
+    uploads_audio = True
+    supports_streaming = True
+
+    def segmented(self, info):
+        duration = (info or {}).get('duration') or 0
+        if not settings.ASSEMBLYAI_SEGMENTED or duration < settings.ASSEMBLYAI_SEGMENT_MIN_DURATION:
+            return False
+        missing = local_asr.segmenting_available()
+        if missing:
+            print(f"Cannot split the audio into segments ({missing}), transcribing it in one piece")
+            return False
+        return True
+
+    async def transcribe_file(self, path, info=None):
+        if self.segmented(info):
+            return await self.transcribe_segmented(path)
+        with metrics.span('audio_upload'):
+            upload_url = await aupload_audio(aiter_file(path))
+        with metrics.span('asr'):
+            return (await apoll_transcript(upload_url))['text']
+
+    async def transcribe_segmented(self, path):
+        """Cut the audio at pauses and transcribe the segments concurrently, each retried on its own"""
+        segments = local_asr.iter_segments(
+            local_asr.iter_pcm(path),
+            target_seconds=settings.ASSEMBLYAI_SEGMENT_SECONDS,
+            max_seconds=settings.ASSEMBLYAI_MAX_SEGMENT_SECONDS,
+            min_silence=settings.ASR_MIN_SILENCE,
+            silence_db=settings.ASR_SILENCE_DB,
+        )
+
+        # Decoding and encoding run on a blocking pool thread; each segment's upload and
+        # polling is a coroutine on the I/O loop, in a copy of that thread's context
+        def submit_segment(samples):
+            return submit(atranscribe_remote_segment(encode_segment(samples)))
+
+        with metrics.span('asr'):
+            # Only the segments being transcribed are held in memory
+            results, seconds = await run_blocking(
+                local_asr.transcribe_segments, segments, submit_segment,
+                max_pending=settings.ASSEMBLYAI_SEGMENT_CONCURRENCY,
+            )
+
+        self.bytes_uploaded = sum(size for _, (_, size) in results)
+        print(f"Transcribed {seconds:.0f}s of audio as {len(results)} segments")
+        return merge_transcripts([transcript for _, (transcript, _) in results])
+
+    async def transcribe_stream(self, chunks):
+        with metrics.span('audio_upload'):
+            upload_url = await aupload_audio(chunks)
+        print("Starting transcription...")
+        with metrics.span('asr'):
+            return (await apoll_transcript(upload_url))['text']
+
+
+class LocalTranscriber(Transcriber):
+    """faster-whisper on a process pool: segments cut at pauses, transcribed in parallel, joined in order"""
+    name = 'local'
+    uploads_audio = False
+    supports_streaming = False  # decodes the whole file itself
+
+    async def transcribe_file(self, path, info=None):
+        return await run_blocking(self.transcribe_local, path)
+
+    def transcribe_local(self, path):
+        missing = local_asr.available()
+        if missing:
+            raise TranscriptionError(f"Local transcription is unavailable: {missing}")
+
+        threads = settings.LOCAL_ASR_THREADS_PER_WORKER
+        workers = settings.LOCAL_ASR_WORKERS or local_asr.default_workers(threads)
+        pool = local_asr.get_pool(workers, settings.LOCAL_ASR_MODEL, settings.LOCAL_ASR_COMPUTE_TYPE, threads,
+                                  settings.LOCAL_ASR_LANGUAGE)
+        segments = local_asr.iter_segments(
+            local_asr.iter_pcm(path),
+            target_seconds=settings.LOCAL_ASR_SEGMENT_SECONDS,
+            max_seconds=settings.LOCAL_ASR_MAX_SEGMENT_SECONDS,
+            min_silence=settings.ASR_MIN_SILENCE,
+            silence_db=settings.ASR_SILENCE_DB,
+        )
+
+        start = time.perf_counter()
+        with metrics.span('asr'):
+            # Two segments queued per worker keep the pool busy while ffmpeg decodes ahead
+            results, seconds = local_asr.transcribe_segments(
+                segments, local_asr.submit_to(pool), max_pending=workers * 2,
+            )
+        texts = [text for _, text in results]
+        elapsed = time.perf_counter() - start
+        print(f"Transcribed {seconds:.0f}s of audio in {len(texts)} segments on {workers} workers "
+              f"in {elapsed:.1f}s ({seconds / elapsed if elapsed else 0:.1f}x real time)")
+        return " ".join(text for text in texts if text)
+
+    async def transcribe_stream(self, chunks):
+        raise TranscriptionError("Local transcription needs the whole file; it cannot take a stream")
+
+
+def encode_segment(samples):
+    """16-bit PCM samples as an upload body: Opus when ffmpeg can encode it, else WAV"""
+    wav = io.BytesIO()
+    with wave.open(wav, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(local_asr.SAMPLE_RATE)
+        out.writeframes(samples.tobytes())
+    try:
+        return b"".join(iter_transcoded([wav.getvalue()]))
+    except Exception as e:
+        print(f"Could not encode the segment as Opus, uploading WAV: {e}")
+        return wav.getvalue()
+
+
+def assemblyai_headers():
+    return {"authorization": settings.ASSEMBLYAI_API_KEY}
+
+
+async def apoll_transcript(audio_url, deadline=None):
+    """Request the transcript of uploaded audio and poll it until it is done; returns its JSON.
+
+    Polls every ASSEMBLYAI_POLL_INTERVAL seconds without holding a thread.
+    Raises TranscriptionError when AssemblyAI reports an error, or when the
+    transcript is not done by the monotonic ``deadline``.
+    """
+    response = await http_client.apost(f"{settings.ASSEMBLYAI_BASE_URL}/v2/transcript",
+                                       headers=assemblyai_headers(), json={'audio_url': audio_url}, timeout=30)
+    response.raise_for_status()
+    transcript = response.json()
+
+    while transcript['status'] not in ('completed', 'error'):
+        if deadline is not None and time.monotonic() + settings.ASSEMBLYAI_POLL_INTERVAL > deadline:
+            raise TranscriptionError(f"Transcript {transcript['id']} was still {transcript['status']} "
+                                     f"at its deadline")
+        await asyncio.sleep(settings.ASSEMBLYAI_POLL_INTERVAL)
+        response = await http_client.aget(f"{settings.ASSEMBLYAI_BASE_URL}/v2/transcript/{transcript['id']}",
+                                          headers=assemblyai_headers(), timeout=30)
+        response.raise_for_status()
+        transcript = response.json()
+
+    if transcript['status'] == 'error':
+        raise TranscriptionError(f"Transcription failed: {transcript.get('error')}")
+    return transcript
+
+
+async def aremote_transcript(body, deadline):
+    """Upload one segment to AssemblyAI and poll its transcript until the monotonic deadline; returns its JSON"""
+    response = await http_client.apost(f"{settings.ASSEMBLYAI_BASE_URL}/v2/upload", headers=assemblyai_headers(),
+                                       content=body, timeout=(10, 300))
+    response.raise_for_status()
+    return await apoll_transcript(response.json()['upload_url'], deadline)
+
+
+async def atranscribe_remote_segment(body):
+    """Transcript JSON and uploaded size of one encoded segment, retrying just this segment on failure.
+
+    Attempts and retries together get ASSEMBLYAI_SEGMENT_TIMEOUT seconds, so a
+    segment stuck at AssemblyAI fails the transcription instead of hanging it.
+    """
+    deadline = time.monotonic() + settings.ASSEMBLYAI_SEGMENT_TIMEOUT
+    attempt = 0
+    while True:
+        try:
+            return await aremote_transcript(body, deadline), len(body)
+        except Exception as e:
+            delay = http_client.backoff_delay(attempt)
+            if attempt >= settings.ASSEMBLYAI_SEGMENT_RETRIES or time.monotonic() + delay >= deadline:
+                raise
+            attempt += 1
+            print(f"Segment transcription failed ({e}), retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1} of {settings.ASSEMBLYAI_SEGMENT_RETRIES + 1})")
+            await asyncio.sleep(delay)
+
+
+def merge_transcripts(transcripts):
+    """The text of the segments' transcript JSON, in order"""
+    return " ".join(transcript['text'].strip() for transcript in transcripts if transcript.get('text'))
+
+
+TRANSCRIBERS = {
+    AssemblyAITranscriber.name: AssemblyAITranscriber,
+    LocalTranscriber.name: LocalTranscriber,
+}
+
+
+def get_transcriber():
+    """An instance of the configured backend"""
+    backend = settings.TRANSCRIBER_BACKEND
+    cls = TRANSCRIBERS.get(backend) or import_string(backend)
+    return cls()
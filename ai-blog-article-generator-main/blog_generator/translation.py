@@ -0,0 +1,123 @@
+"""Text translation through the Google Translate mobile endpoint.
+
+This is the request deep_translator's GoogleTranslator makes, sent as a
+coroutine through the shared async client (http_client.arequest), so it is
+paced by the provider's rate limit (see rate_limit.py) and a translation
+waiting on the provider holds no thread. Documents are split on paragraph
+boundaries (long paragraphs on sentence boundaries) so no request exceeds
+the provider's 5000 character limit, and up to TRANSLATION_MAX_CONCURRENCY
+segments are in flight at once. Blog translations are stored in
+BlogTranslation, keyed by the post, its content hash and the target language.
+"""
+import asyncio
+import re
+
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import http_client, metrics
+from .async_pipeline import run_db
+from .models import BlogTranslation
+from .pipeline import split_transcript
+
+GOOGLE_TRANSLATE_URL = "https://translate.google.com/m"
+MAX_CHARS = 5000  # provider limit per request
+
+PARAGRAPH_BREAK_RE = re.compile(r'\n\s*\n')
+
+
+class TranslationError(Exception):
+    pass
+
+
+async def atranslate_text(text, target_lang, source_lang='auto'):
+    text = text.strip()
+    if not text or source_lang == target_lang:
+        return text
+    if len(text) > MAX_CHARS:
+        raise TranslationError(f"Text is longer than {MAX_CHARS} characters")
+
+    response = await http_client.aget(
+        GOOGLE_TRANSLATE_URL,
+        params={'tl': target_lang, 'sl': source_lang, 'q': text},
+        timeout=15,
+    )
+    return translation_from_response(response)
+
+
+def translation_from_response(response):
+    if response.status_code != 200:
+        raise TranslationError(f"Translation provider returned {response.status_code}")
+
+    soup = BeautifulSoup(response.text, "html.parser")
+    element = soup.find('div', {'class': 't0'}) or soup.find('div', {'class': 'result-container'})
+    if not element:
+        raise TranslationError("No translation found in the provider response")
+    return element.get_text(strip=True)
+
+
+def split_paragraphs(text, max_chars=MAX_CHARS):
+    """Paragraphs of the text, each cut into sentence-aligned pieces of at most max_chars.
+
+    Returns a list of paragraphs, each a list of segments.
+    """
+    paragraphs = [p.strip() for p in PARAGRAPH_BREAK_RE.split(text) if p.strip()]
+    return [split_transcript(paragraph, max_chars) for paragraph in paragraphs]
+
+
+async def atranslate_document(text, target_lang):
+    """Translate text of any length, keeping its paragraph breaks"""
+    paragraphs = split_paragraphs(text)
+    # Repeated segments (e.g. a recurring call to action) are only sent once
+    unique_segments = list(dict.fromkeys(segment for paragraph in paragraphs for segment in paragraph))
+    slots = asyncio.Semaphore(settings.TRANSLATION_MAX_CONCURRENCY)
+
+    async def translate(segment):
+        async with slots:
+            return await atranslate_text(segment, target_lang)
+
+    translated = dict(zip(unique_segments, await asyncio.gather(*map(translate, unique_segments))))
+    return join_paragraphs(paragraphs, translated)
+
+
+def join_paragraphs(paragraphs, translated):
+    return "\n\n".join(" ".join(translated[segment] for segment in paragraph) for paragraph in paragraphs)
+
+
+def blog_plain_text(post):
+    # generated_content may contain HTML; translate what the reader sees
+    return BeautifulSoup(post.generated_content, "html.parser").get_text()
+
+
+async def aget_blog_translation(post, target_lang):
+    """Return (translated_text, from_store) for the post's current content"""
+    stored = await run_db(stored_translation, post, target_lang)
+    metrics.cache_lookup('translation', stored is not None)
+    if stored is not None:
+        return stored, True
+
+    with metrics.span('translation'):
+        translated_text = await atranslate_document(blog_plain_text(post), target_lang)
+    await run_db(store_translation, post, target_lang, translated_text)
+    return translated_text, False
+
+
+def stored_translation(post, target_lang):
+    return BlogTranslation.objects.filter(
+        post=post, content_hash=post.content_hash, target_lang=target_lang,
+    ).values_list('translated_text', flat=True).first()
+
+
+def store_translation(post, target_lang, translated_text):
+    content_hash = post.content_hash
+    try:
+        with transaction.atomic():
+            BlogTranslation.objects.create(
+                post=post, content_hash=content_hash, target_lang=target_lang, translated_text=translated_text,
+            )
+    except IntegrityError:
+        # A concurrent request stored the same translation first
+        pass
+    # Translations of older versions of the content are never served again
+    BlogTranslation.objects.filter(post=post, target_lang=target_lang).exclude(content_hash=content_hash).delete()
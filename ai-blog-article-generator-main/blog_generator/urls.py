@@ -9,14 +9,22 @@ urlpatterns = [
     path('forgot_password', forgot_password, name='forgot_password'),
     path('change_password', change_password, name='change_password'),
     path('generate-blog', generate_blog, name='generate-blog'),
+    path('generation-job/<uuid:job_id>', generation_job_status, name='generation-job-status'),
+    path('generate-blog/batch', generate_blog_batch, name='generate-blog-batch'),
+    path('generation-batch/<uuid:batch_id>', generation_batch_status, name='generation-batch-status'),
     path('blog-list', blog_list, name='blog-list'),
+    path('search', search_blogs, name='search_blogs'),
     path('blog-details/<int:pk>', blog_details, name='blog-details'),
     path('download_blog_qr/<int:pk>', download_blog_qr, name='download_blog_qr'),
     path('translate', translate_blog, name='translate_blog'),
     path('delete-blog/<int:pk>/', delete_blog, name='delete_blog'),
+    path('delete-blogs/', delete_blogs, name='delete_blogs'),
     path("recently_deleted_blogs/", recently_deleted_blogs, name="recently_deleted_blogs"),
     path("restore-blog/<int:pk>/",restore_blog, name="restore_blog"),
+    path("restore-blogs/", restore_blogs, name="restore_blogs"),
     path("permanent-delete-blogs/", permanent_delete_blogs, name="permanent_delete_blogs"),
     path('download-pdf/<int:pk>/', generate_pdf, name='generate_pdf'),
+    path('export-blogs', export_blogs, name='export_blogs'),
     path('share/', share_on_whatsapp, name='share_on_whatsapp'),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
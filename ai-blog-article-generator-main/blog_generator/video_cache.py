@@ -0,0 +1,67 @@
+"""Persistent per-video cache of metadata and transcripts.
+
+Entries are keyed by the canonical YouTube video ID, so watch?v=, youtu.be
+and shorts links for the same video share one row. Entries older than
+VIDEO_CACHE_TTL (by last use) expire, and the table is trimmed to
+VIDEO_CACHE_MAX_ENTRIES least-recently-used rows whenever a new entry is
+written.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import VideoCacheEntry
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(seconds=settings.VIDEO_CACHE_TTL)
+
+
+def get_cached_video(video_id):
+    """Return a fresh cache entry for the video (and mark it as used), or None"""
+    if not video_id:
+        return None
+    entry = VideoCacheEntry.objects.filter(video_id=video_id, last_used_at__gte=_expiry_cutoff()).first()
+    if entry is not None:
+        entry.last_used_at = timezone.now()
+        VideoCacheEntry.objects.filter(pk=entry.pk).update(last_used_at=entry.last_used_at)
+    return entry
+
+
+def store_video_metadata(video_id, info):
+    """Save title and duration from a yt-dlp info dict"""
+    if not video_id or not info:
+        return None
+    entry, created = VideoCacheEntry.objects.update_or_create(
+        video_id=video_id,
+        defaults={
+            'title': (info.get('title') or 'Unknown Title')[:300],
+            'duration': info.get('duration'),
+            'last_used_at': timezone.now(),
+        },
+    )
+    if created:
+        evict_stale_entries()
+    return entry
+
+
+def store_transcript(video_id, transcript, source=''):
+    if not video_id or not transcript:
+        return
+    VideoCacheEntry.objects.filter(video_id=video_id).update(
+        transcript=transcript, transcript_source=source, last_used_at=timezone.now(),
+    )
+
+
+def evict_stale_entries():
+    """Drop expired entries, then the least recently used ones above the size limit"""
+    VideoCacheEntry.objects.filter(last_used_at__lt=_expiry_cutoff()).delete()
+
+    max_entries = settings.VIDEO_CACHE_MAX_ENTRIES
+    oldest_kept = VideoCacheEntry.objects.order_by('-last_used_at').values_list('last_used_at', flat=True)[
+        max_entries - 1:max_entries
+    ]
+    oldest_kept = list(oldest_kept)
+    if oldest_kept:
+        VideoCacheEntry.objects.filter(last_used_at__lt=oldest_kept[0]).delete()
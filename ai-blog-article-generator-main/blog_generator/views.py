@@ -2,9 +2,13 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import ObjectDoesNotExist
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse,HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import markcoroutinefunction
+from functools import wraps
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse, Http404
 from django.conf import settings
 import json
 from django.template.defaultfilters import safe  # optional
@@ -12,35 +16,66 @@ from django.utils.safestring import mark_safe
 from django.template.defaultfilters import json_script  # if using template filter
 
 # from pytube import YouTube
-import yt_dlp
-import os
-import assemblyai as aai
 # import openai
-from .models import BlogPost
+from .models import BlogPost, GenerationBatch, GenerationJob
+from .pagination import keyset_page
+from .search import search_posts
+from .jobs import enqueue_batch, enqueue_generation, aget_title_and_transcript, release_lease, TRANSCRIPT_FAILED_MESSAGE, GENERATION_FAILED_MESSAGE
+from .audio_format import AudioLimitError
+from .pipeline import abuild_blog_prompt, astream_chat_completion
+from .async_pipeline import iter_on_io_loop, iter_sync, on_io_loop, run_db
+from . import metrics, page_cache, rate_limit, single_flight
 import traceback
 
-import qrcode
-from qrcode.constants import ERROR_CORRECT_L
 from django.urls import reverse
-from io import BytesIO
 
-from googletrans import Translator
-from deep_translator import GoogleTranslator
+from .translation import aget_blog_translation, atranslate_document
 from django.template.loader import render_to_string
-from xhtml2pdf import pisa
+from .pdf_cache import get_pdf_path, PDFRenderError
+from .export import export_filename, iter_export
+from .responses import AsyncStreamingHttpResponse, conditional_response, file_response
+from .qr_cache import FORMATS as QR_FORMATS, get_qr_path, qr_key
 
 from urllib.parse import quote as urlquote
 from django import forms
 import re
+import asyncio
+import tempfile
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 
 # Create your views here.
 @login_required
 def index(request):
-    return render(request, 'index.html')
+    return render(request, 'index.html', {'stream_generation': settings.GENERATION_STREAMING})
 
-@csrf_exempt
-def generate_blog(request):
+def authenticated_user(request):
+    """request.user, or None for anonymous requests (resolving it queries the session)"""
+    return request.user if request.user.is_authenticated else None
+
+
+def async_login_required(view):
+    """login_required for async views; the user is looked up on the DB pool"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if await run_db(authenticated_user, request) is None:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def async_csrf_exempt(view):
+    """csrf_exempt for async views (Django 4.1's wrapper would hide that the view is a coroutine function)"""
+    return markcoroutinefunction(csrf_exempt(view))
+
+
+@async_csrf_exempt
+async def generate_blog(request):
     if request.method == 'POST':
+        user = await run_db(authenticated_user, request)
+        if user is None:
+            return JsonResponse({'error': 'Please log in to generate a blog.'}, status=401)
+
         try:
             # --- 1. Get Link from Request ---
             data = json.loads(request.body)
@@ -48,201 +83,337 @@ def generate_blog(request):
         except (KeyError, json.JSONDecodeError):
             return JsonResponse({'error': 'Invalid data sent or missing YouTube link.'}, status=400)
 
-        try:
-            # --- 2. All Processing Steps ---
-            
-            # get yt title (Pytube can fail here)
-            title = yt_title(yt_link)
-
-            # get transcript (Pytube download, AssemblyAI API can fail here)
-            transcription = get_transcription(yt_link)
-            if not transcription:
-                # Assuming get_transcription now returns None on failure
-                return JsonResponse({'error': "Failed to get transcript. Check the YouTube link, video availability, or API key status."}, status=500)
-
-            # use OpenAI to generate the blog (OpenAI API can fail here)
-            blog_content = generate_blog_from_transcription(transcription)
-            if not blog_content:
-                return JsonResponse({'error': "Failed to generate blog article from transcription."}, status=500)
-
-            # save blog article to database (DB save can fail)
-            new_blog_article = BlogPost.objects.create(
-                user=request.user,
-                youtube_title=title,
-                youtube_link=yt_link,
-                generated_content=blog_content,
-            )
-            new_blog_article.save()
-
-            # --- 3. Success Response ---
-            return JsonResponse({'content': blog_content})
-        except Exception as e:
-            traceback.print_exc() # Prints the file, line number, and error type
-            print(f"CRITICAL ERROR during blog generation: {type(e).__name__}: {e}")
-            return JsonResponse({'error': f"Server processing failed: {type(e).__name__} - check server logs for details."}, status=500)
-            
+        # --- 2a. Streaming mode: run the stages here and relay LLM tokens as Server-Sent Events ---
+        stream = data.get('stream')
+        retry_after = await run_db(rate_limit.admit_generation, request, user, queued=not stream)
+        if retry_after:
+            return rate_limit.throttled_response(retry_after)
+
+        if stream:
+            # The events are produced on the I/O loop; under ASGI the handler in ai_blog_app.asgi
+            # awaits them, under WSGI the server's thread blocks on each one
+            events = astream_generation_events(user, yt_link)
+            if isinstance(request, ASGIRequest):
+                response = AsyncStreamingHttpResponse(iter_on_io_loop(events), content_type='text/event-stream')
+            else:
+                response = StreamingHttpResponse(iter_sync(events), content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+            return response
+
+        # --- 2b. Queue the job; the worker pool runs the pipeline stages ---
+        job = await run_db(enqueue_generation, user, yt_link)
+
+        return JsonResponse({
+            'job_id': str(job.pk),
+            'status': job.status,
+            'status_url': reverse('generation-job-status', kwargs={'job_id': job.pk}),
+        }, status=202)
     else:
         return JsonResponse({'error': 'Invalid request method'}, status=405)
 
-def yt_title(link):
-    """Get YouTube video title using yt-dlp"""
-    try:
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(link, download=False)
-            return info.get('title', 'Unknown Title')
-    except Exception as e:
-        print(f"Error getting title: {e}")
-        return "Unknown Title"
 
-def download_audio(link):
-    """Download audio from YouTube video using yt-dlp (no conversion)"""
-    try:
-        print(f"Attempting to download audio from: {link}")
-        
-        # Ensure media directory exists
-        if not os.path.exists(settings.MEDIA_ROOT):
-            os.makedirs(settings.MEDIA_ROOT)
-        
-        # Configure yt-dlp to download best audio without conversion
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': os.path.join(settings.MEDIA_ROOT, '%(title)s.%(ext)s'),
-            'quiet': False,
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(link, download=True)
-            filename = ydl.prepare_filename(info)
-            
-            print(f"Downloaded audio file: {filename}")
-            
-            if os.path.exists(filename):
-                return filename
-            else:
-                # Sometimes the extension changes, try to find it
-                base = os.path.splitext(filename)[0]
-                for ext in ['.webm', '.m4a', '.opus', '.mp3']:
-                    possible_file = base + ext
-                    if os.path.exists(possible_file):
-                        return possible_file
-                
-                print(f"Audio file not found")
-                return None
-                
-    except Exception as e:
-        print(f"Error downloading audio: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-def get_transcription(link):
-    audio_file = download_audio(link)
-    
-    if not audio_file:
-        print("Audio download failed, cannot transcribe")
-        return None
-    
-    if not os.path.exists(audio_file):
-        print(f"Audio file doesn't exist at: {audio_file}")
-        return None
-        
-    print(f"Audio file exists, size: {os.path.getsize(audio_file)} bytes")
-    
-    aai.settings.api_key = settings.ASSEMBLYAI_API_KEY
-    transcriber = aai.Transcriber()
-    
+
+def stage_event(stage):
+    return sse_event('stage', {'stage': stage, 'label': dict(GenerationJob.STAGE_CHOICES)[stage]})
+
+
+async def astream_generation_events(user, yt_link):
+    """Async generator behind the streaming generate-blog response; it runs on the I/O loop"""
+    stats = {'stage': GenerationJob.STAGE_TITLE, 'status': GenerationJob.STATUS_FAILED}
+    start = time.perf_counter()
+    key = single_flight.generation_key(yt_link)
+    token = None
+    heartbeat = None
+    blog = None
     try:
-        print("Starting transcription...")
-        transcript = transcriber.transcribe(audio_file)
-        transcription_text = transcript.text
-        print("Transcription completed successfully")
+        if key:
+            # An identical generation in flight elsewhere: wait for it instead of repeating it
+            steps = single_flight.follow_steps(key)
+            waited = 0.0
+            while (lead := await run_db(_follow_step, steps)) is None:
+                await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+                waited += settings.SINGLE_FLIGHT_POLL_INTERVAL
+                if waited >= 5:
+                    waited = 0.0
+                    yield ": keep-alive\n\n"
+            token, lease = lead
+            if lease is not None:
+                with metrics.span(GenerationJob.STAGE_SAVING):
+                    blog = await run_db(_copy_shared_result, user, yt_link, lease, stats)
+                yield sse_event('done', {'blog_id': blog.pk, 'html': blog.rendered_html})
+                return
+            heartbeat = asyncio.create_task(single_flight.heartbeat(key, token))
+
+        stages = asyncio.Queue()
+
+        async def on_stage(stage):
+            stats['stage'] = stage
+            stages.put_nowait(stage)
+
+        title_and_transcript = asyncio.create_task(
+            aget_title_and_transcript(yt_link, on_stage=on_stage, stats=stats)
+        )
+        # Wake the loop below as soon as the stages are over
+        title_and_transcript.add_done_callback(lambda _: stages.put_nowait(None))
+        try:
+            while True:
+                try:
+                    stage = await asyncio.wait_for(stages.get(), timeout=5)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"  # SSE comment, stops proxies from timing out the request
+                    continue
+                if stage is None:
+                    break
+                yield stage_event(stage)
+        finally:
+            title_and_transcript.cancel()  # the browser went away; a finished task ignores this
+        try:
+            title, transcription = title_and_transcript.result()
+        except AudioLimitError as e:
+            yield _stream_error(stats, str(e))
+            return
+        if not transcription:
+            yield _stream_error(stats, TRANSCRIPT_FAILED_MESSAGE)
+            return
+
+        stats['stage'] = GenerationJob.STAGE_GENERATION
+        yield stage_event(GenerationJob.STAGE_GENERATION)
+        with metrics.span(GenerationJob.STAGE_GENERATION):
+            prompt = await abuild_blog_prompt(transcription)
+            if prompt is None:
+                yield _stream_error(stats, GENERATION_FAILED_MESSAGE)
+                return
+
+            parts = []
+            tokens = astream_chat_completion(prompt)
+            try:
+                async for token_text in tokens:
+                    parts.append(token_text)
+                    yield sse_event('token', {'text': token_text})
+            except GeneratorExit:
+                # The browser went away mid-stream: finish reading the model output and keep the article
+                parts.extend([token_text async for token_text in tokens])
+                blog = await run_db(_save_streamed_blog, user, title, yt_link, parts, stats)
+                raise
+
+        blog = await run_db(_save_streamed_blog, user, title, yt_link, parts, stats)
+        if blog is None:
+            yield _stream_error(stats, GENERATION_FAILED_MESSAGE)
+            return
+        yield sse_event('done', {'blog_id': blog.pk, 'html': blog.rendered_html})
     except Exception as e:
-        print(f"AssemblyAI Transcription Error: {e}")
         traceback.print_exc()
-        transcription_text = None
+        print(f"CRITICAL ERROR during streamed blog generation: {type(e).__name__}: {e}")
+        yield _stream_error(stats, f"Server processing failed: {type(e).__name__} - check server logs for details.")
     finally:
-        # Delete the file after use
-        if os.path.exists(audio_file):
-            os.remove(audio_file)
-            print(f"Cleaned up audio file: {audio_file}")
-            
-    return transcription_text
+        if heartbeat:
+            heartbeat.cancel()
+        await run_db(release_lease, key, token, blog, stats.get('error', ''))
+        _log_stream_finished(stats, time.perf_counter() - start)
 
 
-def generate_blog_from_transcription(transcription):
-    """Generate blog using OpenRouter API"""
+def _stream_error(stats, message):
+    stats['error'] = message
+    return sse_event('error', {'error': message})
+
+
+def _follow_step(steps):
+    """One step of single_flight.follow_steps: None while another request generates, else its (token, lease)"""
     try:
-        import requests
+        next(steps)
+    except StopIteration as done:
+        return done.value
+    return None
+
+
+def _copy_shared_result(user, yt_link, lease, stats):
+    """The stream's own post with the article of the identical generation it waited for"""
+    stats['coalesced'] = True
+    stats['transcript_source'] = lease.blog_post.transcript_source
+    stats['stage'] = GenerationJob.STAGE_SAVING
+    blog = single_flight.copy_post(lease, user, yt_link)
+    stats['blog_id'] = blog.pk
+    stats['status'], stats['stage'] = GenerationJob.STATUS_SUCCEEDED, GenerationJob.STAGE_DONE
+    return blog
+
+
+def _log_stream_finished(stats, seconds):
+    """Same counters and summary line as a queued job (jobs.log_job_finished)"""
+    if stats['status'] == GenerationJob.STATUS_FAILED:
+        metrics.STAGE_FAILURES.inc(stage=stats['stage'])
+    metrics.JOBS.inc(status=stats['status'])
+    metrics.JOB_SECONDS.observe(seconds, status=stats['status'])
+    metrics.log_event(
+        'stream_finished',
+        status=stats['status'],
+        stage=stats['stage'],
+        seconds=round(seconds, 3),
+        timings=metrics.current_timings(),
+        transcript_source=stats.get('transcript_source'),
+        coalesced=stats.get('coalesced', False),
+        bytes_downloaded=stats.get('bytes_downloaded'),
+        bytes_uploaded=stats.get('bytes_uploaded'),
+        blog_id=stats.get('blog_id'),
+    )
 
-        print("Generating blog with OpenRouter AI...")
 
-        # OpenRouter API URL
-        API_URL = "https://api.perplexity.ai/chat/completions"
+def _save_streamed_blog(user, title, yt_link, parts, stats):
+    blog_content = ''.join(parts)
+    if not blog_content:
+        return None
+    stats['stage'] = GenerationJob.STAGE_SAVING
+    with metrics.span(GenerationJob.STAGE_SAVING):
+        blog = BlogPost.objects.create(
+            user=user,
+            youtube_title=title,
+            youtube_link=yt_link,
+            generated_content=blog_content,
+            transcript_source=stats.get('transcript_source', ''),
+        )
+    # Succeeded even when the browser has gone away: the article is saved and listed
+    stats['blog_id'] = blog.pk
+    stats['status'], stats['stage'] = GenerationJob.STATUS_SUCCEEDED, GenerationJob.STAGE_DONE
+    return blog
 
 
-        # Model to use
-        MODEL = "sonar-pro"
+@csrf_exempt
+def generate_blog_batch(request):
+    """Queue one generation job per video of a playlist/channel URL or a list of links"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Please log in to generate blogs.'}, status=401)
 
-        # Construct messages for chat completion
-        messages = [
-            {
-                "role": "user",
-                "content": f"Write a blog article based on the following transcription:\n\n{transcription[:1500]}"
-            }
-        ]
+    try:
+        data = json.loads(request.body)
+        links = data.get('links') or [data['link']]
+        if isinstance(links, str):
+            links = links.split()
+        links = [link.strip() for link in links if isinstance(link, str) and link.strip()]
+    except (KeyError, TypeError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Invalid data sent or missing YouTube link(s).'}, status=400)
+    if not links:
+        return JsonResponse({'error': 'Invalid data sent or missing YouTube link(s).'}, status=400)
+
+    retry_after = rate_limit.admit_generation(request, request.user, 'batch')
+    if retry_after:
+        return rate_limit.throttled_response(retry_after)
 
-        headers = {
-            "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "<YOUR_SITE_URL>",  # optional, replace with your site
-            "X-Title": "<YOUR_SITE_NAME>",      # optional, replace with your site name
-        }
+    try:
+        batch, jobs = enqueue_batch(request.user, links)
+    except Exception as e:
+        traceback.print_exc()
+        return JsonResponse({'error': f"Could not read the playlist: {type(e).__name__} - check the link."}, status=400)
+    if not jobs:
+        return JsonResponse({'error': 'No videos found for the given link(s).'}, status=400)
 
-        payload = {
-            "model": "sonar-pro",
-            "messages": messages,
-            "max_tokens": 1000,          # Maximum tokens for the blog output
-            "verbosity": "low"           # Lower verbosity for conciseness
-}
+    return JsonResponse({
+        'batch_id': str(batch.pk),
+        'total': len(jobs),
+        'status_url': reverse('generation-batch-status', kwargs={'batch_id': batch.pk}),
+    }, status=202)
 
 
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=30)
+@login_required
+def generation_batch_status(request, batch_id):
+    batch = get_object_or_404(GenerationBatch, pk=batch_id, user=request.user)
+    jobs = batch.jobs.order_by('created_at').values(
+        'id', 'youtube_link', 'status', 'stage', 'progress', 'error', 'blog_post_id',
+    )
 
-        if response.status_code == 200:
-            result = response.json()
-            # Extract the generated content from the response
-            generated_content = result['choices'][0]['message']['content']
-            print("✓ Blog generated successfully")
-            return generated_content
-        else:
-            print(f"API Error: {response.status_code} - {response.text}")
-            return None
+    items = []
+    counts = {status: 0 for status, _ in GenerationJob.STATUS_CHOICES}
+    for job in jobs:
+        counts[job['status']] += 1
+        items.append({
+            'job_id': str(job['id']),
+            'link': job['youtube_link'],
+            'status': job['status'],
+            'stage': job['stage'],
+            'progress': job['progress'],
+            'error': job['error'] or None,
+            'blog_id': job['blog_post_id'],
+        })
+
+    total = len(items)
+    return JsonResponse({
+        'batch_id': str(batch.pk),
+        'total': total,
+        'counts': counts,
+        'progress': round(sum(item['progress'] for item in items) / total) if total else 100,
+        'finished': counts[GenerationJob.STATUS_QUEUED] == 0 and counts[GenerationJob.STATUS_RUNNING] == 0,
+        'items': items,
+    })
+
+
+@async_login_required
+async def generation_job_status(request, job_id):
+    job = await run_db(get_object_or_404, GenerationJob.objects.select_related('blog_post'), pk=job_id, user=request.user)
+
+    data = {
+        'job_id': str(job.pk),
+        'status': job.status,
+        'stage': job.stage,
+        'progress': job.progress,
+        'stages': job.stage_list(),
+    }
+    if job.status == GenerationJob.STATUS_SUCCEEDED and job.blog_post:
+        data['blog_id'] = job.blog_post.pk
+        data['content'] = job.blog_post.generated_content
+        data['html'] = job.blog_post.rendered_html
+    elif job.status == GenerationJob.STATUS_FAILED:
+        data['error'] = job.error
+    return JsonResponse(data)
+
+
+# Columns the listing cards need; generated_content is never loaded
+CARD_FIELDS = ('id', 'youtube_title', 'created_at', 'deleted_at', 'excerpt', 'reading_time')
+
+
+def card_queryset(queryset):
+    return queryset.only(*CARD_FIELDS)
 
-    except Exception as e:
-        print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
 
+@login_required
+def blog_list(request):
+    cursor = request.GET.get('cursor')
 
+    def render_cards():
+        blog_articles = keyset_page(
+            card_queryset(BlogPost.objects.filter(user=request.user)),
+            'created_at',
+            cursor,
+            settings.BLOG_LIST_PAGE_SIZE,
+        )
+        return render_to_string("partials/blog_cards.html", {'blog_articles': blog_articles})
 
+    cards_html = page_cache.listing_cards(request.user.pk, cursor, render_cards)
+    return render(request, "all-blogs.html", {'cards_html': cards_html})
 
 
 @login_required
-def blog_list(request):
-    blog_articles = BlogPost.objects.filter(user=request.user)
-    return render(request, "all-blogs.html", {'blog_articles': blog_articles})
+def search_blogs(request):
+    query = request.GET.get('q', '').strip()
+    results = search_posts(request.user, query, limit=settings.SEARCH_RESULTS_LIMIT) if query else []
+    return render(request, "search.html", {'query': query, 'results': results})
 
 
 @login_required
 def blog_details(request, pk):
-    blog_article_detail = BlogPost.objects.get(id=pk)
-    if request.user == blog_article_detail.user:
-        return render(request, 'blog-details.html', {'blog_article_detail': blog_article_detail})
+    def render_body():
+        # A missing or soft-deleted post is a 404; it is never cached, so every request checks again
+        blog_article_detail = get_object_or_404(BlogPost, pk=pk)
+        html = render_to_string('partials/blog_detail_body.html', {'blog_article_detail': blog_article_detail})
+        return blog_article_detail.user_id, html
+
+    # A hit needs no query at all; the owner check uses the cached user ID
+    user_id, body_html = page_cache.detail_body(pk, render_body)
+    if request.user.pk == user_id:
+        return render(request, 'blog-details.html', {'blog_id': pk, 'body_html': body_html})
     else:
         return redirect('/')
     
@@ -253,19 +424,43 @@ def blog_details(request, pk):
 @csrf_exempt
 def delete_blog(request, pk):
     if request.method == "POST":
-        try:
-            blog = BlogPost.objects.get(pk=pk, user=request.user, deleted_at__isnull=True)
-            blog.soft_delete()  # use soft_delete method instead of delete
+        # Soft delete: one UPDATE, which matches nothing if the post isn't the user's or is already deleted
+        if BlogPost.objects.filter(pk=pk, user=request.user).soft_delete():
             return JsonResponse({"success": True})
-        except BlogPost.DoesNotExist:
-            return JsonResponse({"error": "Blog not found"}, status=404)
+        return JsonResponse({"error": "Blog not found"}, status=404)
     return JsonResponse({"error": "Invalid method"}, status=405)
 
+
+def _selected_blog_ids(request):
+    """The blog_ids posted with a bulk action, or None if any is not an ID"""
+    try:
+        return [int(pk) for pk in request.POST.getlist('blog_ids')]
+    except ValueError:
+        return None
+
+
+@login_required
+@csrf_exempt
+def delete_blogs(request):
+    """Soft-delete the selected blogs in one UPDATE"""
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=405)
+    blog_ids = _selected_blog_ids(request)
+    if not blog_ids:
+        return JsonResponse({"error": "No blogs selected"}, status=400)
+    deleted = BlogPost.objects.filter(pk__in=blog_ids, user=request.user).soft_delete()
+    return JsonResponse({"success": True, "deleted": deleted})
+
     
 
 @login_required
 def recently_deleted_blogs(request):
-    blogs = BlogPost.all_objects.filter(user=request.user, deleted_at__isnull=False).order_by("-deleted_at")
+    blogs = keyset_page(
+        BlogPost.all_objects.filter(user=request.user, deleted_at__isnull=False).only(*CARD_FIELDS),
+        'deleted_at',
+        request.GET.get('cursor'),
+        settings.BLOG_LIST_PAGE_SIZE,
+    )
     return render(request, "recently_deleted.html", {"blogs": blogs})
 
 
@@ -275,23 +470,17 @@ def permanent_delete_blogs(request):
     """Permanently delete selected recently deleted blogs"""
     if request.method == "POST":
         try:
-            blog_ids = request.POST.getlist('blog_ids')
+            blog_ids = _selected_blog_ids(request)
             
             if not blog_ids:
                 return JsonResponse({"error": "No blogs selected"}, status=400)
             
-            # Get all selected blogs that belong to the user and are deleted
-            blogs_to_delete = BlogPost.all_objects.filter(
+            # Hard delete the selected blogs that belong to the user and are deleted
+            BlogPost.all_objects.filter(
                 pk__in=blog_ids, 
                 user=request.user, 
                 deleted_at__isnull=False
-            )
-            
-            # Count before deletion
-            count = blogs_to_delete.count()
-            
-            # Perform hard delete
-            blogs_to_delete.delete()
+            ).delete()
             
             # Redirect to recently deleted blogs page
             return redirect('recently_deleted_blogs')
@@ -305,114 +494,89 @@ def permanent_delete_blogs(request):
 
 @login_required
 def restore_blog(request, pk):
-    blog = get_object_or_404(BlogPost.all_objects, pk=pk, user=request.user, deleted_at__isnull=False)
-    blog.restore()
+    if not BlogPost.all_objects.filter(pk=pk, user=request.user).restore():
+        raise Http404("No deleted blog with this ID")
     return redirect("recently_deleted_blogs")
 
 
-
-# views.py
-import textwrap
-from io import BytesIO
-
-import qrcode
-from qrcode.constants import ERROR_CORRECT_L
-
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
-from django.urls import reverse
-
-from .models import BlogPost
-
-
-# views.py
-import textwrap
-from io import BytesIO
-
-import qrcode
-from qrcode.constants import ERROR_CORRECT_L
-
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
-from django.urls import reverse
-
-from .models import BlogPost
-
-
-def build_summary(text: str, min_len: int = 600, max_len: int = 800) -> str:
-    if not text:
-        return ""
-
-    text = " ".join(text.split())  # normalize spaces
-
-    if len(text) <= min_len:
-        return text
-
-    if len(text) <= max_len:
-        return text
-
-    cutoff = text.rfind(" ", 0, max_len)
-    if cutoff == -1:
-        cutoff = max_len
-
-    return text[:cutoff].rstrip() + "..."
+@login_required
+@csrf_exempt
+def restore_blogs(request):
+    """Restore the selected recently deleted blogs in one UPDATE"""
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=405)
+    blog_ids = _selected_blog_ids(request)
+    if not blog_ids:
+        return JsonResponse({"error": "No blogs selected"}, status=400)
+    BlogPost.all_objects.filter(pk__in=blog_ids, user=request.user).restore()
+    return redirect("recently_deleted_blogs")
 
 
+@login_required
 def download_blog_qr(request, pk):
     blog = get_object_or_404(BlogPost, pk=pk, user=request.user)
 
-    # Use the correct field from your model
-    full_text = blog.generated_content  # <-- this is the right field
-
-    # Build 600–800 char summary
-    summary = build_summary(full_text, min_len=600, max_len=800)
+    # ?format=svg skips Pillow entirely
+    fmt = request.GET.get('format', 'png')
+    if fmt not in QR_FORMATS:
+        return HttpResponse('Unsupported QR format', status=400)
 
     # Build absolute URL of blog detail page
     blog_relative_url = reverse('blog-details', kwargs={'pk': blog.pk})
     blog_absolute_url = request.build_absolute_uri(blog_relative_url)
 
-    # Combine summary + URL into QR payload
-    qr_text = f"{summary}\n\nRead full blog: {blog_absolute_url}"
+    # The QR only changes when the content or the URL does
+    key = qr_key(blog.content_hash, blog_absolute_url, fmt)
+    etag = f'"qr-{key}"'
+    not_modified = conditional_response(request, etag)
+    if not_modified is not None:
+        return not_modified
 
-    qr = qrcode.QRCode(
-        version=None,
-        error_correction=ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(qr_text)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
+    def build_qr_text():
+        # The 600–800 char summary is precomputed at save time
+        summary = blog.excerpt
 
-    response = HttpResponse(buffer, content_type='image/png')
-    response['Content-Disposition'] = f'attachment; filename=blog_{pk}_qr.png'
-    return response
+        # Combine summary + URL into QR payload
+        return f"{summary}\n\nRead full blog: {blog_absolute_url}"
 
+    qr_path = get_qr_path(blog.pk, blog_absolute_url, key, fmt, build_qr_text)
+    return file_response(request, qr_path, QR_FORMATS[fmt], f"blog_{pk}_qr.{fmt}", etag)
 
 
 
 
 
-translator = Translator()
 
-@csrf_exempt
-def translate_blog(request):
+@async_csrf_exempt
+async def translate_blog(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
+            blog_id = data.get('blog_id')
             text = data.get('text', '')
             target_lang = data.get('target_lang', 'en')
 
-            if not text.strip():
+            user = await run_db(authenticated_user, request)
+            if blog_id and user is None:
+                return JsonResponse({'error': 'Please log in to translate a blog.'}, status=401)
+            if not blog_id and not text.strip():
                 return JsonResponse({'error': 'No text provided'}, status=400)
-
-            translated_text = GoogleTranslator(source='auto', target=target_lang).translate(text)
+            # Anonymous callers may translate text too; they are limited by address
+            retry_after = await run_db(rate_limit.admit, request, user, 'translate')
+            if retry_after:
+                return rate_limit.throttled_response(retry_after)
+
+            # Saved posts are translated once per content version and then served from BlogTranslation
+            if blog_id:
+                blog = await run_db(get_object_or_404, BlogPost, pk=blog_id, user=user)
+                translated_text, cached = await on_io_loop(aget_blog_translation(blog, target_lang))
+                return JsonResponse({'translated_text': translated_text, 'cached': cached})
+
+            translated_text = await on_io_loop(atranslate_document(text, target_lang))
             return JsonResponse({'translated_text': translated_text})
 
+        except Http404:
+            return JsonResponse({'error': 'Blog not found'}, status=404)
         except Exception as e:
             return JsonResponse({'error': f'Translation failed: {str(e)}'}, status=500)
     return JsonResponse({'error': 'Invalid request method'}, status=405)
@@ -420,17 +584,46 @@ def translate_blog(request):
 
 
 
+@login_required
 def generate_pdf(request, pk):
-    blog_article = get_object_or_404(BlogPost, id=pk)
-    context = {'blog_article_detail': blog_article}
-    html = render_to_string('blog_pdf.html', context) # Your template
+    blog_article = get_object_or_404(BlogPost, pk=pk, user=request.user)
+    content_hash = blog_article.content_hash
+    etag = f'"pdf-{blog_article.pk}-{content_hash}"'
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="blog-{id}.pdf"'
-    
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
+    # The client already has this version of the PDF
+    not_modified = conditional_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    def render_html():
+        context = {'blog_article_detail': blog_article}
+        return render_to_string('blog_pdf.html', context) # Your template
+
+    try:
+        pdf_path = get_pdf_path(blog_article.pk, content_hash, render_html)
+    except (PDFRenderError, FuturesTimeoutError):
         return HttpResponse('Error generating PDF', status=500)
+
+    return file_response(request, pdf_path, 'application/pdf', f"blog-{blog_article.pk}.pdf", etag)
+
+
+@login_required
+def export_blogs(request):
+    """ZIP of all the user's blogs as Markdown, plus PDFs with ?pdf=1, streamed as it is built"""
+    archive = iter_export(BlogPost.objects.filter(user=request.user), include_pdf=request.GET.get('pdf') == '1')
+    filename = export_filename(request.user)
+
+    if isinstance(request, ASGIRequest):
+        # Django 4.1 iterates streaming responses on the event loop, where the ORM
+        # may not run; build the archive here (spilling to disk) and send the file
+        spooled = tempfile.SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_MAX_MEMORY)
+        for chunk in archive:
+            spooled.write(chunk)
+        spooled.seek(0)
+        return FileResponse(spooled, as_attachment=True, filename=filename, content_type='application/zip')
+
+    response = StreamingHttpResponse(archive, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
@@ -607,3 +800,10 @@ def forgot_password(request):
 
     # On GET request, show step 1
     return render(request, 'forgot_password.html', {'step': 1})
+
+
+def metrics_view(request):
+    """Prometheus text exposition of metrics.py's counters and histograms"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')